@@ -0,0 +1,163 @@
+"""Review turnaround reports over the homework event log.
+
+Usage:
+    python analytics.py --since 2022-01-01 --by project
+    python analytics.py --by cohort --json
+
+Reads verdicts from the event log in STATE_DB and reports, per group,
+percentiles and a histogram of the time from 'reviewing' to the
+verdict and the number of rejection rounds before approval. Cohorts
+are taken from the "cohort" field of the tenants in TENANTS_FILE.
+"""
+import argparse
+import json
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from config import load_config
+from history import EventLog, feed_key
+from setting import STATE_DB, TENANTS_FILE
+
+PERCENTILES = (50, 90, 99)
+# Edges of turnaround histogram bins in hours
+HOUR_EDGES = (1, 4, 12, 24, 72)
+ROUND_EDGES = (1, 2, 3, 5)
+UNKNOWN = 'unknown'
+GROUPINGS = {
+    'all': lambda verdict, cohorts: 'all',
+    'project': lambda verdict, cohorts: verdict.project or UNKNOWN,
+    'cohort': lambda verdict, cohorts: cohorts.get(verdict.feed, UNKNOWN),
+}
+
+
+def percentile(values, point):
+    """Returns the percentile of sorted values, interpolated linearly."""
+    if not values:
+        return None
+    position = (len(values) - 1) * point / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (
+        position - lower)
+
+
+def histogram(values, edges):
+    """Counts values in the bins [..., e0), [e0, e1), ..., [eN, ...)."""
+    counts = [0] * (len(edges) + 1)
+    for value in values:
+        counts[bisect_right(edges, value)] += 1
+    labels = [f'<{edges[0]}'] + [
+        f'{lower}-{upper}' for lower, upper in zip(edges, edges[1:])
+    ] + [f'>={edges[-1]}']
+    return dict(zip(labels, counts))
+
+
+def summarize(values, edges):
+    """Returns the count, mean, percentiles and histogram of values."""
+    values = sorted(values)
+    summary = {
+        'count': len(values),
+        'mean': sum(values) / len(values) if values else None,
+    }
+    for point in PERCENTILES:
+        summary[f'p{point}'] = percentile(values, point)
+    summary['histogram'] = histogram(values, edges)
+    return summary
+
+
+def review_report(verdicts, by='all', cohorts=None):
+    """Builds the turnaround report from Verdict rows of the event log.
+
+    Turnaround is measured in hours for verdicts whose review start was
+    seen. Rounds are counted for homeworks approved in the period: the
+    number of their rejections plus the approval.
+    """
+    group_of = GROUPINGS[by]
+    cohorts = cohorts or {}
+    turnaround = defaultdict(list)
+    rejections = defaultdict(int)
+    approved = {}
+    for verdict in verdicts:
+        group = group_of(verdict, cohorts)
+        homework = (verdict.feed, verdict.homework)
+        if verdict.reviewing is not None:
+            turnaround[group].append(
+                (verdict.at - verdict.reviewing) / 3600)
+        if verdict.status == 'rejected':
+            rejections[homework] += 1
+        else:
+            approved[homework] = group
+    rounds = defaultdict(list)
+    for homework, group in approved.items():
+        rounds[group].append(rejections[homework] + 1)
+    return {
+        group: {
+            'turnaround_hours': summarize(turnaround[group], HOUR_EDGES),
+            'rounds': summarize(rounds[group], ROUND_EDGES),
+        }
+        for group in sorted(set(turnaround) | set(rounds))
+    }
+
+
+def load_cohorts(path):
+    """Returns {feed: cohort} of the tenants in the tenants file."""
+    if not path:
+        return {}
+    return {
+        feed_key(tenant.practicum_token): tenant.cohort
+        for tenant in load_config(path).tenants if tenant.cohort
+    }
+
+
+def format_report(report):
+    """Returns the report as a text table."""
+    def number(value):
+        return '-' if value is None else f'{value:.1f}'
+
+    lines = [
+        f'{"group":<24} {"reviews":>8} {"p50 h":>8} {"p90 h":>8} '
+        f'{"p99 h":>8} {"rounds":>7}'
+    ]
+    for group, summary in report.items():
+        hours = summary['turnaround_hours']
+        lines.append(
+            f'{group[:24]:<24} {hours["count"]:>8} '
+            f'{number(hours["p50"]):>8} {number(hours["p90"]):>8} '
+            f'{number(hours["p99"]):>8} '
+            f'{number(summary["rounds"]["mean"]):>7}'
+        )
+    return '\n'.join(lines)
+
+
+def parse_day(value):
+    """Converts YYYY-MM-DD to Unix time of the UTC midnight."""
+    return int(datetime.strptime(value, '%Y-%m-%d').replace(
+        tzinfo=timezone.utc).timestamp())
+
+
+def main():
+    """Prints the review turnaround report of the event log."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default=STATE_DB)
+    parser.add_argument('--since', type=parse_day, help='YYYY-MM-DD')
+    parser.add_argument('--until', type=parse_day, help='YYYY-MM-DD')
+    parser.add_argument('--by', choices=sorted(GROUPINGS), default='all')
+    parser.add_argument('--json', action='store_true',
+                        help='print the report as JSON')
+    args = parser.parse_args()
+    cohorts = load_cohorts(TENANTS_FILE)
+    events = EventLog(args.db)
+    try:
+        verdicts = events.verdicts(args.since, args.until)
+    finally:
+        events.close()
+    report = review_report(verdicts, args.by, cohorts)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(format_report(report))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+"""Historical backfill of homework states without notifications.
+
+Usage:
+    python homework.py backfill --since 2022-01-01
+    python homework.py backfill --since 2022-01-01 --chat 123 --concurrency 8
+
+Every Practicum token of the bot and TENANTS_FILE is requested once
+with from_date=since; the answer is streamed and the statuses updated
+before until are saved to the state store and the event log. Tokens
+are fetched in a bounded thread pool. The progress of every token is
+checkpointed in STATE_DB, so a rerun after an interruption requests
+a token from the last saved homework and skips finished tokens. Once
+a token is done, cursors of its chats are moved to until, so polling
+does not notify about the backfilled statuses.
+
+The bot must be stopped: a running worker keeps states and cursors in
+memory and would notify about the backfilled statuses, so the backfill
+refuses to start while workers send heartbeats.
+"""
+import argparse
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from analytics import parse_day
+from config import load_config
+from engine import Tenant
+from history import EventLog, feed_key
+from homework import (
+    PollContext, parse_date, record_events, stream_api_answer)
+from http_client import create_session
+from registry import TenantRegistry
+from schema import iter_homeworks
+from setting import (
+    PRACTICUM_TOKEN, SHARD_DB, STATE_DB, TELEGRAM_CHAT_ID, TENANTS_FILE)
+from sharding import LeaseStore
+from storage import CursorStore, HomeworkStateStore, connect
+
+CONCURRENCY = 4
+# Homeworks saved between checkpoints of a token
+CHECKPOINT_EVERY = 100
+
+# Backfill of a token: from_date to resume with, saved homeworks, the
+# end of the range and whether the range is done
+Progress = namedtuple('Progress', 'position homeworks until finished')
+
+
+class BackfillCheckpoints:
+    """Progress of the backfill of every token kept in SQLite.
+
+    Progress is kept per token and start of the range: a rerun without
+    --until has a later end, but continues from the saved position.
+    """
+
+    def __init__(self, path):
+        self._connection = connect(path)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS backfill_feeds ('
+                'feed TEXT NOT NULL, since INTEGER NOT NULL, '
+                'position INTEGER NOT NULL, homeworks INTEGER NOT NULL, '
+                'until INTEGER NOT NULL, finished INTEGER NOT NULL, '
+                'updated_at REAL NOT NULL, '
+                'PRIMARY KEY (feed, since))'
+            )
+
+    def get(self, feed, since):
+        """Returns the Progress of the feed or None."""
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT position, homeworks, until, finished '
+                'FROM backfill_feeds WHERE feed = ? AND since = ?',
+                (feed, since)
+            ).fetchone()
+        return None if row is None else Progress(
+            row[0], row[1], row[2], bool(row[3]))
+
+    def save(self, feed, since, progress):
+        """Records the Progress of the feed."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO backfill_feeds '
+                '(feed, since, position, homeworks, until, finished, '
+                'updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (feed, since, progress.position, progress.homeworks,
+                 progress.until, int(progress.finished), time.time())
+            )
+
+    def close(self):
+        """Closes the database connection."""
+        with self._lock:
+            self._connection.close()
+
+
+def save_homework(context, subscribers, record):
+    """Saves the homework for every chat of the token, nothing is sent."""
+    record_events(context, subscribers[0], [record])
+    for tenant in subscribers:
+        context.states.save(tenant.key, record)
+
+
+def backfill_feed(context, subscribers, since, until, checkpoints=None):
+    """Saves homeworks of the token updated before until.
+
+    The token is requested once and the answer is streamed; states are
+    saved for every chat of the token, nothing is sent. The checkpoint
+    position follows the update time of saved homeworks while they come
+    in ascending order and stays where the request started otherwise,
+    so a resumed backfill never skips a homework. Returns the number of
+    saved homeworks.
+    """
+    leader = subscribers[0]
+    feed = feed_key(leader.practicum_token)
+    progress = (
+        checkpoints and checkpoints.get(feed, since)
+        or Progress(since, 0, until, False))
+    if progress.finished and progress.until >= until:
+        return progress.homeworks
+    start, saved = progress.position, progress.homeworks
+    # None once a homework comes out of order
+    position = start
+
+    def checkpoint(finished=False):
+        if checkpoints is not None:
+            checkpoints.save(feed, since, Progress(
+                start if position is None else position, saved, until,
+                finished))
+
+    answer = stream_api_answer(leader.headers, start, context.session)
+    try:
+        for record in iter_homeworks(answer, strict=True):
+            updated = parse_date(record.date_updated)
+            if updated is not None and updated >= until:
+                continue
+            save_homework(context, subscribers, record)
+            saved += 1
+            if updated is not None and position is not None:
+                position = updated if updated >= position else None
+            if not saved % CHECKPOINT_EVERY:
+                checkpoint()
+    except Exception:
+        checkpoint()
+        raise
+    checkpoint(finished=True)
+    return saved
+
+
+def move_cursors(context, tenants, leader, until):
+    """Moves cursors of chats of the backfilled token to until."""
+    for tenant in tenants.subscribers(leader):
+        cursor = context.cursors.get(tenant.key)
+        if cursor is None or cursor < until:
+            context.cursors.set(tenant.key, until)
+
+
+def run_backfill(context, tenants, since, until, concurrency=CONCURRENCY,
+                 checkpoints=None):
+    """Backfills every token of the registry, returns the failed leaders.
+
+    Tokens are fetched in a pool of concurrency threads, one request
+    for every token.
+    """
+    leaders = tenants.leaders()
+    logging.info(f"Загрузка истории: токенов {len(leaders)}.")
+    failed = []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {
+            pool.submit(
+                backfill_feed, context, tenants.subscribers(leader),
+                since, until, checkpoints
+            ): leader
+            for leader in leaders
+        }
+        for future in as_completed(futures):
+            leader = futures[future]
+            try:
+                saved = future.result()
+            except Exception as error_message:
+                logging.exception(
+                    f"История {leader} не загружена: {error_message}")
+                failed.append(leader)
+                continue
+            move_cursors(context, tenants, leader, until)
+            logging.info(f"История {leader}: сохранено {saved}.")
+    return failed
+
+
+def live_workers(path):
+    """Returns ids of bot workers alive according to their heartbeats."""
+    store = LeaseStore(path)
+    try:
+        return sorted(store.live_workers(time.time()))
+    finally:
+        store.close()
+
+
+def select_tenants(chats):
+    """Returns the registry of tenants to backfill, all by default."""
+    tenants = []
+    if PRACTICUM_TOKEN and TELEGRAM_CHAT_ID:
+        tenants.append(Tenant(PRACTICUM_TOKEN, TELEGRAM_CHAT_ID))
+    if TENANTS_FILE:
+        tenants.extend(load_config(TENANTS_FILE, tenants).tenants)
+    if chats:
+        tenants = [
+            tenant for tenant in tenants if str(tenant.chat_id) in chats]
+    return TenantRegistry(tenants)
+
+
+def main(argv=None):
+    """Runs the backfill command, returns the exit code."""
+    parser = argparse.ArgumentParser(
+        prog='homework.py backfill', description=__doc__.splitlines()[0])
+    parser.add_argument('--since', type=parse_day, required=True,
+                        help='YYYY-MM-DD')
+    parser.add_argument('--until', type=parse_day,
+                        help='YYYY-MM-DD, now by default')
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY)
+    parser.add_argument('--chat', action='append',
+                        help='backfill only this chat, may be repeated')
+    args = parser.parse_args(argv)
+    workers = live_workers(SHARD_DB or STATE_DB)
+    if workers:
+        logging.critical(
+            f"Бот запущен (воркеры: {', '.join(workers)}), остановите его "
+            "перед загрузкой истории.")
+        return 1
+    tenants = select_tenants(args.chat)
+    if not tenants:
+        logging.critical("Нет подписчиков для загрузки истории.")
+        return 1
+    context = PollContext(
+        queue=None,
+        cursors=CursorStore(STATE_DB),
+        states=HomeworkStateStore(STATE_DB),
+        session=create_session(pool_size=args.concurrency),
+        scheduler=None,
+        events=EventLog(STATE_DB)
+    )
+    checkpoints = BackfillCheckpoints(STATE_DB)
+    try:
+        failed = run_backfill(
+            context, tenants, args.since, args.until or int(time.time()),
+            args.concurrency, checkpoints)
+    finally:
+        checkpoints.close()
+        context.events.close()
+        context.cursors.close()
+        context.states.close()
+    if failed:
+        logging.error(
+            f"Не загружено токенов: {len(failed)}, повторите команду.")
+        return 1
+    logging.info("История загружена.")
+    return 0
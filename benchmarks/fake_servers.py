@@ -0,0 +1,194 @@
+"""Local stand-ins for the Practicum API and the Telegram Bot API.
+
+The answers have the same shape as MockResponseGET and MockTelegramBot
+from tests/test_bot.py, but are served over real HTTP so that the whole
+bot, including sessions, pools and queues, can be measured.
+"""
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+HOMEWORK_PATH = '/api/user_api/homework_statuses/'
+STATUSES = ('reviewing', 'approved', 'rejected')
+NAME_PATTERN = re.compile(r'"(hw-[\w-]+)"')
+
+
+class QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeServer:
+    """Base class running a ThreadingHTTPServer in a background thread."""
+
+    handler_class = QuietHandler
+
+    def __init__(self, latency=0, error_rate=0, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        handler = type('Handler', (self.handler_class,), {'server_state': self})
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_port}'
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def begin_request(self):
+        """Counts the request, sleeps and decides whether it fails."""
+        with self.lock:
+            self.requests += 1
+            failed = self.random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return failed
+
+
+class PracticumHandler(QuietHandler):
+
+    def do_GET(self):
+        state = self.server_state
+        url = urlparse(self.path)
+        if url.path != HOMEWORK_PATH:
+            self.send_json(404, {'code': 'not_found'})
+            return
+        if state.begin_request():
+            self.send_json(500, {'code': 'internal_error'})
+            return
+        authorization = self.headers.get('Authorization', '')
+        if not authorization.startswith('OAuth '):
+            self.send_json(401, {'code': 'not_authenticated'})
+            return
+        token = authorization[len('OAuth '):]
+        from_date = int(parse_qs(url.query).get('from_date', ['0'])[0])
+        self.send_json(200, state.answer(token, from_date))
+
+
+class FakePracticumAPI(FakeServer):
+    """homework_statuses endpoint producing random status changes.
+
+    Every answer contains payload_size unchanged homeworks and, with
+    change_rate probability, one homework whose status has just changed.
+    The time of every change is kept to measure notification latency.
+    """
+
+    handler_class = PracticumHandler
+
+    def __init__(self, latency=0, error_rate=0, payload_size=0,
+                 change_rate=0.5, seed=None):
+        super().__init__(latency, error_rate, seed)
+        self.payload_size = payload_size
+        self.change_rate = change_rate
+        self.changes = {}
+        self.sequence = 0
+
+    @property
+    def endpoint(self):
+        return self.url + HOMEWORK_PATH
+
+    def answer(self, token, from_date):
+        now = time.time()
+        homeworks = [
+            {
+                'id': f'{token}-{index}',
+                'homework_name': f'padding-{index}',
+                'status': 'approved',
+                'reviewer_comment': 'Всё нравится',
+                'date_updated': '2020-02-13T14:40:57Z',
+                'lesson_name': 'Итоговый проект',
+            }
+            for index in range(self.payload_size)
+        ]
+        with self.lock:
+            changed = self.random.random() < self.change_rate
+            if changed:
+                self.sequence += 1
+                name = f'hw-{self.sequence}'
+                self.changes[name] = now
+                status = self.random.choice(STATUSES)
+        if changed:
+            homeworks.insert(0, {
+                'id': name,
+                'homework_name': name,
+                'status': status,
+                'reviewer_comment': '',
+                'date_updated': datetime.fromtimestamp(
+                    now, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'lesson_name': 'Нагрузочный тест',
+            })
+        return {'homeworks': homeworks, 'current_date': int(now)}
+
+
+class TelegramHandler(QuietHandler):
+
+    def do_POST(self):
+        state = self.server_state
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        if not self.path.endswith('/sendMessage'):
+            self.send_json(404, {'ok': False, 'description': 'Not Found'})
+            return
+        if state.begin_request():
+            self.send_json(500, {
+                'ok': False, 'error_code': 500,
+                'description': 'Internal Server Error'})
+            return
+        data = json.loads(body or b'{}')
+        state.record(data.get('text', ''))
+        self.send_json(200, {'ok': True, 'result': {
+            'message_id': state.requests,
+            'date': int(time.time()),
+            'chat': {'id': int(data.get('chat_id', 0)), 'type': 'private'},
+            'text': data.get('text', ''),
+        }})
+
+
+class FakeTelegramAPI(FakeServer):
+    """sendMessage endpoint of the Bot API recording delivery times."""
+
+    handler_class = TelegramHandler
+
+    def __init__(self, latency=0, error_rate=0, seed=None):
+        super().__init__(latency, error_rate, seed)
+        self.delivered = {}
+
+    @property
+    def base_url(self):
+        return self.url + '/bot'
+
+    def record(self, text):
+        now = time.time()
+        with self.lock:
+            for name in NAME_PATTERN.findall(text):
+                self.delivered.setdefault(name, now)
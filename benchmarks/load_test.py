@@ -0,0 +1,179 @@
+"""Load test of the polling engine against local fake servers.
+
+Usage:
+    python -m benchmarks.load_test --tenants 500 --duration 30
+
+Reports polls per second, p50/p99 latency from a status change on the
+fake Practicum API to its delivery to the fake Telegram API, CPU time
+and peak RSS of the process.
+"""
+import argparse
+import asyncio
+import logging
+import resource
+import sys
+import tempfile
+import time
+from os import path
+
+import telegram
+from telegram.utils.request import Request
+
+from benchmarks.fake_servers import FakePracticumAPI, FakeTelegramAPI
+from delivery import OutboundQueue
+from engine import PollingEngine, Tenant
+from http_client import create_session
+from scheduler import PollScheduler
+from storage import CursorStore, HomeworkStateStore
+
+
+def percentile(values, fraction):
+    """Returns the percentile of the values by the nearest rank."""
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(fraction * len(values)) - 1))
+    return values[index]
+
+
+def peak_rss_mb():
+    """Returns the peak resident set size of the process in megabytes."""
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return usage / 1024 / 1024
+    return usage / 1024
+
+
+def drive(homework, telegram_api, tenants, duration, interval,
+          concurrency):
+    """Polls the tenants for the duration, returns elapsed and CPU time."""
+    bot = telegram.Bot(
+        token='123456:benchmark',
+        base_url=telegram_api.base_url,
+        request=Request(con_pool_size=8)
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        state_db = path.join(directory, 'state.sqlite3')
+        context = homework.PollContext(
+            queue=OutboundQueue(
+                lambda chat_id, message: homework.send_chat_message(
+                    bot, chat_id, message),
+                chat_rate=100,
+                global_rate=10000
+            ),
+            cursors=CursorStore(state_db),
+            states=HomeworkStateStore(state_db),
+            session=create_session(pool_size=concurrency),
+            scheduler=PollScheduler(
+                interval, reviewing_interval=interval,
+                idle_interval=interval, backoff_base=interval,
+                backoff_max=interval * 4)
+        )
+        tenant_list = [
+            Tenant(f'token-{index}', index, timestamp=0)
+            for index in range(tenants)
+        ]
+        engine = PollingEngine(
+            tenant_list,
+            lambda tenant: homework.process_tenant(context, tenant),
+            context.scheduler,
+            concurrency=concurrency,
+            tick=min(1, interval / 10)
+        )
+        context.queue.start()
+        cpu_start = time.process_time()
+        started = time.time()
+        try:
+            asyncio.run(asyncio.wait_for(engine.run(), duration))
+        except asyncio.TimeoutError:
+            pass
+        elapsed = time.time() - started
+        context.queue.close(timeout=interval * 5)
+        cpu = time.process_time() - cpu_start
+        context.cursors.close()
+        context.states.close()
+    return elapsed, cpu
+
+
+def run_load_test(tenants=100, duration=10, interval=1, concurrency=50,
+                  api_latency=0.01, api_error_rate=0, payload_size=0,
+                  change_rate=0.5, telegram_latency=0.01,
+                  telegram_error_rate=0, seed=None):
+    """Runs the bot against the fake servers and returns the report."""
+    import homework
+
+    root = logging.getLogger()
+    level = root.level
+    root.setLevel(logging.WARNING)
+    api = FakePracticumAPI(
+        latency=api_latency, error_rate=api_error_rate,
+        payload_size=payload_size, change_rate=change_rate, seed=seed
+    ).start()
+    telegram_api = FakeTelegramAPI(
+        latency=telegram_latency, error_rate=telegram_error_rate, seed=seed
+    ).start()
+    endpoint = homework.ENDPOINT
+    homework.ENDPOINT = api.endpoint
+    try:
+        elapsed, cpu = drive(
+            homework, telegram_api, tenants, duration, interval, concurrency)
+    finally:
+        root.setLevel(level)
+        homework.ENDPOINT = endpoint
+        api.stop()
+        telegram_api.stop()
+    latencies = [
+        telegram_api.delivered[name] - created
+        for name, created in api.changes.items()
+        if name in telegram_api.delivered
+    ]
+    return {
+        'tenants': tenants,
+        'duration_s': elapsed,
+        'polls': api.requests,
+        'polls_per_s': api.requests / elapsed,
+        'api_errors': api.errors,
+        'changes': len(api.changes),
+        'notified': len(latencies),
+        'telegram_requests': telegram_api.requests,
+        'latency_p50_s': percentile(latencies, 0.5),
+        'latency_p99_s': percentile(latencies, 0.99),
+        'cpu_s': cpu,
+        'cpu_per_poll_ms': cpu * 1000 / max(1, api.requests),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def format_report(report):
+    """Returns the report as aligned text."""
+    width = max(len(key) for key in report)
+    lines = []
+    for key, value in report.items():
+        if isinstance(value, float):
+            value = f'{value:.3f}'
+        lines.append(f'{key:<{width}}  {value}')
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tenants', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--interval', type=float, default=1,
+                        help='poll interval of every tenant, s')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--api-latency', type=float, default=0.01)
+    parser.add_argument('--api-error-rate', type=float, default=0)
+    parser.add_argument('--payload-size', type=int, default=0,
+                        help='unchanged homeworks in every answer')
+    parser.add_argument('--change-rate', type=float, default=0.5,
+                        help='probability of a status change per poll')
+    parser.add_argument('--telegram-latency', type=float, default=0.01)
+    parser.add_argument('--telegram-error-rate', type=float, default=0)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+    print(format_report(run_load_test(**vars(args))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Startup time of the bot measured with python -X importtime.
+
+Usage:
+    python -m benchmarks.startup --runs 5 --output startup.json
+    python -m benchmarks.startup --baseline startup.json
+
+Imports homework in fresh interpreters, reports the median cumulative
+import time of homework, the slowest modules it pulls in and whether
+the heavy Telegram and HTTP stacks were imported. With --baseline the
+result is compared with a saved one and the exit code is 1 when the
+import became slower than the tolerance allows.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULE = 'homework'
+LAZY_MODULES = ('telegram', 'requests')
+TOLERANCE = 0.25
+
+
+def parse_importtime(stderr, module=MODULE):
+    """Parses importtime output.
+
+    Returns {module: (self_us, cumulative_us)} and the cumulative
+    times of modules imported directly by the module.
+    """
+    times = {}
+    children = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2].strip()
+        depth = (len(fields[2]) - len(fields[2].lstrip()) - 1) // 2
+        times[name] = (int(fields[0]), int(fields[1]))
+        if depth == 1:
+            children[name] = int(fields[1])
+        elif depth == 0:
+            if name == module:
+                break
+            children = {}
+    return times, children
+
+
+def measure(module=MODULE):
+    """Imports the module in a new interpreter, returns import times."""
+    environment = dict(os.environ, LOG_FILE=os.devnull)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, env=environment, capture_output=True, text=True,
+        check=True
+    )
+    return parse_importtime(result.stderr, module)
+
+
+def run_startup_benchmark(runs=5, top=10, module=MODULE):
+    """Measures the import of the module runs times, returns the report."""
+    samples = [measure(module) for _ in range(runs)]
+    cumulative = [times[module][1] / 1000 for times, _ in samples]
+    last, children = samples[-1]
+    slowest = sorted(
+        ((name, value / 1000) for name, value in children.items()),
+        key=lambda item: item[1],
+        reverse=True
+    )[:top]
+    return {
+        'module': module,
+        'runs': runs,
+        'import_ms': statistics.median(cumulative),
+        'import_min_ms': min(cumulative),
+        'lazy_modules_imported': [
+            name for name in LAZY_MODULES if name in last],
+        'slowest_ms': dict(slowest),
+    }
+
+
+def compare(report, baseline, tolerance=TOLERANCE):
+    """Returns the problems of the report compared with the baseline."""
+    problems = []
+    limit = baseline['import_ms'] * (1 + tolerance)
+    if report['import_ms'] > limit:
+        problems.append(
+            f"import {report['module']} takes {report['import_ms']:.1f} ms, "
+            f"baseline {baseline['import_ms']:.1f} ms")
+    for name in report['lazy_modules_imported']:
+        if name not in baseline['lazy_modules_imported']:
+            problems.append(f'{name} is imported at startup')
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--output', help='save the report as JSON')
+    parser.add_argument('--baseline', help='compare with a saved report')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    args = parser.parse_args()
+    report = run_startup_benchmark(args.runs, args.top)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            problems = compare(report, json.load(file), args.tolerance)
+        for problem in problems:
+            print(problem, file=sys.stderr)
+        sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
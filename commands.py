@@ -0,0 +1,166 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+HISTORY_LIMIT = 20
+# Seconds homeworks fetched for commands are reused
+FETCHED_TTL = 60
+# Threads of the updater running command handlers concurrently
+COMMAND_WORKERS = 8
+
+
+class SingleFlight:
+    """Runs one call per key at a time, concurrent callers share its result."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func):
+        """Returns func() or the result of the same call already running."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            result = func()
+        except Exception as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+def render_status(homework, verdicts):
+    """Returns the line about the current status of the homework."""
+    verdict = verdicts.get(homework.get('status'), homework.get('status'))
+    return f'"{homework.get("homework_name")}": {verdict}'
+
+
+class BotCommands:
+    """Answers /status and /history from the cached homework states.
+
+    The API is requested only when nothing is cached for the tenant yet,
+    and simultaneous requests for the same token share one fetch.
+    Fetched homeworks are kept apart from the states for FETCHED_TTL
+    seconds: the states are what the chat has been notified about and
+    are written by polls only. verdicts returns the verdict texts of
+    the locale of a tenant.
+    """
+
+    def __init__(self, tenants, states, queue, fetch, verdicts,
+                 escape=None, clock=time.monotonic):
+        self.states = states
+        self.queue = queue
+        self.fetch = fetch
+        self.verdicts = verdicts
+        self.escape = escape or (lambda text: text)
+        self.clock = clock
+        self.single_flight = SingleFlight()
+        self._fetched = {}
+        self.set_tenants(tenants)
+
+    def set_tenants(self, tenants):
+        """Replaces the tenants whose chats may send commands."""
+        by_chat = {}
+        for tenant in tenants:
+            by_chat.setdefault(str(tenant.chat_id), []).append(tenant)
+        self.tenants = by_chat
+        keys = {
+            tenant.key for chat in by_chat.values() for tenant in chat}
+        for key in list(self._fetched):
+            if key not in keys:
+                self._fetched.pop(key, None)
+
+    def _cached_homeworks(self, tenant):
+        homeworks = self.states.homeworks(tenant.key)
+        if homeworks:
+            return homeworks
+        fetched = self._fetched.get(tenant.key)
+        if fetched is not None and self.clock() - fetched[0] < FETCHED_TTL:
+            return fetched[1]
+        homeworks = self.single_flight.do(
+            tenant.practicum_token, lambda: self.fetch(tenant))
+        self._fetched[tenant.key] = (self.clock(), homeworks)
+        return homeworks
+
+    def status_text(self, chat_id):
+        """Returns the reply to /status for the chat."""
+        tenants = self.tenants.get(str(chat_id))
+        if not tenants:
+            return "Чат не подписан на уведомления."
+        lines = []
+        for tenant in tenants:
+            homeworks = self._cached_homeworks(tenant)
+            if homeworks:
+                lines.append(render_status(
+                    homeworks[0], self.verdicts(tenant.locale)))
+        return '\n'.join(lines) or "Домашних работ пока нет."
+
+    def history_text(self, chat_id):
+        """Returns the reply to /history for the chat."""
+        tenants = self.tenants.get(str(chat_id))
+        if not tenants:
+            return "Чат не подписан на уведомления."
+        lines = []
+        for tenant in tenants:
+            verdicts = self.verdicts(tenant.locale)
+            for homework in self._cached_homeworks(tenant)[:HISTORY_LIMIT]:
+                lines.append(
+                    f'{homework.get("date_updated") or "-"} '
+                    f'{render_status(homework, verdicts)}'
+                )
+        return '\n'.join(lines) or "Домашних работ пока нет."
+
+    def _reply(self, update, make_text):
+        chat_id = update.effective_chat.id
+        try:
+            text = make_text(chat_id)
+        except Exception as error_message:
+            logging.exception(error_message)
+            text = "Не удалось получить статус, попробуйте позже."
+        self.queue.put(chat_id, self.escape(text))
+
+    def status(self, update, context):
+        """Handles the /status command."""
+        self._reply(update, self.status_text)
+
+    def history(self, update, context):
+        """Handles the /history command."""
+        self._reply(update, self.history_text)
+
+
+def start_commands(bot, commands, webhook_url=None, port=None,
+                   workers=COMMAND_WORKERS):
+    """Starts receiving commands by webhook or by long polling.
+
+    Handlers run in the updater's worker threads, so a slow fetch for one
+    chat does not hold the others and concurrent fetches share one request.
+    """
+    from telegram.ext import CommandHandler, Updater
+
+    updater = Updater(bot=bot, use_context=True, workers=workers)
+    updater.dispatcher.add_handler(
+        CommandHandler('status', commands.status, run_async=True))
+    updater.dispatcher.add_handler(
+        CommandHandler('history', commands.history, run_async=True))
+    if webhook_url:
+        updater.start_webhook(
+            listen='0.0.0.0',
+            port=port,
+            url_path=bot.token,
+            webhook_url=f'{webhook_url.rstrip("/")}/{bot.token}'
+        )
+        logging.info("Приём команд через webhook.")
+    else:
+        updater.start_polling()
+        logging.info("Приём команд через long polling.")
+    return updater
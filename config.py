@@ -0,0 +1,192 @@
+import json
+import logging
+import os
+import threading
+from collections import namedtuple
+
+from engine import tenant_from_record
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+WATCH_INTERVAL = 5
+SCHEDULER_TUNABLES = (
+    'interval', 'reviewing_interval', 'idle_interval', 'idle_after',
+    'backoff_base', 'backoff_max', 'jitter')
+
+# Tenants and scheduler tunables read from the configuration source
+Config = namedtuple('Config', 'tenants tunables')
+
+
+def config_files(path):
+    """Returns JSON files of the source: the file or the directory."""
+    if not os.path.isdir(path):
+        return [path]
+    return sorted(
+        os.path.join(path, name) for name in os.listdir(path)
+        if name.endswith('.json')
+    )
+
+
+def load_config(path, reserved=()):
+    """Loads tenants and tunables from the file or the directory.
+
+    A file holds a list of tenants or an object with the "tenants" list
+    and the "scheduler" object of tunables; files of a directory are
+    merged in the order of their names. Tenants are identified by
+    their "id" or, without it, by the chat, and must be unique and
+    differ from the reserved tenants, such as the one of .env.
+    """
+    tenants = []
+    tunables = {}
+    for name in config_files(path):
+        with open(name, encoding='utf-8') as file:
+            data = json.load(file)
+        if isinstance(data, list):
+            data = {'tenants': data}
+        if not isinstance(data, dict):
+            raise TypeError(
+                f"Файл настроек {name} должен содержать список или объект.")
+        tenants.extend(
+            tenant_from_record(record) for record in data.get('tenants', []))
+        tunables.update(data.get('scheduler', {}))
+    keys = {tenant.key: tenant for tenant in reserved}
+    for tenant in tenants:
+        if tenant.key in keys:
+            raise ValueError(
+                f"Подписчики {keys[tenant.key]!r} и {tenant!r} совпадают, "
+                "укажите им разные id.")
+        keys[tenant.key] = tenant
+    check_tunables(tunables)
+    return Config(tenants, tunables)
+
+
+def check_tunables(tunables):
+    """Checks names, types and ranges of the scheduler tunables."""
+    unknown = set(tunables) - set(SCHEDULER_TUNABLES)
+    if unknown:
+        raise KeyError(f"Неизвестные параметры планировщика: {unknown}.")
+    for name, value in tunables.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise TypeError(
+                f"Параметр планировщика {name} должен быть числом, "
+                f"получено {value!r}.")
+        if name == 'jitter':
+            if not 0 <= value < 1:
+                raise ValueError(
+                    f"Параметр планировщика jitter должен быть от 0 до 1, "
+                    f"получено {value!r}.")
+        elif value <= 0:
+            raise ValueError(
+                f"Параметр планировщика {name} должен быть больше нуля, "
+                f"получено {value!r}.")
+
+
+def apply_tunables(scheduler, tunables):
+    """Sets the tunables on the live scheduler."""
+    for name, value in tunables.items():
+        setattr(scheduler, name, value)
+
+
+def source_state(path):
+    """Returns names, sizes and modification times of the source."""
+    state = []
+    for name in config_files(path):
+        try:
+            stat = os.stat(name)
+        except FileNotFoundError:
+            continue
+        state.append((name, stat.st_size, stat.st_mtime_ns))
+    return state
+
+
+class ConfigWatcher:
+    """Reloads the configuration when its files change.
+
+    Changes are noticed by inotify when inotify_simple is installed
+    and by comparing modification times every interval otherwise.
+    A configuration that fails to load or to apply is logged and the
+    previous one stays in effect.
+    """
+
+    def __init__(self, path, on_change, interval=WATCH_INTERVAL,
+                 reserved=()):
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self.reserved = tuple(reserved)
+        self._state = source_state(path)
+        self._stopped = threading.Event()
+        self._thread = None
+        self._inotify = None
+
+    def _watch(self):
+        if INotify is None:
+            return
+        try:
+            self._inotify = INotify()
+            directory = (
+                self.path if os.path.isdir(self.path)
+                else os.path.dirname(os.path.abspath(self.path)))
+            self._inotify.add_watch(
+                directory,
+                flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE
+                | flags.DELETE
+            )
+        except OSError as error_message:
+            logging.warning(
+                f"inotify недоступен, проверка файлов по времени: "
+                f"{error_message}")
+            self._inotify = None
+
+    def _wait(self):
+        if self._inotify is not None:
+            self._inotify.read(timeout=int(self.interval * 1000))
+            return not self._stopped.is_set()
+        return not self._stopped.wait(self.interval)
+
+    def check(self):
+        """Calls on_change with the new configuration if it has changed."""
+        state = source_state(self.path)
+        if state == self._state:
+            return False
+        self._state = state
+        try:
+            config = load_config(self.path, self.reserved)
+        except Exception as error_message:
+            logging.exception(
+                f"Не удалось перечитать настройки: {error_message}")
+            return False
+        logging.info(f"Настройки {self.path} изменились.")
+        try:
+            self.on_change(config)
+        except Exception as error_message:
+            logging.exception(
+                f"Не удалось применить настройки: {error_message}")
+            return False
+        return True
+
+    def _run(self):
+        while self._wait():
+            try:
+                self.check()
+            except Exception as error_message:
+                logging.exception(
+                    f"Ошибка проверки настроек: {error_message}")
+
+    def start(self):
+        """Starts watching the source in background."""
+        self._watch()
+        self._thread = threading.Thread(
+            target=self._run, name='config-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops watching the source."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._inotify is not None:
+            self._inotify.close()
@@ -0,0 +1,388 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from exceptions import (
+    TelegramChatError, TelegramConnectionError, TelegramRetryAfter)
+from metrics import DELIVERY_LAG, ERRORS
+
+# Telegram allows about one message per second in a chat
+# and about thirty messages per second in total.
+CHAT_RATE = 1
+GLOBAL_RATE = 30
+MAX_MESSAGE_LENGTH = 4096
+MESSAGE_SEPARATOR = '\n\n'
+SENDERS = 4
+DRAIN_INTERVAL = 1
+PRUNE_INTERVAL = 60 * 60
+
+
+class TokenBucket:
+    """Token bucket rate limiter."""
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self, now):
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self):
+        """Returns the number of seconds until a token is available."""
+        self._refill(self.clock())
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """Takes a token, the caller must check delay() first."""
+        self._refill(self.clock())
+        self.tokens -= 1
+
+    def is_full(self):
+        """Checks whether the bucket has been idle long enough to refill."""
+        self._refill(self.clock())
+        return self.tokens >= self.capacity
+
+
+def split_message(message, limit=MAX_MESSAGE_LENGTH):
+    """Splits the text into parts within the limit at line breaks.
+
+    Escape sequences of the parse modes never span lines, so every part
+    stays valid markup; a single line over the limit is kept whole.
+    """
+    if len(message) <= limit:
+        return [message]
+    parts = []
+    part = None
+    for line in message.split('\n'):
+        if part is None:
+            part = line
+        elif len(part) + 1 + len(line) > limit:
+            parts.append(part)
+            part = line
+        else:
+            part = f'{part}\n{line}'
+    parts.append(part)
+    return parts
+
+
+def coalesce(messages, limit=MAX_MESSAGE_LENGTH):
+    """Joins pending messages of a chat into one text within the limit.
+
+    Messages are joined whole and never cut, so their markup is kept.
+    Returns the text and the number of messages it includes.
+    """
+    text = messages[0]
+    count = 1
+    for message in messages[1:]:
+        candidate = text + MESSAGE_SEPARATOR + message
+        if len(candidate) > limit:
+            break
+        text = candidate
+        count += 1
+    return text, count
+
+
+class OutboundQueue:
+    """Delivers messages to Telegram independently from polling.
+
+    Messages of a chat waiting for delivery are sent as one message.
+    Sends are limited by a token bucket per chat and a global one;
+    messages rejected with RetryAfter are returned to the head of the
+    queue and sent again after the delay given by Telegram.
+
+    With a CircuitBreaker nothing is sent while Telegram is failing,
+    except one trial message after the reset timeout. Only connection
+    errors count as failures: messages rejected for their chat with
+    TelegramChatError are dropped without retries.
+
+    With an Outbox every message is recorded on disk before it is sent
+    and marked after delivery; a drainer thread writes buffered changes,
+    touches the records of messages still held in memory and requeues
+    messages left undelivered by failures or restarts.
+    """
+
+    def __init__(self, send, chat_rate=CHAT_RATE, global_rate=GLOBAL_RATE,
+                 senders=SENDERS, outbox=None, drain_interval=DRAIN_INTERVAL,
+                 breaker=None, clock=time.monotonic):
+        self.send = send
+        self.breaker = breaker
+        self.chat_rate = chat_rate
+        self.outbox = outbox
+        self.drain_interval = drain_interval
+        self.clock = clock
+        self._global_bucket = TokenBucket(global_rate, clock=clock)
+        self._chat_buckets = {}
+        self._pending = OrderedDict()
+        self._in_flight = set()
+        self._paused_until = 0
+        self._condition = threading.Condition()
+        self._senders = senders
+        self._executor = None
+        self._dispatcher = None
+        self._drainer = None
+        self._known = set()
+        self._closed = False
+        self._stopped = threading.Event()
+
+    @property
+    def depth(self):
+        """Number of messages waiting for delivery."""
+        with self._condition:
+            return sum(len(messages) for messages in self._pending.values())
+
+    def put(self, chat_id, message, created=None):
+        """Adds the message to the queue of the chat.
+
+        created is the Unix time of the event the message is about,
+        it is used to measure the delivery lag. Messages longer than
+        Telegram allows are sent in parts split at line breaks.
+        """
+        for part in split_message(str(message)):
+            message_id = None
+            if self.outbox is not None:
+                message_id = self.outbox.add(chat_id, part, created)
+            self._enqueue(chat_id, part, created, message_id)
+
+    def flush(self):
+        """Writes recorded messages to the outbox on disk."""
+        if self.outbox is not None:
+            self.outbox.flush()
+
+    def _enqueue(self, chat_id, message, created, message_id):
+        with self._condition:
+            if self._closed:
+                raise TelegramConnectionError(
+                    "Очередь отправки сообщений остановлена")
+            if message_id is not None:
+                if message_id in self._known:
+                    return
+                self._known.add(message_id)
+            self._pending.setdefault(str(chat_id), []).append(
+                (message, created, message_id))
+            self._condition.notify()
+
+    def start(self):
+        """Starts the dispatcher and, with an outbox, the drainer thread."""
+        self._executor = ThreadPoolExecutor(max_workers=self._senders)
+        self._dispatcher = threading.Thread(
+            target=self._dispatch, name='outbound-queue', daemon=True)
+        self._dispatcher.start()
+        if self.outbox is not None:
+            self._drainer = threading.Thread(
+                target=self._drain, name='outbox-drainer', daemon=True)
+            self._drainer.start()
+
+    def close(self, timeout=None):
+        """Stops accepting messages and waits for the queue to drain.
+
+        Messages not taken for delivery within the timeout are dropped
+        from memory and sends in flight are not waited for any longer;
+        with an outbox such messages are sent after the restart.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def remaining():
+            if deadline is None:
+                return None
+            return max(0, deadline - time.monotonic())
+
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._dispatcher is not None:
+            self._dispatcher.join(remaining())
+            if self._dispatcher.is_alive():
+                with self._condition:
+                    left = sum(
+                        len(messages) for messages in self._pending.values())
+                    self._pending.clear()
+                    self._condition.notify_all()
+                logging.warning(
+                    f"Не отправлено к остановке сообщений: {left}")
+            self._executor.shutdown(wait=False)
+            with self._condition:
+                if not self._condition.wait_for(
+                        lambda: not self._in_flight, remaining()):
+                    logging.warning(
+                        "Не дождались отправки в чаты: "
+                        f"{len(self._in_flight)}")
+        self._stopped.set()
+        if self._drainer is not None:
+            self._drainer.join(remaining())
+        if self.outbox is not None:
+            self.outbox.flush()
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, clock=self.clock)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _take_batch(self):
+        """Waits for a chat that may be sent to and takes its messages."""
+        with self._condition:
+            while True:
+                if self._closed and not self._pending and not self._in_flight:
+                    return None
+                wait = self._paused_until - self.clock()
+                if wait <= 0 and self.breaker is not None:
+                    wait = self.breaker.retry_in()
+                if wait <= 0:
+                    wait = None
+                    for chat_id in self._pending:
+                        if chat_id in self._in_flight:
+                            continue
+                        chat_delay = self._chat_bucket(chat_id).delay()
+                        if chat_delay:
+                            wait = chat_delay if wait is None else min(
+                                wait, chat_delay)
+                            continue
+                        global_delay = self._global_bucket.delay()
+                        if global_delay:
+                            wait = global_delay
+                            break
+                        if self.breaker and not self.breaker.allow():
+                            # The trial message of the half-open breaker
+                            # is in flight
+                            wait = self.drain_interval
+                            break
+                        self._chat_bucket(chat_id).acquire()
+                        self._global_bucket.acquire()
+                        self._in_flight.add(chat_id)
+                        return chat_id, self._pending.pop(chat_id)
+                self._condition.wait(wait)
+
+    def _requeue(self, chat_id, messages):
+        """Returns unsent messages to the head of the chat queue."""
+        with self._condition:
+            pending = self._pending.setdefault(chat_id, [])
+            pending[:0] = messages
+            self._pending.move_to_end(chat_id, last=False)
+            self._condition.notify()
+
+    def _finish(self, chat_id):
+        with self._condition:
+            self._in_flight.discard(chat_id)
+            bucket = self._chat_buckets.get(chat_id)
+            if chat_id not in self._pending and bucket and bucket.is_full():
+                del self._chat_buckets[chat_id]
+            self._condition.notify()
+
+    def _forget(self, message_ids):
+        with self._condition:
+            self._known.difference_update(message_ids)
+
+    def _deliver(self, chat_id, messages):
+        text, count = coalesce([message[0] for message in messages])
+        if count < len(messages):
+            self._requeue(chat_id, messages[count:])
+        sent = messages[:count]
+        message_ids = [
+            message_id for _, _, message_id in sent if message_id is not None
+        ]
+        try:
+            if self.outbox is not None:
+                self.outbox.flush()
+            self.send(chat_id, text)
+            self._delivered(sent, message_ids)
+        except TelegramRetryAfter as error_message:
+            self._retry_later(chat_id, sent, error_message)
+        except TelegramChatError as error_message:
+            self._rejected(message_ids, error_message)
+        except Exception as error_message:
+            self._failed(message_ids, error_message)
+        finally:
+            self._finish(chat_id)
+
+    def _delivered(self, sent, message_ids):
+        """Records the delivery of the sent messages."""
+        if self.breaker is not None:
+            self.breaker.record_success()
+        delivered = time.time()
+        for _, created, _ in sent:
+            if created is not None:
+                DELIVERY_LAG.observe(max(0, delivered - created))
+        if message_ids:
+            self.outbox.mark_delivered(message_ids)
+            self._forget(message_ids)
+
+    def _retry_later(self, chat_id, sent, error):
+        """Pauses sending for the time asked by Telegram and requeues."""
+        ERRORS.inc(type(error).__name__)
+        logging.warning(error)
+        if self.breaker is not None:
+            self.breaker.record_success()
+        with self._condition:
+            self._paused_until = max(
+                self._paused_until, self.clock() + error.retry_after)
+        self._requeue(chat_id, sent)
+
+    def _rejected(self, message_ids, error):
+        """Gives up the messages the chat does not accept."""
+        ERRORS.inc(type(error).__name__)
+        logging.error(error)
+        if self.breaker is not None:
+            self.breaker.record_success()
+        if message_ids:
+            self.outbox.mark_rejected(message_ids)
+            self._forget(message_ids)
+
+    def _failed(self, message_ids, error):
+        """Counts a failed attempt, the drainer retries the messages."""
+        ERRORS.inc(type(error).__name__)
+        logging.exception(error)
+        if (self.breaker is not None
+                and isinstance(error, TelegramConnectionError)):
+            self.breaker.record_failure()
+        if message_ids:
+            self.outbox.mark_failed(message_ids)
+            self._forget(message_ids)
+
+    def _touch_known(self):
+        """Keeps messages held in memory from being claimed elsewhere."""
+        with self._condition:
+            message_ids = list(self._known)
+        if message_ids:
+            self.outbox.touch(message_ids)
+
+    def _drain(self):
+        pruned = touched = time.monotonic()
+        while not self._stopped.wait(self.drain_interval):
+            try:
+                self.outbox.flush()
+                if time.monotonic() - touched >= self.outbox.stale_after / 2:
+                    self._touch_known()
+                    touched = time.monotonic()
+                for message_id, chat_id, text, created in (
+                        self.outbox.claim_stale()):
+                    self._enqueue(chat_id, text, created, message_id)
+                if time.monotonic() - pruned > PRUNE_INTERVAL:
+                    self.outbox.prune()
+                    pruned = time.monotonic()
+            except TelegramConnectionError:
+                return
+            except Exception as error_message:
+                logging.exception(error_message)
+
+    def _dispatch(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            try:
+                self._executor.submit(self._deliver, *batch)
+            except RuntimeError:
+                # The queue has been closed by the timeout, messages of
+                # the batch stay in the outbox
+                self._finish(batch[0])
+                return
@@ -0,0 +1,367 @@
+import hashlib
+import json
+import logging
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from delivery import TokenBucket
+from http_client import ConditionalCache
+from registry import TICK, TenantRegistry
+
+DEFAULT_CONCURRENCY = 100
+SHUTDOWN_TIMEOUT = 10
+# Delay of the next poll when the scheduler fails to choose one
+FALLBACK_DELAY = 600
+# Bytes of the tenant key digest, kept in memory for every tenant
+KEY_SIZE = 16
+
+
+def tenant_key(tenant_id):
+    """Returns the key of the tenant with the id in stores and leases.
+
+    The key does not depend on the token, so the cursor and the states
+    of a chat survive rotation of its token and restarts.
+    """
+    return hashlib.sha256(str(tenant_id).encode()).digest()[:KEY_SIZE]
+
+
+class Tenant:
+    """Subscription of one Telegram chat to one Practicum token.
+
+    The tenant is identified by the chat; a chat subscribed to several
+    tokens needs a distinct tenant_id for every subscription.
+    """
+
+    __slots__ = ('practicum_token', 'chat_id', 'key', 'timestamp',
+                 'failures', 'retry_after', 'reviewing', 'last_change',
+                 '_http_cache', 'locale', 'statuses', 'cohort', 'next_poll')
+
+    def __init__(self, practicum_token, chat_id, timestamp=None,
+                 locale=None, statuses=None, cohort=None, tenant_id=None):
+        self.practicum_token = practicum_token
+        self.chat_id = chat_id
+        self.locale = locale
+        self.statuses = frozenset(statuses) if statuses else None
+        self.cohort = cohort
+        self.key = tenant_key(chat_id if tenant_id is None else tenant_id)
+        self.timestamp = timestamp
+        self.failures = 0
+        self.retry_after = None
+        self.reviewing = False
+        self.last_change = None
+        self._http_cache = None
+        self.next_poll = None
+
+    @property
+    def http_cache(self):
+        """Validators of the last answer, created on the first poll."""
+        if self._http_cache is None:
+            self._http_cache = ConditionalCache()
+        return self._http_cache
+
+    @property
+    def headers(self):
+        """Headers of requests to the API, built on demand."""
+        return {'Authorization': f'OAuth {self.practicum_token}'}
+
+    def wants(self, homework):
+        """Checks whether the chat is notified about the homework."""
+        return self.statuses is None or homework.get('status') in self.statuses
+
+    def configure(self, other):
+        """Takes the chat settings of the tenant read from the config."""
+        self.locale = other.locale
+        self.statuses = other.statuses
+        self.cohort = other.cohort
+
+    def rotate(self, practicum_token):
+        """Replaces the token, the key and the poll state are kept."""
+        self.practicum_token = practicum_token
+        self.failures = 0
+        self.retry_after = None
+        self._http_cache = None
+
+    def __repr__(self):
+        return f'Tenant(chat_id={self.chat_id!r})'
+
+
+def tenant_from_record(record):
+    """Creates the tenant from its record in the tenants file."""
+    return Tenant(
+        record['practicum_token'],
+        record['chat_id'],
+        locale=record.get('locale'),
+        statuses=record.get('statuses'),
+        cohort=record.get('cohort'),
+        tenant_id=record.get('id')
+    )
+
+
+def load_tenants(path):
+    """Loads a list of tenants from the JSON file."""
+    with open(path, encoding='utf-8') as file:
+        records = json.load(file)
+    if not isinstance(records, list):
+        raise TypeError("Файл подписчиков должен содержать список.")
+    return [tenant_from_record(record) for record in records]
+
+
+class PollingEngine:
+    """Polls many tenants concurrently on the asyncio event loop.
+
+    The handler is a blocking callable that runs the whole
+    request -> check -> parse -> send pipeline for one tenant;
+    it is executed in a thread pool limited by ``concurrency``.
+    Delays between polls are chosen by the scheduler, and a single loop
+    takes due tenants from the timer wheel of the registry every tick
+    instead of keeping a sleeping task per tenant. Only one tenant of
+    every token is polled, the handler serves the other subscribers.
+
+    With a start_rate no more first polls are started per second after
+    the start and after update_tenants() adds leaders; first polls over
+    the limit wait for the next tick, so a restart or a large reload
+    warms up gradually, while later polls start when they are due.
+
+    With keys only the leaders with these keys are scheduled, the keys
+    owned by the worker are changed with own() and disown().
+    stop() ends scheduling and sets the deadline, shutdown_timeout
+    seconds later, for the polls in flight and for the rest of the
+    shutdown; join() waits for handler threads which outlive run().
+    """
+
+    def __init__(self, tenants, handler, scheduler,
+                 concurrency=DEFAULT_CONCURRENCY, tick=TICK,
+                 start_rate=None, shutdown_timeout=SHUTDOWN_TIMEOUT,
+                 keys=None, clock=time.monotonic):
+        if concurrency < 1:
+            raise ValueError("Параметр concurrency должен быть больше нуля.")
+        if not isinstance(tenants, TenantRegistry):
+            tenants = TenantRegistry(tenants, tick=tick, now=clock())
+        self.tenants = tenants
+        self.handler = handler
+        self.scheduler = scheduler
+        self.concurrency = concurrency
+        self.shutdown_timeout = shutdown_timeout
+        self.keys = None if keys is None else set(keys)
+        self.clock = clock
+        self.in_flight = 0
+        self.deadline = None
+        self._running = 0
+        self._idle = threading.Condition()
+        self._starts = (
+            TokenBucket(start_rate, clock=clock) if start_rate else None)
+        self._backlog = deque()
+        self._warming = set()
+        self._semaphore = None
+        self._executor = None
+        self._loop = None
+        self._lock = threading.Lock()
+        self._pending = []
+        self._polling = set()
+        self._stopping = False
+
+    @property
+    def scheduled(self):
+        """Number of tenants waiting for their next poll."""
+        return self.tenants.scheduled + len(self._backlog)
+
+    def stop(self):
+        """Stops starting polls, run() returns after the polls in flight.
+
+        May be called from any thread and from signal handlers.
+        """
+        if self.deadline is None:
+            self.deadline = self.clock() + self.shutdown_timeout
+        self._stopping = True
+
+    def join(self, timeout=None):
+        """Waits for handlers running in threads, False on the timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._running, timeout)
+
+    def _handle(self, tenant):
+        with self._idle:
+            self._running += 1
+        try:
+            self.handler(tenant)
+        finally:
+            with self._idle:
+                self._running -= 1
+                self._idle.notify_all()
+
+    def call_soon(self, callback, *args):
+        """Runs the callback on the event loop of the engine.
+
+        May be called from any thread; callbacks made before run() are
+        run when it starts.
+        """
+        with self._lock:
+            if self._loop is None:
+                self._pending.append((callback, args))
+                return
+        self._loop.call_soon_threadsafe(callback, *args)
+
+    def own(self, keys):
+        """Starts polling the leaders with the keys.
+
+        Must be called on the event loop of the engine, see call_soon().
+        """
+        self.keys.update(keys)
+        if self._loop is not None:
+            self._warm_up(self._unscheduled(
+                self.tenants.get(key) for key in keys))
+
+    def disown(self, keys):
+        """Stops polling the leaders with the keys.
+
+        Their timers are dropped when they fire. Must be called on the
+        event loop of the engine, see call_soon().
+        """
+        self.keys.difference_update(keys)
+
+    def update_tenants(self, tenants):
+        """Replaces the tenants of the running engine.
+
+        New leaders of tokens are scheduled as on start, removed tenants
+        are not polled again. Must be called on the event loop of the
+        engine. Returns the (added, removed, rotated) lists of the
+        registry.
+        """
+        added, removed, rotated = self.tenants.update(tenants)
+        self._warming.difference_update(removed)
+        if self._loop is not None:
+            self._warm_up(self._unscheduled(self.tenants.leaders()))
+        return added, removed, rotated
+
+    def _polled(self, tenant):
+        """Checks whether the tenant is a leader polled by the engine."""
+        return (tenant in self.tenants and self.tenants.is_leader(tenant)
+                and (self.keys is None or tenant.key in self.keys))
+
+    def _unscheduled(self, tenants):
+        """Returns polled tenants which have no poll scheduled."""
+        return [
+            tenant for tenant in tenants
+            if tenant is not None and self._polled(tenant)
+            and tenant.next_poll is None and tenant not in self._polling
+        ]
+
+    def _warm_up(self, tenants):
+        """Schedules first polls of the tenants within the start rate."""
+        now = self.clock()
+        for tenant in tenants:
+            self.tenants.schedule(
+                tenant, now + self.scheduler.initial_delay(tenant))
+            if self._starts is not None:
+                self._warming.add(tenant)
+
+    async def poll(self, tenant):
+        """Runs the handler once for the tenant within the concurrency cap."""
+        self.in_flight += 1
+        try:
+            async with self._semaphore:
+                await self._loop.run_in_executor(
+                    self._executor, self._handle, tenant)
+        except Exception as error_message:
+            logging.exception(
+                f"Необработанная ошибка опроса {tenant}: {error_message}")
+        finally:
+            self.in_flight -= 1
+
+    async def _poll_and_reschedule(self, tenant):
+        try:
+            await self.poll(tenant)
+        finally:
+            self._polling.discard(tenant)
+        if self._polled(tenant):
+            self.tenants.schedule(tenant, self.clock() + self._delay(tenant))
+
+    def _delay(self, tenant):
+        """Returns the delay before the next poll of the tenant.
+
+        A broken scheduler must not drop the tenant out of the wheel, so
+        its errors are logged and FALLBACK_DELAY is used.
+        """
+        try:
+            return self.scheduler.next_delay(tenant)
+        except Exception as error_message:
+            logging.exception(
+                f"Не удалось выбрать задержку опроса {tenant}: "
+                f"{error_message}")
+            return FALLBACK_DELAY
+
+    def _take_due(self):
+        """Returns due tenants, first polls only within the start rate."""
+        due = []
+        for tenant in self.tenants.due(self.clock()):
+            self._polling.add(tenant)
+            if tenant in self._warming:
+                self._backlog.append(tenant)
+            else:
+                due.append(tenant)
+        while self._backlog and not self._starts.delay():
+            self._starts.acquire()
+            tenant = self._backlog.popleft()
+            self._warming.discard(tenant)
+            due.append(tenant)
+        started = []
+        for tenant in due:
+            if self._polled(tenant):
+                started.append(tenant)
+            else:
+                self._polling.discard(tenant)
+        return started
+
+    async def run(self):
+        """Polls all tenants until cancelled."""
+        import asyncio
+
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            pending, self._pending = self._pending, []
+        logging.info(
+            f"Запуск опроса: подписчиков {len(self.tenants)}, "
+            f"параллельность {self.concurrency}")
+        self._warm_up(self._unscheduled(self.tenants.leaders()))
+        for callback, args in pending:
+            callback(*args)
+        polls = set()
+        try:
+            while not self._stopping:
+                for tenant in self._take_due():
+                    poll = asyncio.ensure_future(
+                        self._poll_and_reschedule(tenant))
+                    polls.add(poll)
+                    poll.add_done_callback(polls.discard)
+                await asyncio.sleep(self.tenants.wheel.tick)
+            logging.info(
+                f"Остановка опроса: ожидание {len(polls)} опросов")
+            if polls:
+                await asyncio.wait(
+                    polls, timeout=max(0, self.deadline - self.clock()))
+        finally:
+            for poll in polls:
+                poll.cancel()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run_until_signal(self):
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, self.stop)
+        await self.run()
+
+    def run_forever(self):
+        """Starts the event loop and polls tenants until SIGTERM or SIGINT.
+
+        Must be called from the main thread.
+        """
+        import asyncio
+
+        asyncio.run(self._run_until_signal())
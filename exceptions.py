@@ -10,9 +10,39 @@ class IncorrectAnswerFromAPI(ForwardingInTelegram):
     pass
 
 
+class APIServerError(IncorrectAnswerFromAPI):
+    pass
+
+
+class APIRateLimitError(IncorrectAnswerFromAPI):
+    def __init__(self, *args, retry_after=None):
+        super().__init__(*args)
+        self.retry_after = retry_after
+
+
 class APIConnectionError(ForwardingInTelegram):
     pass
 
 
 class TelegramConnectionError(NotForwardingInTelegram):
     pass
+
+
+class TelegramRetryAfter(TelegramConnectionError):
+    def __init__(self, *args, retry_after=0):
+        super().__init__(*args)
+        self.retry_after = retry_after
+
+
+class TelegramChatError(NotForwardingInTelegram):
+    pass
+
+
+class InvalidAPIResponse(NotForwardingInTelegram):
+    pass
+
+
+class CircuitOpenError(NotForwardingInTelegram):
+    def __init__(self, *args, retry_after=None):
+        super().__init__(*args)
+        self.retry_after = retry_after
@@ -0,0 +1,277 @@
+import hashlib
+import json
+import logging
+import threading
+import zlib
+from collections import Counter, namedtuple
+
+from storage import connect
+
+# Statuses are stored as small integers, unknown ones as 0
+STATUSES = (None, 'reviewing', 'approved', 'rejected')
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+BATCH_SIZE = 1000
+SNAPSHOT_EVERY = 500
+FLUSH_INTERVAL = 1
+# Events are clustered by week first, so appends touch only the pages
+# of the current week and their cost does not grow with the log
+PERIOD = 7 * 24 * 60 * 60
+# Bounds of SQLite integers used for open time ranges
+MIN_TIME = -2 ** 63
+MAX_TIME = 2 ** 63 - 1
+
+HomeworkEvent = namedtuple('HomeworkEvent', 'homework status at')
+# A verdict of the reviewer with the start of the review, if it was seen
+Verdict = namedtuple('Verdict', 'feed homework project status at reviewing')
+
+
+def feed_key(practicum_token):
+    """Returns the identifier of the token in the event log.
+
+    Events are shared by all chats subscribed to the token, and the
+    token itself is not written to disk.
+    """
+    return hashlib.sha256(practicum_token.encode()).hexdigest()[:16]
+
+
+class EventLog:
+    """Append-only log of homework status transitions kept in SQLite.
+
+    Events are clustered by (week, feed, homework, time): the history of
+    a homework or of a time range is read by one index search per week
+    without scanning other feeds.
+    Appends are buffered and written in one transaction by flush(),
+    which runs when the buffer is full and every flush_interval seconds
+    once started; a crash loses at most the last unflushed events. A
+    compressed snapshot of the feed state is saved every snapshot_every
+    events, so replay() reads a snapshot and the events after it.
+    """
+
+    def __init__(self, path, batch_size=BATCH_SIZE,
+                 snapshot_every=SNAPSHOT_EVERY,
+                 flush_interval=FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.snapshot_every = snapshot_every
+        self.flush_interval = flush_interval
+        self._connection = connect(path)
+        self._lock = threading.Lock()
+        self._pending = []
+        self._projects = {}
+        self._unsnapshotted = {}
+        self._stopped = threading.Event()
+        self._thread = None
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS homework_events ('
+                'period INTEGER NOT NULL, feed TEXT NOT NULL, '
+                'homework TEXT NOT NULL, at INTEGER NOT NULL, '
+                'status INTEGER NOT NULL, '
+                'PRIMARY KEY (period, feed, homework, at)) WITHOUT ROWID'
+            )
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS homework_snapshots ('
+                'feed TEXT NOT NULL, at INTEGER NOT NULL, '
+                'state BLOB NOT NULL, '
+                'PRIMARY KEY (feed, at)) WITHOUT ROWID'
+            )
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS homework_projects ('
+                'feed TEXT NOT NULL, homework TEXT NOT NULL, '
+                'project TEXT NOT NULL, '
+                'PRIMARY KEY (feed, homework)) WITHOUT ROWID'
+            )
+
+    def append(self, feed, homework, status, at, project=None):
+        """Buffers the transition of the homework to the status at time."""
+        at = int(at)
+        with self._lock:
+            self._pending.append((
+                at // PERIOD, feed, str(homework), at,
+                STATUS_CODES.get(status, 0)
+            ))
+            if project:
+                self._projects[feed, str(homework)] = project
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Writes buffered events and due snapshots in one transaction."""
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, []
+            projects, self._projects = self._projects, {}
+            with self._connection:
+                self._connection.executemany(
+                    'INSERT OR REPLACE INTO homework_projects '
+                    '(feed, homework, project) VALUES (?, ?, ?)',
+                    (key + (project,) for key, project in projects.items())
+                )
+                self._write(pending)
+
+    def _write(self, events):
+        earliest = {}
+        for _, feed, _, at, _ in events:
+            earliest[feed] = min(at, earliest.get(feed, at))
+        counts = Counter(event[1] for event in events)
+        added = self._connection.total_changes
+        self._connection.executemany(
+            'INSERT OR IGNORE INTO homework_events '
+            '(period, feed, homework, at, status) VALUES (?, ?, ?, ?, ?)',
+            events
+        )
+        if self._connection.total_changes == added:
+            return
+        # An event older than a snapshot makes the snapshot incomplete
+        self._connection.executemany(
+            'DELETE FROM homework_snapshots WHERE feed = ? AND at >= ?',
+            earliest.items()
+        )
+        for feed in earliest:
+            count = self._unsnapshotted.get(feed, 0) + counts[feed]
+            if count < self.snapshot_every:
+                self._unsnapshotted[feed] = count
+                continue
+            self._unsnapshotted.pop(feed, None)
+            state, at = self._replay(feed, None)
+            if at is not None:
+                self._connection.execute(
+                    'INSERT OR REPLACE INTO homework_snapshots '
+                    '(feed, at, state) VALUES (?, ?, ?)',
+                    (feed, at, zlib.compress(json.dumps(state).encode()))
+                )
+
+    def _periods(self, since, until):
+        """Returns the weeks holding events between the times."""
+        # Separate queries, SQLite reads only one end of the index for each
+        first = self._connection.execute(
+            'SELECT MIN(period) FROM homework_events').fetchone()[0]
+        last = self._connection.execute(
+            'SELECT MAX(period) FROM homework_events').fetchone()[0]
+        if first is None:
+            return []
+        if since is not None:
+            first = max(first, int(since) // PERIOD)
+        if until is not None:
+            last = min(last, int(until) // PERIOD)
+        return list(range(first, last + 1))
+
+    def _select(self, feed, periods, condition, params):
+        placeholders = ', '.join('?' * len(periods))
+        return self._connection.execute(
+            'SELECT homework, status, at FROM homework_events '
+            f'WHERE period IN ({placeholders}) AND feed = ? {condition} '
+            'ORDER BY at, homework',
+            periods + [feed] + params
+        )
+
+    def events(self, feed, homework=None, since=None, until=None):
+        """Returns events of the feed within [since, until], oldest first.
+
+        With a homework only the events of that homework are read.
+        """
+        condition, params = '', []
+        if homework is not None:
+            condition += ' AND homework = ?'
+            params.append(str(homework))
+        if since is not None:
+            condition += ' AND at >= ?'
+            params.append(int(since))
+        if until is not None:
+            condition += ' AND at <= ?'
+            params.append(int(until))
+        self.flush()
+        with self._lock:
+            periods = self._periods(since, until)
+            rows = self._select(feed, periods, condition, params).fetchall()
+        return [
+            HomeworkEvent(homework, STATUSES[status], at)
+            for homework, status, at in rows
+        ]
+
+    def _replay(self, feed, until):
+        """Returns the state of the feed and the time of its last event."""
+        until = MAX_TIME if until is None else int(until)
+        snapshot = self._connection.execute(
+            'SELECT at, state FROM homework_snapshots '
+            'WHERE feed = ? AND at <= ? ORDER BY at DESC LIMIT 1',
+            (feed, until)
+        ).fetchone()
+        state, last = {}, None
+        if snapshot is not None:
+            last, state = snapshot[0], json.loads(zlib.decompress(snapshot[1]))
+        rows = self._select(
+            feed, self._periods(last, until), 'AND at > ? AND at <= ?',
+            [MIN_TIME if last is None else last, until])
+        for homework, status, at in rows:
+            state[homework] = [STATUSES[status], at]
+            last = at
+        return state, last
+
+    def replay(self, feed, until=None):
+        """Rebuilds {homework: (status, at)} of the feed as of the time."""
+        self.flush()
+        with self._lock:
+            state, _ = self._replay(feed, until)
+        return {
+            homework: tuple(event) for homework, event in state.items()
+        }
+
+    def verdicts(self, since=None, until=None):
+        """Returns approvals and rejections made within [since, until].
+
+        The review start is the time of the previous event of the
+        homework if it was 'reviewing', so reviews started before since
+        are measured in full. Previous events are found by a window
+        function in the database instead of replaying every homework.
+        """
+        until = MAX_TIME if until is None else int(until)
+        since = MIN_TIME if since is None else int(since)
+        self.flush()
+        with self._lock:
+            periods = self._periods(None, until)
+            placeholders = ', '.join('?' * len(periods))
+            rows = self._connection.execute(
+                'SELECT events.feed, events.homework, projects.project, '
+                'events.status, events.at, events.reviewing FROM ('
+                'SELECT feed, homework, status, at, '
+                'CASE WHEN LAG(status) OVER homework = ? '
+                'THEN LAG(at) OVER homework END AS reviewing '
+                'FROM homework_events '
+                f'WHERE period IN ({placeholders}) AND at <= ? '
+                'WINDOW homework AS (PARTITION BY feed, homework ORDER BY at)'
+                ') AS events LEFT JOIN homework_projects AS projects '
+                'ON projects.feed = events.feed '
+                'AND projects.homework = events.homework '
+                'WHERE events.status IN (?, ?) AND events.at >= ?',
+                [STATUS_CODES['reviewing']] + periods + [
+                    until, STATUS_CODES['approved'],
+                    STATUS_CODES['rejected'], since]
+            ).fetchall()
+        return [
+            Verdict(feed, homework, project, STATUSES[status], at, reviewing)
+            for feed, homework, project, status, at, reviewing in rows
+        ]
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as error_message:
+                logging.exception(error_message)
+
+    def start(self):
+        """Starts writing buffered events in background."""
+        self._thread = threading.Thread(
+            target=self._run, name='event-log', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Writes buffered events and closes the database connection."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        with self._lock:
+            self._connection.close()
@@ -1,45 +1,90 @@
 import logging
-import logging.config
+import multiprocessing
+import signal
 import sys
+import threading
 import time
+from collections import namedtuple
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from functools import partial
 from http import HTTPStatus
-import requests
-import telegram
+
+from commands import COMMAND_WORKERS, BotCommands, start_commands
+from config import Config, ConfigWatcher, apply_tunables, load_config
+from delivery import SENDERS, OutboundQueue
+from engine import PollingEngine, Tenant
 from exceptions import (
-    APIConnectionError, ForwardingInTelegram, IncorrectAnswerFromAPI,
-    NotForwardingInTelegram, TelegramConnectionError)
-from setting import PRACTICUM_TOKEN, TELEGRAM_CHAT_ID, TELEGRAM_TOKEN
+    APIConnectionError, APIRateLimitError, APIServerError, CircuitOpenError,
+    ForwardingInTelegram, IncorrectAnswerFromAPI, NotForwardingInTelegram,
+    TelegramChatError, TelegramConnectionError, TelegramRetryAfter)
+from history import EventLog, feed_key
+from http_client import (
+    CONNECT_TIMEOUT, READ_TIMEOUT, create_session, parse_retry_after)
+from log_config import setup_logging
+from metrics import (
+    API_LATENCY, API_NOT_MODIFIED, API_RESPONSE_SIZE, ERRORS, QUEUE_DEPTH,
+    SCHEDULED_POLLS, SEND_LATENCY, TENANTS, start_metrics_server)
+from outbox import Outbox
+from registry import TenantRegistry
+from rendering import DEFAULT_LOCALE, VERDICT_CATALOGS, MessageRenderer
+from resilience import CircuitBreaker, ErrorDigest
+from scheduler import PollScheduler
+from schema import (
+    HomeworkRecord, iter_homeworks, raise_problems, validate_homework,
+    validate_response)
+from setting import (
+    CONFIG_WATCH_INTERVAL, DYNO, LOG_FILE, METRICS_PORT, POLL_CONCURRENCY,
+    POLL_START_RATE, PRACTICUM_TOKEN, SHARD_DB, SHUTDOWN_TIMEOUT, STATE_DB,
+    TELEGRAM_CHAT_ID, TELEGRAM_PARSE_MODE, TELEGRAM_TOKEN, TENANTS_FILE,
+    WEBHOOK_PORT, WEBHOOK_URL, WORKER_ID, WORKERS)
+from sharding import LeaseStore, ShardCoordinator, WorkerHeartbeat
+from storage import CursorStore, HomeworkStateStore, get_homework_key
+from streaming import StreamingAnswer
 
 RETRY_TIME = 600
 ENDPOINT = 'https://practicum.yandex.ru/api/user_api/homework_statuses/'
 HEADERS = {'Authorization': f'OAuth {PRACTICUM_TOKEN}'}
+API_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+STREAM_CHUNK_SIZE = 16 * 1024
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+API_FAILURES = (APIConnectionError, APIRateLimitError, APIServerError)
+RATE_LIMIT_STATUSES = (
+    HTTPStatus.TOO_MANY_REQUESTS, HTTPStatus.SERVICE_UNAVAILABLE)
 
-VERDICTS = {
-    'approved': 'Работа проверена: ревьюеру всё понравилось. Ура!',
-    'reviewing': 'Работа взята на проверку ревьюером.',
-    'rejected': 'Работа проверена: у ревьюера есть замечания.'
-}
-
-# Common logger configuration
-console_handler = logging.StreamHandler()
-file_handler = logging.FileHandler(
-    filename='homework.log',
-    mode='a',
-    encoding='cp1251'
-)
-logging.basicConfig(
-    handlers=(console_handler, file_handler),
-    level=logging.INFO,
-    format='%(asctime)s %(levelname)s %(lineno)d %(message)s'
-)
+VERDICTS = VERDICT_CATALOGS[DEFAULT_LOCALE]
+RENDERER = MessageRenderer(parse_mode=TELEGRAM_PARSE_MODE)
 
 
 def send_message(bot, message):
     """Sends a message to the Telegram chat."""
+    send_chat_message(bot, TELEGRAM_CHAT_ID, message)
+
+
+def send_chat_message(bot, chat_id, message):
+    """Sends a message to the specified Telegram chat.
+
+    Errors of the chat, such as a bot blocked by the user or a deleted
+    chat, raise TelegramChatError; they say nothing about the health of
+    Telegram. Network and server errors raise TelegramConnectionError.
+    """
+    from telegram.error import (
+        BadRequest, ChatMigrated, RetryAfter, TelegramError, Unauthorized)
+
     try:
         logging.info("Отправка сообщения в Telegram.")
-        bot.sendMessage(chat_id=TELEGRAM_CHAT_ID, text=message)
-    except telegram.error.TelegramError:
+        with SEND_LATENCY.time():
+            bot.sendMessage(
+                chat_id=chat_id, text=message, parse_mode=RENDERER.parse_mode)
+    except RetryAfter as error:
+        raise TelegramRetryAfter(
+            f"Telegram ограничил отправку на {error.retry_after} с.",
+            retry_after=error.retry_after
+        )
+    except (BadRequest, ChatMigrated, Unauthorized) as error:
+        raise TelegramChatError(
+            f"Telegram отклонил сообщение для чата {chat_id}: {error}")
+    except TelegramError:
         raise TelegramConnectionError("Сбой при отправке сообщений в Telegram")
     else:
         logging.info("Успешная отправка сообщения в Telegram.")
@@ -47,69 +92,152 @@ def send_message(bot, message):
 
 def get_api_answer(current_timestamp):
     """Makes a request to the only endpoint of the API service."""
+    return request_api_answer(HEADERS, current_timestamp)
+
+
+def request_api_answer(headers, current_timestamp, session=None,
+                       cache=None):
+    """Makes a request to the API with the headers of a specific tenant.
+
+    The session is either the requests module itself or a pooled session
+    from http_client shared by all tenants. With a ConditionalCache an
+    answer equal to the last processed one is not decoded, an empty
+    list of homeworks is returned instead.
+    """
+    if session is None:
+        import requests
+        session = requests
     request_kwargs = {'url': ENDPOINT,
-                      'headers': HEADERS,
+                      'headers': cache.apply(headers) if cache else headers,
                       'params': {
-                          'from_date': current_timestamp or int(time.time())
-                      }}
+                          'from_date': (
+                              int(time.time()) if current_timestamp is None
+                              else current_timestamp)
+                      },
+                      'timeout': API_TIMEOUT}
     logging.info(
-        ("Запрос к API \nurl= {url}\nheaders= {headers}"
-         "\nparams= {params}").format(**request_kwargs)
+        "Запрос к API \nurl= {url}\nparams= {params}".format(
+            **request_kwargs)
     )
     try:
-        response = requests.get(**request_kwargs)
-        if response.status_code != HTTPStatus.OK:
-            raise IncorrectAnswerFromAPI(
-                ("Неверный ответ от API:\nstatus_code= {status}\n"
-                 "status_text= {status_text}\ntext= {text}")
-                .format(
-                    status=response.status_code,
-                    status_text=response.reason,
-                    text=response.text
-                )
-            )
+        with API_LATENCY.time():
+            response = session.get(**request_kwargs)
+        content = getattr(response, 'content', None)
+        if content is not None:
+            API_RESPONSE_SIZE.observe(len(content))
+        if cache is not None:
+            unchanged, current_date = cache.unchanged(response)
+            if unchanged:
+                API_NOT_MODIFIED.inc()
+                return {'homeworks': [], 'current_date': current_date}
+        raise_for_api_status(response)
         return response.json()
+    except IncorrectAnswerFromAPI:
+        raise
     except Exception as error_message:
         raise APIConnectionError(
             (
                 "Ошибка подключение к API\nerror= {error_message}\n"
-                "url= {url}\nheaders= {headers}\nparams= {params}")
+                "url= {url}\nparams= {params}")
             .format(error_message=error_message, **request_kwargs)
         )
 
 
+def raise_for_api_status(response):
+    """Raises the API error matching the status of the answer."""
+    if response.status_code in RATE_LIMIT_STATUSES:
+        raise APIRateLimitError(
+            ("API ограничивает частоту запросов:\nstatus_code= {status}"
+             "\nRetry-After= {retry_after}")
+            .format(
+                status=response.status_code,
+                retry_after=response.headers.get('Retry-After')
+            ),
+            retry_after=parse_retry_after(
+                response.headers.get('Retry-After'))
+        )
+    if response.status_code != HTTPStatus.OK:
+        error_class = (
+            APIServerError
+            if response.status_code >= HTTPStatus.INTERNAL_SERVER_ERROR
+            else IncorrectAnswerFromAPI
+        )
+        raise error_class(
+            ("Неверный ответ от API:\nstatus_code= {status}\n"
+             "status_text= {status_text}\ntext= {text}")
+            .format(
+                status=response.status_code,
+                status_text=response.reason,
+                text=response.text
+            )
+        )
+
+
+def stream_api_answer(headers, current_timestamp, session=None):
+    """Requests the API and returns the answer as a StreamingAnswer.
+
+    The body is read in chunks while the homeworks are iterated, so
+    large answers, such as backfills from zero, are never held in
+    memory whole. Errors of reading raise APIConnectionError.
+    """
+    if session is None:
+        import requests
+        session = requests
+    request_kwargs = {'url': ENDPOINT,
+                      'headers': headers,
+                      'params': {'from_date': current_timestamp},
+                      'timeout': API_TIMEOUT,
+                      'stream': True}
+    logging.info(
+        "Потоковый запрос к API \nurl= {url}\nparams= {params}".format(
+            **request_kwargs)
+    )
+    try:
+        response = session.get(**request_kwargs)
+    except Exception as error_message:
+        raise APIConnectionError(
+            f"Ошибка подключение к API\nerror= {error_message}")
+    try:
+        raise_for_api_status(response)
+    except IncorrectAnswerFromAPI:
+        response.close()
+        raise
+    except Exception as error_message:
+        response.close()
+        raise APIConnectionError(
+            f"Ошибка подключение к API\nerror= {error_message}")
+    return StreamingAnswer(read_body(response))
+
+
+def read_body(response, chunk_size=STREAM_CHUNK_SIZE):
+    """Yields chunks of the body, closing the connection at the end."""
+    try:
+        yield from response.iter_content(chunk_size)
+    except Exception as error_message:
+        raise APIConnectionError(
+            f"Ответ API прерван\nerror= {error_message}")
+    finally:
+        response.close()
+
+
 def check_response(response):
     """Checks the API response for correctness."""
     logging.info("Проверка ответа API")
-    if not isinstance(response, dict):
-        raise TypeError("Ответ от API имеет некорректный тип.")
-    homeworks = response.get('homeworks')
-    if not homeworks:
-        raise KeyError(
-            "Отсутствие ключа 'homeworks' или  в ответе API."
-        )
-    if not isinstance(homeworks, list):
-        raise KeyError(
-            ("Ключ 'homeworks' в ответе от API домашняя работа приходят"
-             "не в виде списка")
-        )
-    return homeworks
+    return validate_response(response)
 
 
 def parse_status(homework):
     """Gets status about specific homework."""
-    homework_name = homework.get('homework_name')
-    homework_status = homework.get('status')
-    verdict = VERDICTS.get(homework_status)
-    if not homework_name:
-        raise KeyError("Отсутствие ключа 'homework_name' в ответе API.")
-    if not homework_status:
-        raise KeyError("Отсутствие ключа 'status' в ответе API.")
-    if not verdict:
-        raise ValueError(
-            "Недокументированный статус домашней работы в ответе от API"
-        )
-    return f'Изменился статус проверки работы "{homework_name}". {verdict}'
+    return render_status(homework, DEFAULT_LOCALE)
+
+
+def render_status(homework, locale):
+    """Gets status about specific homework in the given locale."""
+    if not isinstance(homework, HomeworkRecord):
+        homework = validate_homework(homework)
+    if homework.errors:
+        raise_problems(homework.errors)
+    return RENDERER.render(locale, homework.homework_name, homework.status)
 
 
 def check_tokens():
@@ -124,44 +252,484 @@ def check_tokens():
     for name_token, token in tokens.items():
         if not token:
             logging.critical(
-                "Отсутствует обязательная переменная окружения {name_token}."
+                f"Отсутствует обязательная переменная окружения {name_token}."
             )
     return False
 
 
-def main():
-    """The main logic of the bot."""
-    if not check_tokens():
-        sys.exit("Отсутствует обязательные переменные окружения.")
-    bot = telegram.Bot(token=TELEGRAM_TOKEN)
-    prev_message = ''
+def parse_date(value):
+    """Converts the API date to Unix time, returns None if impossible."""
+    try:
+        return datetime.strptime(value, DATE_FORMAT).replace(
+            tzinfo=timezone.utc).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def get_next_cursor(response, current_cursor):
+    """Returns the next from_date taken from the API current_date."""
+    if isinstance(response, dict):
+        current_date = response.get('current_date')
+        if isinstance(current_date, int) and current_date > current_cursor:
+            return current_date
+    return current_cursor
+
+
+def advance_cursor(tenant, response, cursors):
+    """Moves the cursor of the tenant forward and saves it."""
+    next_cursor = get_next_cursor(response, tenant.timestamp)
+    if next_cursor != tenant.timestamp:
+        tenant.timestamp = next_cursor
+        cursors.set(tenant.key, next_cursor)
+
+
+# Services shared by polling cycles of all tenants; without a circuit
+# breaker and an error digest requests and notifications are not limited,
+# without an event log transitions are not kept
+PollContext = namedtuple(
+    'PollContext',
+    'queue cursors states session scheduler api_breaker notices events',
+    defaults=(None, None, None)
+)
+
+
+def guard_api(context):
+    """Returns the circuit breaker guard of requests to the API."""
+    if context.api_breaker is None:
+        return nullcontext()
+    return context.api_breaker.protect(API_FAILURES)
+
+
+def notify_changes(context, tenant, homeworks):
+    """Sends messages about changed homeworks and saves their states.
+
+    States are saved after the messages are written to the outbox,
+    so a crash in between repeats a message instead of losing it.
+    Homeworks filtered out by the statuses of the chat are saved
+    without a message.
+    """
+    changed = context.states.diff(tenant.key, homeworks)
+    if not changed:
+        logging.debug(
+            ("Сообщение не отправлено в Телеграмм, "
+             "было отправлено ранее"))
+    messages = [
+        (homework, render_status(homework, tenant.locale))
+        for homework in changed if tenant.wants(homework)
+    ]
+    for homework, message in messages:
+        context.queue.put(
+            tenant.chat_id,
+            message,
+            created=parse_date(homework.get('date_updated'))
+        )
+    if messages:
+        context.queue.flush()
+    for homework in changed:
+        context.states.save(tenant.key, homework)
+
+
+def record_events(context, tenant, homeworks):
+    """Appends the polled statuses to the history of the token."""
+    if context.events is None:
+        return
+    feed = feed_key(tenant.practicum_token)
+    for homework in homeworks:
+        updated = parse_date(homework.get('date_updated'))
+        context.events.append(
+            feed,
+            get_homework_key(homework),
+            homework.get('status'),
+            time.time() if updated is None else updated,
+            project=homework.get('lesson_name')
+        )
+
+
+def notify_error(context, tenant, error):
+    """Sends the error to the chat unless the digest suppresses it."""
+    notice = str(error)
+    if context.notices is not None:
+        notice = context.notices.report(tenant.chat_id, error)
+    if notice:
+        context.queue.put(tenant.chat_id, RENDERER.escape(notice))
+
+
+def serve_subscriber(context, tenant, homeworks, response):
+    """Notifies one subscriber of the polled token and moves its cursor."""
+    if context.notices is not None:
+        context.notices.resolve(tenant.chat_id)
+    if homeworks:
+        notify_changes(context, tenant, homeworks)
+    else:
+        logging.debug("В ответе нет новых статусов.")
+    advance_cursor(tenant, response, context.cursors)
+
+
+def process_tenant(context, tenant, subscribers=None):
+    """Runs one polling cycle for the tenant.
+
+    The API is requested once with the token of the tenant, and the
+    answer is delivered to every subscriber of the token, the tenant
+    itself by default.
+    """
+    subscribers = subscribers or [tenant]
+    timestamps = [
+        subscriber.timestamp for subscriber in subscribers
+        if subscriber.timestamp is not None
+    ]
+    try:
+        with guard_api(context):
+            response = request_api_answer(
+                tenant.headers, min(timestamps, default=None),
+                context.session, tenant.http_cache)
+        homeworks = validate_response(response, strict=True)
+        context.scheduler.record_success(tenant, homeworks)
+        record_events(context, tenant, homeworks)
+        for subscriber in subscribers:
+            serve_subscriber(context, subscriber, homeworks, response)
+        tenant.http_cache.commit()
+    except CircuitOpenError as error_message:
+        ERRORS.inc(type(error_message).__name__)
+        logging.debug(error_message)
+        context.scheduler.record_failure(tenant, error_message)
+    except NotForwardingInTelegram as error_message:
+        ERRORS.inc(type(error_message).__name__)
+        logging.exception(error_message)
+    except ForwardingInTelegram as error_message:
+        ERRORS.inc(type(error_message).__name__)
+        logging.exception(error_message)
+        context.scheduler.record_failure(tenant, error_message)
+        for subscriber in subscribers:
+            notify_error(context, subscriber, error_message)
+    except Exception as error_message:
+        ERRORS.inc(type(error_message).__name__)
+        logging.exception(error_message)
+    else:
+        logging.debug("Цикл отработан без исключений")
+
+
+def process_feed(context, tenants, tenant):
+    """Polls the token of the tenant for all chats subscribed to it."""
+    process_tenant(context, tenant, tenants.subscribers(tenant))
+
+
+def fetch_homeworks(context, tenant):
+    """Requests all homeworks of the tenant for a reply to a command.
+
+    The answer is streamed. Nothing is saved: the state store holds the
+    statuses the chat has been notified about, and writing there would
+    hide changes from the next poll. Returns the homeworks, the newest
+    first.
+    """
+    with guard_api(context):
+        answer = stream_api_answer(tenant.headers, 0, context.session)
+        homeworks = [
+            {'homework_name': record.homework_name,
+             'status': record.status,
+             'date_updated': record.date_updated}
+            for record in iter_homeworks(answer, strict=True)
+        ]
+    return sorted(
+        homeworks,
+        key=lambda homework: homework['date_updated'] or '',
+        reverse=True
+    )
+
+
+def apply_config(context, engine, primary, config, subscribers=()):
+    """Applies the reloaded configuration to the running worker.
+
+    Runs on the event loop of the engine; subscribers are called with
+    the registry of tenants after the change.
+    """
+    apply_tunables(context.scheduler, config.tunables)
+    added, removed, rotated = engine.update_tenants(
+        [primary] + config.tenants)
     current_timestamp = int(time.time())
-    while True:
+    for tenant in added:
+        tenant.timestamp = (
+            context.cursors.get(tenant.key) or current_timestamp)
+    for tenant in removed:
+        context.states.forget(tenant.key)
+    for subscriber in subscribers:
+        subscriber(engine.tenants)
+    logging.info(
+        f"Подписчики обновлены: добавлено {len(added)}, "
+        f"удалено {len(removed)}, заменён токен у {len(rotated)}."
+    )
+
+
+def is_commands_worker(index):
+    """Checks whether this worker process should receive bot commands.
+
+    Telegram allows only one consumer of updates per bot, so commands
+    are received by the first local process of the first dyno.
+    """
+    return index == 0 and (not DYNO or DYNO.endswith('.1'))
+
+
+def check_sharding():
+    """Checks that workers of several dynos share their leases.
+
+    Dynos do not share files, so leases kept in STATE_DB of every dyno
+    would let each of them poll all tenants.
+    """
+    if DYNO and WORKERS > 1 and not SHARD_DB:
+        logging.critical(
+            "Для воркеров на dyno нужна общая база аренд: укажите SHARD_DB.")
+        return False
+    return True
+
+
+def start_sharding(worker_id, context, engine, store=None):
+    """Starts sharing the tokens of the tenants with other workers.
+
+    Leases are taken per token: the key of the leader stands for all
+    chats subscribed to it. The engine polls only the leaders leased
+    by this worker; the store defaults to LeaseStore of SHARD_DB.
+    """
+    tenants = engine.tenants
+
+    def acquire(keys):
+        for key in keys:
+            leader = tenants.get(key)
+            if leader is None:
+                continue
+            for tenant in tenants.subscribers(leader):
+                context.states.forget(tenant.key)
+                tenant.timestamp = (
+                    context.cursors.get(tenant.key) or tenant.timestamp)
+        engine.own(keys)
+
+    coordinator = ShardCoordinator(
+        worker_id,
+        LeaseStore(SHARD_DB or STATE_DB) if store is None else store,
+        [tenant.key for tenant in tenants.leaders()],
+        on_acquire=lambda keys: engine.call_soon(acquire, keys),
+        on_release=lambda keys: engine.call_soon(engine.disown, keys)
+    )
+    engine.handler = coordinator.guard(engine.handler)
+    coordinator.start()
+    return coordinator
+
+
+def run_worker(worker_id, index=0):
+    """Polls the tenants of this worker until interrupted."""
+    import telegram
+    from telegram.utils.request import Request
+
+    # Senders and command handlers share the pool with getUpdates
+    bot = telegram.Bot(
+        token=TELEGRAM_TOKEN,
+        request=Request(con_pool_size=SENDERS + COMMAND_WORKERS + 4)
+    )
+    context = PollContext(
+        queue=OutboundQueue(
+            lambda chat_id, message: send_chat_message(bot, chat_id, message),
+            outbox=Outbox(STATE_DB),
+            breaker=CircuitBreaker('Telegram')
+        ),
+        cursors=CursorStore(STATE_DB),
+        states=HomeworkStateStore(STATE_DB),
+        session=create_session(HEADERS, pool_size=POLL_CONCURRENCY),
+        scheduler=PollScheduler(RETRY_TIME),
+        api_breaker=CircuitBreaker('Practicum API'),
+        notices=ErrorDigest(),
+        events=EventLog(STATE_DB)
+    )
+    current_timestamp = int(time.time())
+    primary = Tenant(PRACTICUM_TOKEN, TELEGRAM_CHAT_ID)
+    config = Config([], {})
+    if TENANTS_FILE:
+        config = load_config(TENANTS_FILE, [primary])
+        apply_tunables(context.scheduler, config.tunables)
+    tenants = TenantRegistry([primary] + config.tenants)
+    for tenant in tenants:
+        tenant.timestamp = (
+            context.cursors.get(tenant.key) or current_timestamp)
+
+    sharded = SHARD_DB or WORKERS > 1
+    subscribers = []
+    services = []
+    engine = PollingEngine(
+        tenants,
+        partial(process_feed, context, tenants),
+        context.scheduler,
+        concurrency=POLL_CONCURRENCY,
+        start_rate=POLL_START_RATE,
+        shutdown_timeout=SHUTDOWN_TIMEOUT,
+        keys=() if sharded else None
+    )
+    if sharded:
+        coordinator = start_sharding(worker_id, context, engine)
+        subscribers.append(
+            lambda registry: coordinator.set_tenants(registry.leaders()))
+        services.append(coordinator)
+    else:
+        heartbeat = WorkerHeartbeat(worker_id, LeaseStore(STATE_DB))
+        heartbeat.start()
+        services.append(heartbeat)
+    TENANTS.set_function(lambda: len(engine.tenants))
+    SCHEDULED_POLLS.set_function(lambda: engine.scheduled)
+    QUEUE_DEPTH.set_function(lambda: context.queue.depth)
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT + index)
+    context.queue.start()
+    context.events.start()
+    if is_commands_worker(index):
+        commands = BotCommands(
+            tenants,
+            context.states,
+            context.queue,
+            lambda tenant: fetch_homeworks(context, tenant),
+            RENDERER.verdicts,
+            escape=RENDERER.escape
+        )
+        services.append(
+            start_commands(bot, commands, WEBHOOK_URL, WEBHOOK_PORT))
+        subscribers.append(commands.set_tenants)
+    if TENANTS_FILE:
+        watcher = ConfigWatcher(
+            TENANTS_FILE,
+            lambda config: engine.call_soon(
+                apply_config, context, engine, primary, config, subscribers),
+            interval=CONFIG_WATCH_INTERVAL,
+            reserved=[primary]
+        )
+        watcher.start()
+        services.append(watcher)
+    try:
+        engine.run_forever()
+    finally:
+        shutdown(
+            context, services,
+            engine.deadline or time.monotonic() + SHUTDOWN_TIMEOUT, engine)
+
+
+def stop_service(service, timeout):
+    """Stops the service waiting no longer than the timeout.
+
+    The service is stopped in a daemon thread, so a slow stop, such as
+    the long poll of the updater, does not delay the exit. Returns
+    False when the service has not stopped in time.
+    """
+    def stop():
         try:
-            response = get_api_answer(current_timestamp)
-            homeworks = check_response(response)
-            if homeworks:
-                message = parse_status(homeworks.pop(0))
-                if message != prev_message:
-                    send_message(bot, message)
-                    prev_message = message
-                else:
-                    logging.debug(
-                        ("Сообщение не отправлено в Телеграмм, "
-                         "было отправлено ранее"))
-            else:
-                logging.debug("В ответе нет новых статусов.")
-        except NotForwardingInTelegram as error_message:
-            logging.exception(error_message)
-        except ForwardingInTelegram as error_message:
-            logging.exception(error_message)
-            send_message(bot, error_message)
+            service.stop()
         except Exception as error_message:
             logging.exception(error_message)
-        else:
-            logging.debug("Цикл отработан без исключений")
-        finally:
-            time.sleep(RETRY_TIME)
+
+    thread = threading.Thread(
+        target=stop, name=f'stop-{type(service).__name__}', daemon=True)
+    thread.start()
+    thread.join(timeout)
+    return not thread.is_alive()
+
+
+def shutdown(context, services, deadline, engine=None):
+    """Stops the services and delivers queued messages before exit.
+
+    Every step waits only for the time left to the deadline, a value of
+    time.monotonic(). Stores are closed once the poll threads of the
+    engine and the services have finished; otherwise they are left
+    open for the threads until the process exits. Messages left
+    undelivered stay in the outbox and are sent after the restart.
+    """
+    def remaining():
+        return max(0, deadline - time.monotonic())
+
+    logging.info("Остановка бота.")
+    stopped = all([
+        stop_service(service, remaining()) for service in reversed(services)
+    ])
+    if engine is not None:
+        stopped = engine.join(remaining()) and stopped
+    context.queue.close(timeout=remaining())
+    if not stopped:
+        logging.warning(
+            "Опросы и сервисы не остановились к сроку, хранилища "
+            "не закрыты.")
+        return
+    if context.events is not None:
+        context.events.close()
+    context.cursors.close()
+    context.states.close()
+    logging.info("Бот остановлен.")
+
+
+def worker_log_file(index):
+    """Returns the log file of the worker process with the index.
+
+    Every process writes and rotates its own file, rotation of a file
+    shared between processes would lose and mix records.
+    """
+    return f'{LOG_FILE}.{index}'
+
+
+def start_worker(worker_id, index):
+    """Configures logging of the worker process and runs the worker."""
+    setup_logging(filename=worker_log_file(index))
+    run_worker(worker_id, index)
+
+
+def check_config():
+    """Validates tokens and the tenants file without starting the bot.
+
+    The Telegram stack is not imported, so the check is fast enough for
+    release phases and health checks.
+    """
+    if not check_tokens():
+        return False
+    if TENANTS_FILE:
+        try:
+            config = load_config(
+                TENANTS_FILE, [Tenant(PRACTICUM_TOKEN, TELEGRAM_CHAT_ID)])
+        except Exception as error_message:
+            logging.critical(
+                f"Некорректный файл подписчиков {TENANTS_FILE}: "
+                f"{error_message}")
+            return False
+        logging.info(
+            f"Подписчиков в {TENANTS_FILE}: {len(config.tenants)}.")
+    logging.info("Настройки в порядке.")
+    return True
+
+
+def main():
+    """The main logic of the bot."""
+    setup_logging(filename=LOG_FILE)
+    if '--check' in sys.argv[1:]:
+        sys.exit(0 if check_config() else 1)
+    if sys.argv[1:2] == ['backfill']:
+        from backfill import main as backfill
+
+        sys.exit(backfill(sys.argv[2:]))
+    if not check_tokens():
+        sys.exit("Отсутствует обязательные переменные окружения.")
+    if not check_sharding():
+        sys.exit("Воркеры разных dyno не разделят подписчиков.")
+    if WORKERS == 1:
+        run_worker(WORKER_ID)
+        return
+    spawn = multiprocessing.get_context('spawn')
+    processes = [
+        spawn.Process(
+            target=start_worker,
+            args=(f'{WORKER_ID}-{index}', index),
+            name=f'worker-{index}'
+        )
+        for index in range(WORKERS)
+    ]
+    for process in processes:
+        process.start()
+
+    def stop_workers(signum, frame):
+        for process in processes:
+            process.terminate()
+
+    signal.signal(signal.SIGTERM, stop_workers)
+    for process in processes:
+        process.join()
 
 
 if __name__ == '__main__':
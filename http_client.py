@@ -0,0 +1,135 @@
+import hashlib
+import re
+import time
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from http import HTTPStatus
+
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 30
+POOL_SIZE = 10
+CURRENT_DATE_PATTERN = re.compile(rb'"current_date"\s*:\s*(\d+)')
+
+
+@lru_cache(maxsize=None)
+def pooled_session_class():
+    """Returns PooledSession, requests is imported on the first call."""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    class PooledSession(requests.Session):
+        """Keep-alive session with a connection pool and default timeouts.
+
+        Connections to the API host are reused between polls, so the
+        TCP and TLS handshakes are paid once per pooled connection
+        instead of once per request.
+        """
+
+        def __init__(self, headers=None, pool_size=POOL_SIZE,
+                     timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)):
+            super().__init__()
+            self.timeout = timeout
+            adapter = HTTPAdapter(
+                pool_connections=pool_size,
+                pool_maxsize=pool_size,
+                max_retries=0
+            )
+            self.mount('https://', adapter)
+            self.mount('http://', adapter)
+            self.headers.update({'Accept-Encoding': 'gzip, deflate'})
+            if headers:
+                self.headers.update(headers)
+
+        def request(self, method, url, **kwargs):
+            """Sends the request, applying the default timeout if unset."""
+            if kwargs.get('timeout') is None:
+                kwargs['timeout'] = self.timeout
+            return super().request(method, url, **kwargs)
+
+    return PooledSession
+
+
+def __getattr__(name):
+    if name == 'PooledSession':
+        return pooled_session_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def create_session(headers=None, pool_size=POOL_SIZE, timeout=None):
+    """Creates a pooled session for requests to the API."""
+    return pooled_session_class()(
+        headers=headers,
+        pool_size=pool_size,
+        timeout=timeout or (CONNECT_TIMEOUT, READ_TIMEOUT)
+    )
+
+
+def parse_retry_after(value, now=None):
+    """Returns the Retry-After header value in seconds or None."""
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return int(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    now = now or time.time()
+    return max(0, int(retry_at.timestamp() - now))
+
+
+class ConditionalCache:
+    """Validators of the last processed answer of one tenant.
+
+    Conditional headers are sent when the server has given an ETag or
+    Last-Modified. Otherwise the body is hashed without its current_date
+    field, which changes on every answer, and compared with the last
+    processed body. New validators are kept as pending until commit(),
+    so an answer that failed to be processed is not skipped next time.
+    """
+
+    __slots__ = ('etag', 'last_modified', 'digest', '_pending')
+
+    def __init__(self):
+        self.etag = None
+        self.last_modified = None
+        self.digest = None
+        self._pending = None
+
+    def apply(self, headers):
+        """Returns the request headers with conditional ones added."""
+        if not self.etag and not self.last_modified:
+            return headers
+        headers = dict(headers)
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def unchanged(self, response):
+        """Checks whether the answer equals the last processed one.
+
+        Returns a (unchanged, current_date) pair, current_date is taken
+        from the body without decoding the JSON.
+        """
+        if response.status_code == HTTPStatus.NOT_MODIFIED:
+            return True, None
+        headers = getattr(response, 'headers', None) or {}
+        content = getattr(response, 'content', None)
+        current_date = digest = None
+        if content is not None:
+            match = CURRENT_DATE_PATTERN.search(content)
+            if match:
+                current_date = int(match.group(1))
+                content = content[:match.start()] + content[match.end():]
+            digest = hashlib.blake2b(content, digest_size=16).digest()
+        self._pending = (
+            headers.get('ETag'), headers.get('Last-Modified'), digest)
+        return digest is not None and digest == self.digest, current_date
+
+    def commit(self):
+        """Remembers the validators of the answer processed last."""
+        if self._pending is not None:
+            self.etag, self.last_modified, self.digest = self._pending
+            self._pending = None
@@ -0,0 +1,104 @@
+import atexit
+import copy
+import json
+import logging
+import queue
+import re
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(lineno)d %(message)s'
+MAX_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 5
+
+SECRET_PATTERNS = (
+    # Practicum OAuth tokens in headers and messages
+    (re.compile(r'(OAuth\s+)[\w.-]+'), r'\1***'),
+    # Telegram bot tokens, also as a part of Bot API urls
+    (re.compile(r'\d{5,}:[\w-]{30,}'), '***'),
+)
+
+
+def redact(text):
+    """Replaces tokens found in the text with asterisks."""
+    for pattern, replacement in SECRET_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+class RedactingFormatter(logging.Formatter):
+    """Plain text formatter which hides tokens."""
+
+    def format(self, record):
+        """Formats the record and hides tokens in the result."""
+        return redact(super().format(record))
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as JSON lines with tokens hidden."""
+
+    def format(self, record):
+        """Returns the record as a one-line JSON object."""
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'line': record.lineno,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        return redact(json.dumps(data, ensure_ascii=False))
+
+
+class DeferredQueueHandler(QueueHandler):
+    """Queue handler leaving formatting to the listener thread.
+
+    Only the message is rendered in the calling thread, so that later
+    changes of its arguments do not affect the log; tracebacks,
+    redaction and I/O are handled by the listener.
+    """
+
+    def prepare(self, record):
+        """Renders the message and passes the rest of the record as is."""
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def stop_listener(listener):
+    """Flushes queued records and stops the listener if it is running."""
+    if getattr(listener, '_thread', None) is not None:
+        listener.stop()
+
+
+def setup_logging(filename='homework.log', level=logging.INFO,
+                  max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT):
+    """Configures non-blocking logging to the console and a rotating file.
+
+    Records are put into a queue by the calling thread and written by
+    a QueueListener thread. Returns the started listener.
+    """
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(RedactingFormatter(LOG_FORMAT))
+    file_handler = RotatingFileHandler(
+        filename=filename,
+        maxBytes=max_bytes,
+        backupCount=backup_count,
+        encoding='utf-8'
+    )
+    file_handler.setFormatter(JsonFormatter())
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(
+        log_queue, console_handler, file_handler,
+        respect_handler_level=True
+    )
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(DeferredQueueHandler(log_queue))
+    root.setLevel(level)
+    listener.start()
+    atexit.register(stop_listener, listener)
+    return listener
@@ -0,0 +1,266 @@
+import abc
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+LAG_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def format_value(value):
+    """Formats the sample value for the text exposition format."""
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric(abc.ABC):
+    """Base class of metrics rendered in the Prometheus text format."""
+
+    kind = 'untyped'
+    # Appended to the name in HELP and TYPE lines and in sample names
+    family_suffix = ''
+
+    def __init__(self, name, documentation, registry=None):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        (REGISTRY if registry is None else registry).register(self)
+
+    @property
+    def family(self):
+        """Name of the metric family in the exposition format."""
+        return self.name + self.family_suffix
+
+    @abc.abstractmethod
+    def samples(self):
+        """Returns (suffix, labels, value) tuples of the metric."""
+
+    def render(self):
+        """Returns the metric in the Prometheus text format."""
+        lines = [
+            f'# HELP {self.family} {self.documentation}',
+            f'# TYPE {self.family} {self.kind}',
+        ]
+        for suffix, labels, value in self.samples():
+            label_text = ','.join(
+                f'{key}="{label}"' for key, label in labels)
+            if label_text:
+                label_text = '{' + label_text + '}'
+            lines.append(
+                f'{self.family}{suffix}{label_text} {format_value(value)}')
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """Monotonic counter with an optional label."""
+
+    kind = 'counter'
+    family_suffix = '_total'
+
+    def __init__(self, name, documentation, label=None, registry=None):
+        super().__init__(name, documentation, registry)
+        self.label = label
+        self._values = {}
+
+    def inc(self, label_value=None, amount=1):
+        """Increases the counter of the label value."""
+        with self._lock:
+            self._values[label_value] = (
+                self._values.get(label_value, 0) + amount)
+
+    def value(self, label_value=None):
+        """Returns the current value of the counter."""
+        with self._lock:
+            return self._values.get(label_value, 0)
+
+    def samples(self):
+        """Returns samples of all label values."""
+        with self._lock:
+            values = sorted(self._values.items(), key=lambda item: str(
+                item[0]))
+        return [
+            ('',
+             ((self.label, label_value),) if self.label else (),
+             value)
+            for label_value, value in values
+        ]
+
+
+class Gauge(Metric):
+    """Value which is set directly or read from a function on scrape."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, registry=None):
+        super().__init__(name, documentation, registry)
+        self._value = 0
+        self._function = None
+
+    def set(self, value):
+        """Sets the value of the gauge."""
+        with self._lock:
+            self._value = value
+
+    def set_function(self, function):
+        """Makes the gauge return the result of the function."""
+        self._function = function
+
+    def value(self):
+        """Returns the current value of the gauge."""
+        if self._function is not None:
+            return self._function()
+        with self._lock:
+            return self._value
+
+    def samples(self):
+        """Returns the only sample of the gauge."""
+        return [('', (), self.value())]
+
+
+class Histogram(Metric):
+    """Distribution of observed values over cumulative buckets."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets=LATENCY_BUCKETS,
+                 registry=None):
+        super().__init__(name, documentation, registry)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._counts = [0] * len(self.buckets)
+        self._sum = 0
+        self._count = 0
+
+    def observe(self, value):
+        """Adds the value to the histogram."""
+        with self._lock:
+            self._sum += value
+            self._count += 1
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self._counts[index] += 1
+                    break
+
+    @contextmanager
+    def time(self):
+        """Observes the duration of the with block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    @property
+    def count(self):
+        """Number of observed values."""
+        with self._lock:
+            return self._count
+
+    def samples(self):
+        """Returns cumulative bucket counts, the sum and the count."""
+        with self._lock:
+            counts, total, count = list(self._counts), self._sum, self._count
+        samples = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            samples.append(
+                ('_bucket', (('le', format_value(bound)),), cumulative))
+        samples.append(('_sum', (), total))
+        samples.append(('_count', (), count))
+        return samples
+
+
+class Registry:
+    """Collection of metrics exposed by the endpoint."""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Adds the metric to the registry."""
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self):
+        """Returns all metrics in the Prometheus text format."""
+        with self._lock:
+            metrics = list(self._metrics)
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+API_LATENCY = Histogram(
+    'homework_api_request_seconds',
+    'Latency of requests to the Practicum API.')
+API_RESPONSE_SIZE = Histogram(
+    'homework_api_response_bytes',
+    'Size of Practicum API response bodies.',
+    buckets=SIZE_BUCKETS)
+API_NOT_MODIFIED = Counter(
+    'homework_api_not_modified',
+    'Answers of the Practicum API skipped as equal to the previous one.')
+ERRORS = Counter(
+    'homework_errors',
+    'Errors of polling cycles and deliveries by exception class.',
+    label='exception')
+SEND_LATENCY = Histogram(
+    'homework_send_message_seconds',
+    'Latency of sending messages to Telegram.')
+DELIVERY_LAG = Histogram(
+    'homework_delivery_lag_seconds',
+    'Time from date_updated of a homework to the Telegram delivery.',
+    buckets=LAG_BUCKETS)
+CIRCUIT_OPENED = Counter(
+    'homework_circuit_opened',
+    'Times the circuit breaker of an upstream has opened.',
+    label='upstream')
+TENANTS = Gauge(
+    'homework_tenants',
+    'Number of polled tenants.')
+SCHEDULED_POLLS = Gauge(
+    'homework_scheduled_polls',
+    'Number of tenants waiting for their next poll.')
+QUEUE_DEPTH = Gauge(
+    'homework_outbound_queue_depth',
+    'Number of messages waiting for delivery to Telegram.')
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the registry at /metrics."""
+
+    registry = REGISTRY
+
+    def do_GET(self):
+        """Returns the metrics in the Prometheus text format."""
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Keeps scrapes out of the bot log."""
+
+
+def start_metrics_server(port, host='0.0.0.0', registry=REGISTRY):
+    """Starts the metrics endpoint in a background thread."""
+    handler = type(
+        'RegistryMetricsHandler', (MetricsHandler,), {'registry': registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(
+        target=server.serve_forever, name='metrics', daemon=True).start()
+    logging.info(f"Метрики доступны на порту {server.server_port}.")
+    return server
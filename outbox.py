@@ -0,0 +1,173 @@
+import threading
+import time
+import uuid
+
+from storage import connect
+
+STALE_AFTER = 120
+KEEP_DELIVERED = 24 * 60 * 60
+MAX_ATTEMPTS = 20
+
+
+class Outbox:
+    """Write-ahead log of notifications kept in SQLite.
+
+    A notification is recorded before it is sent and marked as delivered
+    afterwards. Records and marks are buffered in memory and written in
+    one transaction by flush(); the queue flushes before every send, so
+    a message is on disk before Telegram sees it, while many messages
+    share one commit. Pending records that nobody has touched for
+    stale_after seconds, left by a crash or a failed send, are claimed
+    again by claim_stale(). A process keeping records in memory, while
+    they wait for a rate limit or an open breaker, touches them more
+    often than that, so other processes sharing the database do not
+    claim and send them too.
+    """
+
+    def __init__(self, path, stale_after=STALE_AFTER,
+                 max_attempts=MAX_ATTEMPTS, clock=time.time):
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self.clock = clock
+        self._connection = connect(path)
+        self._lock = threading.Lock()
+        self._added = []
+        self._delivered = []
+        self._failed = []
+        self._rejected = []
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS outbox ('
+                'id TEXT PRIMARY KEY, chat_id TEXT NOT NULL, '
+                'text TEXT NOT NULL, created REAL, '
+                'attempts INTEGER NOT NULL DEFAULT 0, '
+                'updated_at REAL NOT NULL, delivered_at REAL)'
+            )
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS outbox_pending '
+                'ON outbox (delivered_at, updated_at)'
+            )
+
+    def add(self, chat_id, text, created=None):
+        """Records the notification, returns its id."""
+        message_id = uuid.uuid4().hex
+        with self._lock:
+            self._added.append(
+                (message_id, str(chat_id), text, created, self.clock()))
+        return message_id
+
+    def mark_delivered(self, message_ids):
+        """Marks the notifications as delivered."""
+        now = self.clock()
+        with self._lock:
+            self._delivered.extend(
+                (now, message_id) for message_id in message_ids)
+
+    def mark_failed(self, message_ids):
+        """Counts a failed attempt, the drainer will retry them later."""
+        now = self.clock()
+        with self._lock:
+            self._failed.extend(
+                (now, message_id) for message_id in message_ids)
+
+    def touch(self, message_ids):
+        """Marks pending notifications as still held by this process."""
+        now = self.clock()
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'UPDATE outbox SET updated_at = ? '
+                'WHERE id = ? AND delivered_at IS NULL',
+                [(now, message_id) for message_id in message_ids]
+            )
+
+    def mark_rejected(self, message_ids):
+        """Gives up the notifications, their chat does not accept them."""
+        now = self.clock()
+        with self._lock:
+            self._rejected.extend(
+                (self.max_attempts, now, message_id)
+                for message_id in message_ids)
+
+    def flush(self):
+        """Writes buffered records and marks in one transaction."""
+        with self._lock:
+            if not (self._added or self._delivered or self._failed
+                    or self._rejected):
+                return
+            added, self._added = self._added, []
+            delivered, self._delivered = self._delivered, []
+            failed, self._failed = self._failed, []
+            rejected, self._rejected = self._rejected, []
+            with self._connection:
+                self._connection.executemany(
+                    'INSERT OR IGNORE INTO outbox '
+                    '(id, chat_id, text, created, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    added
+                )
+                self._connection.executemany(
+                    'UPDATE outbox SET attempts = attempts + 1, '
+                    'updated_at = ? WHERE id = ?',
+                    failed
+                )
+                self._connection.executemany(
+                    'UPDATE outbox SET attempts = ?, updated_at = ? '
+                    'WHERE id = ?',
+                    rejected
+                )
+                self._connection.executemany(
+                    'UPDATE outbox SET delivered_at = ? WHERE id = ?',
+                    delivered
+                )
+
+    def claim_stale(self, limit=1000):
+        """Takes pending notifications which nobody has touched lately.
+
+        Returns (id, chat_id, text, created) tuples, oldest first.
+        """
+        self.flush()
+        now = self.clock()
+        with self._lock, self._connection:
+            rows = self._connection.execute(
+                'SELECT id, chat_id, text, created FROM outbox '
+                'WHERE delivered_at IS NULL AND updated_at < ? '
+                'AND attempts < ? ORDER BY updated_at LIMIT ?',
+                (now - self.stale_after, self.max_attempts, limit)
+            ).fetchall()
+            claimed = []
+            for row in rows:
+                cursor = self._connection.execute(
+                    'UPDATE outbox SET updated_at = ? '
+                    'WHERE id = ? AND updated_at < ?',
+                    (now, row[0], now - self.stale_after)
+                )
+                if cursor.rowcount:
+                    claimed.append(row)
+        return claimed
+
+    def prune(self):
+        """Deletes notifications delivered or given up long ago."""
+        before = self.clock() - KEEP_DELIVERED
+        with self._lock, self._connection:
+            self._connection.execute(
+                'DELETE FROM outbox WHERE delivered_at < ? '
+                'OR (delivered_at IS NULL AND attempts >= ? '
+                'AND updated_at < ?)',
+                (before, self.max_attempts, before)
+            )
+
+    def pending_count(self):
+        """Returns the number of notifications still to be delivered."""
+        self.flush()
+        with self._lock:
+            return self._connection.execute(
+                'SELECT COUNT(*) FROM outbox '
+                'WHERE delivered_at IS NULL AND attempts < ?',
+                (self.max_attempts,)
+            ).fetchone()[0]
+
+    def close(self):
+        """Writes buffered changes and closes the database connection."""
+        self.flush()
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,203 @@
+import time
+
+TICK = 1.0
+WHEEL_SLOTS = 4096
+
+
+class TimerWheel:
+    """Hashed timer wheel of tenants waiting for their next poll.
+
+    A tenant is put into the slot of its due tick modulo the number of
+    slots and its due tick is kept in tenant.next_poll, so scheduling
+    is O(1) and a tick only looks at one slot. Delays longer than a
+    turn of the wheel stay in their slot until their turn comes.
+    """
+
+    def __init__(self, tick=TICK, slots=WHEEL_SLOTS, now=0):
+        if tick <= 0 or slots < 1:
+            raise ValueError("Шаг и число ячеек колеса должны быть больше 0.")
+        self.tick = tick
+        # Lists are created for slots in use only
+        self._slots = [None] * slots
+        self._current = int(now // tick) - 1
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def schedule(self, tenant, when):
+        """Schedules the poll of the tenant at the time when."""
+        due = max(int(when // self.tick), self._current + 1)
+        tenant.next_poll = due
+        index = due % len(self._slots)
+        if self._slots[index] is None:
+            self._slots[index] = [tenant]
+        else:
+            self._slots[index].append(tenant)
+        self._count += 1
+
+    def advance(self, now):
+        """Returns tenants due by now, removing them from the wheel."""
+        target = int(now // self.tick)
+        if target <= self._current:
+            return []
+        start = max(self._current + 1, target - len(self._slots) + 1)
+        due = []
+        for tick in range(start, target + 1):
+            index = tick % len(self._slots)
+            slot = self._slots[index]
+            if not slot:
+                continue
+            waiting = []
+            for tenant in slot:
+                if tenant.next_poll <= target:
+                    tenant.next_poll = None
+                    due.append(tenant)
+                else:
+                    waiting.append(tenant)
+            self._slots[index] = waiting or None
+        self._current = target
+        self._count -= len(due)
+        return due
+
+
+class TenantRegistry:
+    """Tenants of the process indexed by key with their poll timers.
+
+    Tenants sharing a Practicum token are grouped: only the first of
+    them, the leader, is scheduled, and its poll serves every tenant of
+    the group. Other tenants of the token are kept in a tuple, so the
+    usual token of a single chat costs one dict entry. Removed tenants
+    and tenants which are no longer leaders are not searched for in the
+    wheel: they are dropped when their timer fires, see due().
+    """
+
+    def __init__(self, tenants=(), tick=TICK, slots=WHEEL_SLOTS,
+                 now=None):
+        self._tenants = {}
+        self._leaders = {}
+        self._followers = {}
+        self.wheel = TimerWheel(
+            tick, slots, time.monotonic() if now is None else now)
+        for tenant in tenants:
+            self.add(tenant)
+
+    def __len__(self):
+        return len(self._tenants)
+
+    def __iter__(self):
+        return iter(list(self._tenants.values()))
+
+    def __contains__(self, tenant):
+        return self._tenants.get(tenant.key) is tenant
+
+    def get(self, key):
+        """Returns the tenant with the key or None."""
+        return self._tenants.get(key)
+
+    def add(self, tenant):
+        """Adds the tenant, replacing the one with the same key."""
+        old = self._tenants.get(tenant.key)
+        if old is not None:
+            self._unindex(old)
+        self._tenants[tenant.key] = tenant
+        self._index(tenant)
+
+    def remove(self, key):
+        """Removes the tenant with the key, returns it or None."""
+        tenant = self._tenants.pop(key, None)
+        if tenant is not None:
+            self._unindex(tenant)
+        return tenant
+
+    def _index(self, tenant):
+        token = tenant.practicum_token
+        if token not in self._leaders:
+            self._leaders[token] = tenant
+        else:
+            self._followers[token] = (
+                self._followers.get(token, ()) + (tenant,))
+
+    def _unindex(self, tenant):
+        token = tenant.practicum_token
+        followers = self._followers.pop(token, ())
+        if self._leaders.get(token) is tenant:
+            if followers:
+                self._leaders[token] = followers[0]
+                followers = followers[1:]
+            else:
+                del self._leaders[token]
+        else:
+            followers = tuple(
+                other for other in followers if other is not tenant)
+        if followers:
+            self._followers[token] = followers
+
+    def _reindex(self):
+        self._leaders = {}
+        self._followers = {}
+        for tenant in self._tenants.values():
+            self._index(tenant)
+
+    def subscribers(self, tenant):
+        """Returns tenants sharing the token of the tenant, leader first."""
+        token = tenant.practicum_token
+        leader = self._leaders.get(token)
+        if leader is None:
+            return [tenant]
+        return [leader, *self._followers.get(token, ())]
+
+    def is_leader(self, tenant):
+        """Checks whether polls of the token are made for the tenant."""
+        return self._leaders.get(tenant.practicum_token) is tenant
+
+    def leaders(self):
+        """Returns one tenant of every distinct token."""
+        return list(self._leaders.values())
+
+    def update(self, tenants):
+        """Makes the registry hold the given tenants.
+
+        Keys do not depend on tokens, so a tenant with a known key and
+        a new token is rotated in place: the old tenant takes the new
+        token and keeps its cursor and schedule. Returns lists of added,
+        removed and rotated tenants.
+        """
+        wanted = {tenant.key: tenant for tenant in tenants}
+        added = [
+            tenant for key, tenant in wanted.items()
+            if key not in self._tenants
+        ]
+        removed = [
+            tenant for key, tenant in self._tenants.items()
+            if key not in wanted
+        ]
+        rotated = []
+        for key, tenant in wanted.items():
+            old = self._tenants.get(key)
+            if old is None:
+                continue
+            if old.practicum_token != tenant.practicum_token:
+                old.rotate(tenant.practicum_token)
+                rotated.append(old)
+            old.configure(tenant)
+        for tenant in removed:
+            del self._tenants[tenant.key]
+        for tenant in added:
+            self._tenants[tenant.key] = tenant
+        self._reindex()
+        return added, removed, rotated
+
+    @property
+    def scheduled(self):
+        """Number of timers in the wheel."""
+        return len(self.wheel)
+
+    def schedule(self, tenant, when):
+        """Schedules the next poll of the tenant."""
+        self.wheel.schedule(tenant, when)
+
+    def due(self, now):
+        """Returns registered leaders whose poll is due by now."""
+        return [tenant for tenant in self.wheel.advance(now)
+                if tenant in self and self.is_leader(tenant)]
@@ -0,0 +1,104 @@
+import html
+import re
+from functools import lru_cache
+from string import Formatter
+
+DEFAULT_LOCALE = 'ru'
+CACHE_SIZE = 4096
+PARSE_MODES = (None, 'MarkdownV2', 'HTML')
+MARKDOWN_V2_SPECIAL = re.compile(r'([_*\[\]()~`>#+\-=|{}.!\\])')
+
+TEMPLATES = {
+    'ru': 'Изменился статус проверки работы "{homework_name}". {verdict}',
+    'en': 'The review status of "{homework_name}" has changed. {verdict}',
+}
+VERDICT_CATALOGS = {
+    'ru': {
+        'approved': 'Работа проверена: ревьюеру всё понравилось. Ура!',
+        'reviewing': 'Работа взята на проверку ревьюером.',
+        'rejected': 'Работа проверена: у ревьюера есть замечания.'
+    },
+    'en': {
+        'approved': 'The work has been reviewed: the reviewer liked it. '
+                    'Hooray!',
+        'reviewing': 'The work has been taken for review.',
+        'rejected': 'The work has been reviewed: the reviewer has remarks.'
+    },
+}
+
+
+def escape_markdown_v2(text):
+    """Escapes the text for the Telegram MarkdownV2 parse mode."""
+    return MARKDOWN_V2_SPECIAL.sub(r'\\\1', text)
+
+
+def escape_html(text):
+    """Escapes the text for the Telegram HTML parse mode."""
+    return html.escape(text, quote=False)
+
+
+ESCAPERS = {
+    None: lambda text: text,
+    'MarkdownV2': escape_markdown_v2,
+    'HTML': escape_html,
+}
+
+
+def compile_template(template, escape):
+    """Escapes literal parts of the template once, returns its format."""
+    parts = []
+    for literal, field, spec, conversion in Formatter().parse(template):
+        parts.append(
+            escape(literal).replace('{', '{{').replace('}', '}}'))
+        if field is not None:
+            parts.append('{' + field + '}')
+    return ''.join(parts).format
+
+
+class MessageRenderer:
+    """Renders status messages from per-locale catalogs.
+
+    Templates and verdicts are escaped for the parse mode when the
+    renderer is created; rendered messages are kept in an LRU cache
+    keyed by (locale, homework_name, status), so broadcasting the same
+    transition to many chats renders it once.
+    """
+
+    def __init__(self, parse_mode=None, templates=TEMPLATES,
+                 catalogs=VERDICT_CATALOGS, default_locale=DEFAULT_LOCALE,
+                 cache_size=CACHE_SIZE):
+        if parse_mode not in PARSE_MODES:
+            raise ValueError(f"Неизвестный режим разметки {parse_mode}.")
+        self.parse_mode = parse_mode
+        self.escape = ESCAPERS[parse_mode]
+        self.default_locale = default_locale
+        self.catalogs = catalogs
+        self._templates = {
+            locale: compile_template(template, self.escape)
+            for locale, template in templates.items()
+        }
+        self._verdicts = {
+            locale: {
+                status: self.escape(verdict)
+                for status, verdict in verdicts.items()
+            }
+            for locale, verdicts in catalogs.items()
+        }
+        self.render = lru_cache(maxsize=cache_size)(self._render)
+
+    @property
+    def locales(self):
+        """Locales having both a template and verdicts."""
+        return set(self._templates) & set(self._verdicts)
+
+    def verdicts(self, locale):
+        """Returns raw verdict texts of the locale or the default one."""
+        return self.catalogs.get(locale) or self.catalogs[self.default_locale]
+
+    def _render(self, locale, homework_name, status):
+        if locale not in self._templates or locale not in self._verdicts:
+            locale = self.default_locale
+        return self._templates[locale](
+            homework_name=self.escape(homework_name),
+            verdict=self._verdicts[locale][status]
+        )
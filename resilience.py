@@ -0,0 +1,154 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from exceptions import CircuitOpenError
+from metrics import CIRCUIT_OPENED
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 60
+DIGEST_WINDOW = 60 * 60
+
+
+class CircuitBreaker:
+    """Circuit breaker of one upstream service.
+
+    After failure_threshold consecutive failures the breaker opens and
+    calls fail fast with CircuitOpenError. After reset_timeout it is
+    half-open: one trial call is let through, its success closes the
+    breaker and its failure opens it again.
+    """
+
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD,
+                 reset_timeout=RESET_TIMEOUT, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def _state(self, now):
+        if self._opened_at is None:
+            return CLOSED
+        if now - self._opened_at < self.reset_timeout:
+            return OPEN
+        return HALF_OPEN
+
+    @property
+    def state(self):
+        """Current state: closed, open or half_open."""
+        with self._lock:
+            return self._state(self.clock())
+
+    def retry_in(self):
+        """Returns the number of seconds until the next trial call."""
+        with self._lock:
+            if self._opened_at is None:
+                return 0
+            return max(
+                0, self._opened_at + self.reset_timeout - self.clock())
+
+    def allow(self):
+        """Checks whether a call may be made now."""
+        with self._lock:
+            state = self._state(self.clock())
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def check(self):
+        """Raises CircuitOpenError if a call may not be made now."""
+        if not self.allow():
+            raise CircuitOpenError(
+                f"Сервис {self.name} недоступен, запросы приостановлены.",
+                retry_after=self.retry_in() or self.reset_timeout
+            )
+
+    def record_success(self):
+        """Closes the breaker after a successful call."""
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        """Counts a failed call, opens the breaker when needed."""
+        with self._lock:
+            now = self.clock()
+            self.failures += 1
+            reopen = self._state(now) == HALF_OPEN and self._trial
+            if reopen or (self._opened_at is None
+                          and self.failures >= self.failure_threshold):
+                self._opened_at = now
+                CIRCUIT_OPENED.inc(self.name)
+            self._trial = False
+
+    @contextmanager
+    def protect(self, failures):
+        """Fails fast while open and records the result of the block.
+
+        Exceptions of the failures types count as failures of the
+        upstream, other exceptions mean that it has answered.
+        """
+        self.check()
+        try:
+            yield
+        except failures:
+            self.record_failure()
+            raise
+        except Exception:
+            self.record_success()
+            raise
+        else:
+            self.record_success()
+
+
+class ErrorDigest:
+    """Deduplicates error notifications sent to chats.
+
+    The first error of a kind is sent to the chat at once. Repeats
+    within window are only counted, the next notification after the
+    window tells how many times the error has repeated. resolve()
+    forgets errors of the chat after a successful poll.
+    """
+
+    def __init__(self, window=DIGEST_WINDOW, clock=time.monotonic):
+        self.window = window
+        self.clock = clock
+        self._errors = {}
+        self._lock = threading.Lock()
+
+    def report(self, chat_id, error):
+        """Returns the notification about the error or None to skip it."""
+        text = str(error)
+        kind = (type(error).__name__, text.split('\n', 1)[0])
+        now = self.clock()
+        with self._lock:
+            errors = self._errors.setdefault(str(chat_id), {})
+            entry = errors.get(kind)
+            if entry is None:
+                errors[kind] = [now, 0]
+                return text
+            sent_at, repeats = entry
+            if now - sent_at < self.window:
+                entry[1] += 1
+                return None
+            errors[kind] = [now, 0]
+        return (
+            f"{text}\nОшибка повторилась {repeats + 1} раз "
+            f"за {int((now - sent_at) // 60)} мин."
+        )
+
+    def resolve(self, chat_id):
+        """Forgets errors of the chat."""
+        with self._lock:
+            self._errors.pop(str(chat_id), None)
@@ -0,0 +1,84 @@
+import random
+import time
+
+REVIEWING_INTERVAL = 120
+IDLE_INTERVAL = 1800
+IDLE_AFTER = 7 * 24 * 60 * 60
+BACKOFF_BASE = 30
+BACKOFF_MAX = 3600
+JITTER = 0.1
+
+
+class PollScheduler:
+    """Chooses the delay before the next poll of every tenant.
+
+    * while a homework is under review tenants are polled more often;
+    * tenants without changes for a long time are polled less often;
+    * failed polls are retried with jittered exponential backoff,
+      never sooner than the Retry-After delay sent by the server;
+    * first polls are spread over the base interval by the tenant key,
+      so tenants do not fire at the same second.
+    """
+
+    def __init__(self, interval, reviewing_interval=REVIEWING_INTERVAL,
+                 idle_interval=IDLE_INTERVAL, idle_after=IDLE_AFTER,
+                 backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX,
+                 jitter=JITTER, spread_window=None, clock=time.time):
+        self.interval = interval
+        self.reviewing_interval = reviewing_interval
+        self.idle_interval = idle_interval
+        self.idle_after = idle_after
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.spread_window = (
+            interval if spread_window is None else spread_window)
+        self.clock = clock
+        # Tenants without changes are idle this long after the start
+        self.started = clock()
+
+    def initial_delay(self, tenant):
+        """Returns the offset of the first poll of the tenant."""
+        if not self.spread_window:
+            return 0
+        return (int.from_bytes(tenant.key[:4], 'big') / 0x100000000
+                * self.spread_window)
+
+    def record_success(self, tenant, homeworks):
+        """Updates the tenant after a successful poll."""
+        tenant.failures = 0
+        tenant.retry_after = None
+        if homeworks:
+            tenant.last_change = self.clock()
+            tenant.reviewing = any(
+                homework.get('status') == 'reviewing'
+                for homework in homeworks
+            )
+
+    def record_failure(self, tenant, error):
+        """Updates the tenant after a failed poll."""
+        tenant.failures += 1
+        tenant.retry_after = getattr(error, 'retry_after', None)
+
+    def next_delay(self, tenant):
+        """Returns the number of seconds before the next poll."""
+        if tenant.failures:
+            ceiling = min(
+                self.backoff_max,
+                self.backoff_base * 2 ** (tenant.failures - 1)
+            )
+            delay = random.uniform(self.backoff_base, max(
+                self.backoff_base, ceiling))
+            if tenant.retry_after:
+                delay = max(delay, tenant.retry_after)
+            return delay
+        last_change = tenant.last_change
+        if last_change is None:
+            last_change = self.started
+        if tenant.reviewing:
+            interval = self.reviewing_interval
+        elif self.clock() - last_change > self.idle_after:
+            interval = self.idle_interval
+        else:
+            interval = self.interval
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
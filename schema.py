@@ -0,0 +1,172 @@
+HOMEWORK_STATUSES = ('approved', 'reviewing', 'rejected')
+
+
+class Field:
+    """Key of a JSON object with its expected types."""
+
+    __slots__ = ('name', 'types', 'required', 'choices')
+
+    def __init__(self, name, types, required=True, choices=None):
+        self.name = name
+        self.types = types
+        self.required = required
+        self.choices = frozenset(choices) if choices else None
+
+
+class Schema:
+    """Declarative description of a JSON object.
+
+    The fields are compiled into a tuple of checks once; check() walks
+    it and returns every problem of the object instead of stopping at
+    the first one. A problem is an instance of the built-in exception
+    it matches: KeyError, TypeError or ValueError.
+    """
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self.names = tuple(field.name for field in self.fields)
+        self._checks = tuple(
+            (field.name, field.types, field.required, field.choices)
+            for field in self.fields
+        )
+
+    def check(self, data, path):
+        """Returns errors describing problems of the object."""
+        if not isinstance(data, dict):
+            return [TypeError(f"{path}: ожидался объект, получен "
+                              f"{type(data).__name__}.")]
+        problems = []
+        for name, types, required, choices in self._checks:
+            value = data.get(name)
+            if value is None:
+                if required:
+                    problems.append(KeyError(
+                        f"{path}: отсутствие ключа '{name}' в ответе API."))
+            elif not isinstance(value, types):
+                problems.append(TypeError(
+                    f"{path}: ключ '{name}' имеет некорректный тип "
+                    f"{type(value).__name__}."))
+            elif choices is not None and value not in choices:
+                problems.append(ValueError(
+                    f"{path}: недокументированное значение '{value}' "
+                    f"ключа '{name}'."))
+        return problems
+
+
+class HomeworkRecord:
+    """Homework from the API answer.
+
+    Supports get() like the dict it is built from, so the state store
+    and the commands work with records and stored rows alike. Problems
+    found by the validator are kept in errors.
+    """
+
+    __slots__ = ('id', 'homework_name', 'status', 'date_updated',
+                 'lesson_name', 'reviewer_comment', 'errors')
+
+    def __init__(self, data, errors=()):
+        self.id = data.get('id')
+        self.homework_name = data.get('homework_name')
+        self.status = data.get('status')
+        self.date_updated = data.get('date_updated')
+        self.lesson_name = data.get('lesson_name')
+        self.reviewer_comment = data.get('reviewer_comment')
+        self.errors = tuple(errors)
+
+    def get(self, key, default=None):
+        """Returns the field of the homework like dict.get does."""
+        if key == 'errors' or key not in self.__slots__:
+            return default
+        value = getattr(self, key)
+        return default if value is None else value
+
+    def as_dict(self):
+        """Returns the fields which are set."""
+        return {
+            name: getattr(self, name)
+            for name in self.__slots__[:-1]
+            if getattr(self, name) is not None
+        }
+
+    def __eq__(self, other):
+        if isinstance(other, HomeworkRecord):
+            other = other.as_dict()
+        return self.as_dict() == other
+
+    def __repr__(self):
+        return f'HomeworkRecord({self.as_dict()!r})'
+
+
+HOMEWORK_SCHEMA = Schema((
+    Field('id', (int, str), required=False),
+    Field('homework_name', str),
+    Field('status', str, choices=HOMEWORK_STATUSES),
+    Field('date_updated', str, required=False),
+    Field('lesson_name', str, required=False),
+    Field('reviewer_comment', str, required=False),
+))
+RESPONSE_SCHEMA = Schema((
+    Field('homeworks', list),
+    Field('current_date', int, required=False),
+))
+
+
+def validate_homework(data, path='homework'):
+    """Builds the record of the homework, problems go to its errors."""
+    errors = HOMEWORK_SCHEMA.check(data, path)
+    if not isinstance(data, dict):
+        data = {}
+    return HomeworkRecord(data, errors)
+
+
+def raise_problems(problems):
+    """Raises the built-in error of the first problem with all messages."""
+    raise type(problems[0])(
+        '\n'.join(problem.args[0] for problem in problems))
+
+
+def validate_response(response, strict=False):
+    """Checks the API answer in one pass, returns homework records.
+
+    Problems of the answer itself are raised. Problems of homeworks are
+    kept in their records, with strict=True they are raised all
+    together. The error is KeyError, TypeError or ValueError as the
+    first problem requires. An empty list of homeworks is a normal
+    answer.
+    """
+    problems = RESPONSE_SCHEMA.check(response, 'response')
+    if problems:
+        raise_problems(problems)
+    homeworks = response['homeworks']
+    if not homeworks:
+        return []
+    records = [
+        validate_homework(homework, f'homeworks[{index}]')
+        for index, homework in enumerate(homeworks)
+    ]
+    if strict:
+        problems = [error for record in records for error in record.errors]
+        if problems:
+            raise_problems(problems)
+    return records
+
+
+def iter_homeworks(answer, strict=False):
+    """Checks a StreamingAnswer item by item, yields homework records.
+
+    Problems of an item are raised as soon as it is read with
+    strict=True. Problems of the answer itself, which are known only
+    after the whole body, are raised at the end. A malformed body
+    raises ValueError.
+    """
+    for index, homework in enumerate(answer):
+        record = validate_homework(homework, f'homeworks[{index}]')
+        if strict and record.errors:
+            raise_problems(record.errors)
+        yield record
+    fields = dict(answer.fields)
+    if answer.found:
+        fields['homeworks'] = []
+    problems = RESPONSE_SCHEMA.check(fields, 'response')
+    if problems:
+        raise_problems(problems)
@@ -1,4 +1,5 @@
 import os
+import socket
 
 from dotenv import load_dotenv
 
@@ -8,3 +9,39 @@ PRACTICUM_TOKEN = os.getenv('PRACTICUM_TOKEN')
 TELEGRAM_TOKEN = os.getenv('TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('MY_CHAT_ID')
 
+
+# Multi-tenant polling
+# TENANTS_FILE may be a file or a directory of JSON files, it is watched
+# and reloaded every CONFIG_WATCH_INTERVAL seconds without a restart
+TENANTS_FILE = os.getenv('TENANTS_FILE')
+CONFIG_WATCH_INTERVAL = int(os.getenv('CONFIG_WATCH_INTERVAL', 5))
+POLL_CONCURRENCY = int(os.getenv('POLL_CONCURRENCY', 100))
+# First polls started per second by a worker after a start or a reload
+# adding tenants, 0 for no limit; keeps a restart or a large reload from
+# hitting the API with every tenant at once, later polls are not limited
+POLL_START_RATE = float(os.getenv('POLL_START_RATE', 50))
+# Seconds given to the whole shutdown on SIGTERM: polls in flight,
+# services and delivery of queued messages
+SHUTDOWN_TIMEOUT = float(os.getenv('SHUTDOWN_TIMEOUT', 20))
+
+# Persistent bot state
+STATE_DB = os.getenv('STATE_DB', 'homework_state.sqlite3')
+
+# Bot commands: webhook when WEBHOOK_URL is set, long polling otherwise
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_PORT = int(os.getenv('PORT', 8443))
+
+# Logging, with WORKERS > 1 every worker writes LOG_FILE.<index>
+LOG_FILE = os.getenv('LOG_FILE', 'homework.log')
+
+# Prometheus metrics endpoint, disabled when the port is not set
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))
+
+# Sharding of tenants between worker processes and dynos
+WORKERS = int(os.getenv('WORKERS', 1))
+SHARD_DB = os.getenv('SHARD_DB')
+DYNO = os.getenv('DYNO')
+WORKER_ID = DYNO or f'{socket.gethostname()}-{os.getpid()}'
+
+# Telegram parse mode of messages: MarkdownV2, HTML or plain text if unset
+TELEGRAM_PARSE_MODE = os.getenv('TELEGRAM_PARSE_MODE') or None
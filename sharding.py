@@ -0,0 +1,272 @@
+import bisect
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from storage import connect
+
+LEASE_TTL = 60
+REPLICAS = 100
+
+
+def hash_key(value):
+    """Returns a stable 64-bit hash of the string or bytes."""
+    if isinstance(value, str):
+        value = value.encode()
+    return int.from_bytes(hashlib.md5(value).digest()[:8], 'big')
+
+
+class HashRing:
+    """Consistent hashing of tenant keys over worker ids."""
+
+    def __init__(self, workers, replicas=REPLICAS):
+        self.workers = sorted(workers)
+        points = sorted(
+            (hash_key(f'{worker}:{replica}'), worker)
+            for worker in self.workers
+            for replica in range(replicas)
+        )
+        self._hashes = [point for point, _ in points]
+        self._workers = [worker for _, worker in points]
+
+    def owner(self, key):
+        """Returns the worker responsible for the key or None."""
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, hash_key(key))
+        return self._workers[index % len(self._workers)]
+
+
+class LeaseStore:
+    """Worker heartbeats and tenant leases shared by all workers.
+
+    SQLite in WAL mode is used; any store with the same methods
+    (for example one backed by Redis) may be passed to ShardCoordinator.
+    """
+
+    def __init__(self, path):
+        self._connection = connect(path)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS workers ('
+                'worker TEXT PRIMARY KEY, expires_at REAL NOT NULL)'
+            )
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS leases ('
+                'tenant TEXT PRIMARY KEY, worker TEXT NOT NULL, '
+                'expires_at REAL NOT NULL)'
+            )
+
+    def heartbeat(self, worker, expires_at):
+        """Marks the worker alive until expires_at."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT INTO workers (worker, expires_at) VALUES (?, ?) '
+                'ON CONFLICT(worker) DO UPDATE SET '
+                'expires_at = excluded.expires_at',
+                (worker, expires_at)
+            )
+
+    def live_workers(self, now):
+        """Returns ids of workers whose heartbeat has not expired."""
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT worker FROM workers WHERE expires_at >= ?', (now,)
+            ).fetchall()
+        return [worker for worker, in rows]
+
+    def remove_worker(self, worker):
+        """Removes the worker and all its leases."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                'DELETE FROM workers WHERE worker = ?', (worker,))
+            self._connection.execute(
+                'DELETE FROM leases WHERE worker = ?', (worker,))
+
+    def acquire(self, worker, tenants, now, expires_at):
+        """Takes or renews leases of free tenants, returns owned ones."""
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'INSERT INTO leases (tenant, worker, expires_at) '
+                'VALUES (?, ?, ?) '
+                'ON CONFLICT(tenant) DO UPDATE SET '
+                'worker = excluded.worker, expires_at = excluded.expires_at '
+                'WHERE leases.worker = excluded.worker '
+                'OR leases.expires_at < ?',
+                ((tenant, worker, expires_at, now) for tenant in tenants)
+            )
+            rows = self._connection.execute(
+                'SELECT tenant FROM leases '
+                'WHERE worker = ? AND expires_at >= ?',
+                (worker, now)
+            ).fetchall()
+        return {tenant for tenant, in rows}
+
+    def release(self, worker, tenants):
+        """Gives up leases of the tenants held by the worker."""
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'DELETE FROM leases WHERE worker = ? AND tenant = ?',
+                ((worker, tenant) for tenant in tenants)
+            )
+
+    def close(self):
+        """Closes the database connection."""
+        with self._lock:
+            self._connection.close()
+
+
+class WorkerHeartbeat:
+    """Keeps the worker marked alive in the store while it runs.
+
+    Used by workers which do not share tenants, so commands such as
+    the backfill can tell that the bot is running.
+    """
+
+    def __init__(self, worker_id, store, ttl=LEASE_TTL, clock=time.time):
+        self.worker_id = worker_id
+        self.store = store
+        self.ttl = ttl
+        self.clock = clock
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def beat(self):
+        """Marks the worker alive for the next ttl seconds."""
+        self.store.heartbeat(self.worker_id, self.clock() + self.ttl)
+
+    def _run(self):
+        while not self._stopped.wait(self.ttl / 3):
+            try:
+                self.beat()
+            except sqlite3.Error as error_message:
+                logging.exception(error_message)
+
+    def start(self):
+        """Sends the first heartbeat and keeps sending them in background."""
+        self.beat()
+        self._thread = threading.Thread(
+            target=self._run, name='worker-heartbeat', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops the heartbeats and removes the worker from the store."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.store.remove_worker(self.worker_id)
+
+
+class ShardCoordinator:
+    """Decides which tenants are polled by this worker.
+
+    There is no leader: every worker builds the same hash ring from
+    the list of live workers and leases the tenants mapped to itself.
+    A tenant moves to another worker only after the previous owner has
+    released its lease or the lease has expired, and never while its
+    poll is running, so it is never polled by two workers at once.
+    on_acquire and on_release are called in the coordinator thread with
+    the keys the worker has got and has lost.
+    """
+
+    def __init__(self, worker_id, store, tenant_keys, ttl=LEASE_TTL,
+                 on_acquire=None, on_release=None, clock=time.time):
+        self.worker_id = worker_id
+        self.store = store
+        self.tenant_keys = set(tenant_keys)
+        self.ttl = ttl
+        self.on_acquire = on_acquire
+        self.on_release = on_release
+        self.clock = clock
+        self.owned = set()
+        self._busy = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def refresh(self):
+        """Sends a heartbeat and rebalances the leases of this worker."""
+        now = self.clock()
+        expires_at = now + self.ttl
+        self.store.heartbeat(self.worker_id, expires_at)
+        ring = HashRing(self.store.live_workers(now))
+        wanted = {
+            key for key in self.tenant_keys
+            if ring.owner(key) == self.worker_id
+        }
+        with self._lock:
+            busy = set(self._busy)
+        released = (self.owned - wanted) - busy
+        if released:
+            self.store.release(self.worker_id, released)
+        owned = self.store.acquire(
+            self.worker_id, wanted | busy, now, expires_at)
+        with self._lock:
+            acquired = owned - self.owned
+            lost = self.owned - owned
+            self.owned = owned
+        if lost and self.on_release:
+            self.on_release(lost)
+        if acquired and self.on_acquire:
+            self.on_acquire(acquired)
+        if acquired or released:
+            logging.info(
+                f"Воркер {self.worker_id}: получено {len(acquired)}, "
+                f"освобождено {len(released)}, "
+                f"всего подписчиков {len(owned)}."
+            )
+
+    def set_tenants(self, tenants):
+        """Replaces the tenants shared between the workers."""
+        self.tenant_keys = {tenant.key for tenant in tenants}
+
+    @contextmanager
+    def claim(self, tenant_key):
+        """Yields whether this worker may poll the tenant now.
+
+        The lease is not released while the with block runs.
+        """
+        with self._lock:
+            owned = tenant_key in self.owned
+            if owned:
+                self._busy.add(tenant_key)
+        try:
+            yield owned
+        finally:
+            if owned:
+                with self._lock:
+                    self._busy.discard(tenant_key)
+
+    def guard(self, handler):
+        """Wraps the tenant handler to skip tenants of other workers."""
+        def guarded(tenant):
+            with self.claim(tenant.key) as owned:
+                if owned:
+                    handler(tenant)
+        return guarded
+
+    def _run(self):
+        while not self._stopped.wait(self.ttl / 3):
+            try:
+                self.refresh()
+            except sqlite3.Error as error_message:
+                logging.exception(error_message)
+
+    def start(self):
+        """Takes the first leases and keeps them renewed in background."""
+        self.refresh()
+        self._thread = threading.Thread(
+            target=self._run, name='shard-coordinator', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops renewing and gives all leases to other workers."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.store.remove_worker(self.worker_id)
+        self.owned = set()
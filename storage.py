@@ -0,0 +1,210 @@
+import hashlib
+import sqlite3
+import threading
+
+# Bytes of the digests of a homework and of its state in the cache
+DIGEST_SIZE = 8
+
+
+def connect(path):
+    """Opens the database shared by several threads and processes."""
+    connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    connection.execute('PRAGMA journal_mode=WAL')
+    return connection
+
+
+class CursorStore:
+    """Persistent ``from_date`` cursors of tenants kept in SQLite."""
+
+    def __init__(self, path):
+        self._connection = connect(path)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS cursors ('
+                'tenant TEXT PRIMARY KEY, from_date INTEGER NOT NULL)'
+            )
+
+    def get(self, tenant_key):
+        """Returns the saved cursor of the tenant or None."""
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT from_date FROM cursors WHERE tenant = ?',
+                (tenant_key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, tenant_key, from_date):
+        """Saves the cursor of the tenant."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT INTO cursors (tenant, from_date) VALUES (?, ?) '
+                'ON CONFLICT(tenant) DO UPDATE SET '
+                'from_date = excluded.from_date',
+                (tenant_key, from_date)
+            )
+
+    def close(self):
+        """Closes the database connection."""
+        with self._lock:
+            self._connection.close()
+
+
+def get_homework_key(homework):
+    """Returns the identifier of the homework in the state store."""
+    homework_id = homework.get('id')
+    if homework_id is not None:
+        return str(homework_id)
+    return homework.get('homework_name')
+
+
+def digest(value):
+    """Returns the short digest of the value kept in the state cache."""
+    return hashlib.blake2b(
+        repr(value).encode(), digest_size=DIGEST_SIZE).digest()
+
+
+def pack_states(states):
+    """Packs {homework digest: state digest} into one bytes object."""
+    return b''.join(key + state for key, state in sorted(states.items()))
+
+
+def unpack_states(packed):
+    """Returns {homework digest: state digest} of the packed states."""
+    step = 2 * DIGEST_SIZE
+    return {
+        packed[index:index + DIGEST_SIZE]:
+            packed[index + DIGEST_SIZE:index + step]
+        for index in range(0, len(packed), step)
+    }
+
+
+class HomeworkStateStore:
+    """Last seen status of every homework of every tenant.
+
+    States are kept in SQLite to survive restarts and cached in memory,
+    so computing a diff does not touch the database. The cache holds
+    one bytes object per tenant with digests of homeworks and of their
+    status and date, 16 bytes for a homework.
+    """
+
+    def __init__(self, path):
+        self._connection = connect(path)
+        self._lock = threading.Lock()
+        self._cache = {}
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS homework_states ('
+                'tenant TEXT NOT NULL, homework TEXT NOT NULL, '
+                'status TEXT NOT NULL, date_updated TEXT, '
+                'homework_name TEXT, '
+                'PRIMARY KEY (tenant, homework))'
+            )
+            columns = {
+                row[1] for row in self._connection.execute(
+                    'PRAGMA table_info(homework_states)')
+            }
+            if 'homework_name' not in columns:
+                self._connection.execute(
+                    'ALTER TABLE homework_states '
+                    'ADD COLUMN homework_name TEXT')
+
+    def _load(self, tenant_key):
+        packed = self._cache.get(tenant_key)
+        if packed is None:
+            rows = self._connection.execute(
+                'SELECT homework, status, date_updated '
+                'FROM homework_states WHERE tenant = ?',
+                (tenant_key,)
+            ).fetchall()
+            packed = pack_states({
+                digest(key): digest((status, date_updated))
+                for key, status, date_updated in rows
+            })
+            self._cache[tenant_key] = packed
+        return unpack_states(packed)
+
+    def get(self, tenant_key):
+        """Returns {homework: (status, date_updated)} of the tenant.
+
+        The database is read directly, the cache keeps digests only.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT homework, status, date_updated '
+                'FROM homework_states WHERE tenant = ?',
+                (tenant_key,)
+            ).fetchall()
+        return {key: (status, date_updated)
+                for key, status, date_updated in rows}
+
+    def homeworks(self, tenant_key):
+        """Returns saved homeworks of the tenant, the newest first.
+
+        The database is read directly, so states saved by other worker
+        processes are included.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT status, date_updated, homework_name '
+                'FROM homework_states WHERE tenant = ?',
+                (tenant_key,)
+            ).fetchall()
+        return sorted(
+            (
+                {'homework_name': name, 'status': status,
+                 'date_updated': date_updated}
+                for status, date_updated, name in rows
+            ),
+            key=lambda homework: homework['date_updated'] or '',
+            reverse=True
+        )
+
+    def forget(self, tenant_key):
+        """Drops cached states of the tenant, they are reread on next use."""
+        with self._lock:
+            self._cache.pop(tenant_key, None)
+
+    def diff(self, tenant_key, homeworks):
+        """Returns homeworks whose status changed since the last save.
+
+        Homeworks are returned from the oldest update to the newest one.
+        """
+        with self._lock:
+            states = self._load(tenant_key)
+        changed = []
+        for homework in homeworks:
+            key = get_homework_key(homework)
+            state = (homework.get('status'), homework.get('date_updated'))
+            if key is None or states.get(digest(key)) != digest(state):
+                changed.append(homework)
+        return sorted(
+            changed, key=lambda homework: homework.get('date_updated') or '')
+
+    def save(self, tenant_key, homework):
+        """Saves the status of the homework as delivered."""
+        key = get_homework_key(homework)
+        state = (
+            homework.get('status'),
+            homework.get('date_updated'),
+            homework.get('homework_name')
+        )
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT INTO homework_states '
+                '(tenant, homework, status, date_updated, homework_name) '
+                'VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(tenant, homework) DO UPDATE SET '
+                'status = excluded.status, '
+                'date_updated = excluded.date_updated, '
+                'homework_name = excluded.homework_name',
+                (tenant_key, key) + state
+            )
+            states = self._load(tenant_key)
+            states[digest(key)] = digest(state[:2])
+            self._cache[tenant_key] = pack_states(states)
+
+    def close(self):
+        """Closes the database connection."""
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,117 @@
+import codecs
+import json
+
+WHITESPACE = ' \t\n\r'
+# Larger values are treated as malformed, so a broken body is not read
+# into memory whole
+MAX_VALUE_SIZE = 1024 * 1024
+
+
+class StreamingAnswer:
+    """JSON object read from chunks of the body, array items one by one.
+
+    Iterating yields the items of the array under key as they arrive;
+    other fields of the object are kept in fields and are complete once
+    the iteration ends. Only the item being decoded and one chunk are
+    held in memory, so memory does not depend on the length of the
+    array. Malformed JSON raises ValueError.
+    """
+
+    def __init__(self, chunks, key='homeworks',
+                 max_value_size=MAX_VALUE_SIZE):
+        self.key = key
+        self.max_value_size = max_value_size
+        self.fields = {}
+        self.found = False
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buffer = ''
+        self._position = 0
+        self._finished = False
+
+    def _read(self):
+        """Appends the next chunk, returns False at the end of the body."""
+        if self._finished:
+            return False
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self._finished = True
+            text = self._decoder.decode(b'', final=True)
+        elif isinstance(chunk, str):
+            text = chunk
+        else:
+            text = self._decoder.decode(chunk)
+        self._buffer = self._buffer[self._position:] + text
+        self._position = 0
+        return True
+
+    def _peek(self):
+        """Returns the next character after whitespace, not consuming it."""
+        while True:
+            while (self._position < len(self._buffer)
+                   and self._buffer[self._position] in WHITESPACE):
+                self._position += 1
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+            if not self._read():
+                raise ValueError("Ответ API оборван.")
+
+    def _expect(self, expected):
+        char = self._peek()
+        if char not in expected:
+            raise ValueError(
+                f"Некорректный JSON в ответе API: позиция {self._position}, "
+                f"ожидалось {expected!r}, получено {char!r}.")
+        self._position += 1
+        return char
+
+    def _value(self):
+        """Decodes the next value, reading chunks until it is complete."""
+        self._peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(
+                    self._buffer, self._position)
+            except json.JSONDecodeError:
+                if len(self._buffer) - self._position > self.max_value_size:
+                    raise ValueError(
+                        "Значение в ответе API больше "
+                        f"{self.max_value_size} символов.")
+                if not self._read():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next
+            # chunk
+            if end == len(self._buffer) and self._read():
+                continue
+            self._position = end
+            return value
+
+    def _items(self):
+        self.found = True
+        self._position += 1
+        if self._peek() == ']':
+            self._position += 1
+            return
+        while True:
+            yield self._value()
+            if self._expect(',]') == ']':
+                return
+
+    def __iter__(self):
+        self._expect('{')
+        if self._peek() == '}':
+            self._position += 1
+            return
+        while True:
+            key = self._value()
+            if not isinstance(key, str):
+                raise ValueError("Ключ JSON в ответе API не строка.")
+            self._expect(':')
+            if key == self.key and self._peek() == '[':
+                yield from self._items()
+            else:
+                self.fields[key] = self._value()
+            if self._expect(',}') == '}':
+                return
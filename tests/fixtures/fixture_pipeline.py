@@ -0,0 +1,153 @@
+import json
+import threading
+
+import pytest
+
+
+class MockResponse:
+    """Answer of the Practicum API read whole or streamed in chunks.
+
+    With an error the stream is broken by it after the first chunk.
+    """
+
+    reason = 'OK'
+    text = ''
+    headers = {}
+
+    def __init__(self, data=None, status_code=200, chunk_size=None,
+                 error=None):
+        self.data = data
+        self.status_code = status_code
+        self.chunk_size = chunk_size
+        self.error = error
+        self.closed = False
+
+    def json(self):
+        return self.data
+
+    def iter_content(self, chunk_size):
+        body = json.dumps(self.data).encode()
+        size = self.chunk_size or chunk_size
+        for start in range(0, len(body), size):
+            yield body[start:start + size]
+            if self.error is not None:
+                raise self.error
+
+    def close(self):
+        self.closed = True
+
+
+class MockSession:
+    """Session giving the answers in turn, the last one repeatedly.
+
+    An answer is the data of the response, a MockResponse, an exception
+    to raise or a callable building one of them from the request.
+    """
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.requests = []
+        self.response = None
+        self._lock = threading.Lock()
+
+    def get(self, **kwargs):
+        with self._lock:
+            self.requests.append(kwargs)
+            if len(self.answers) > 1:
+                answer = self.answers.pop(0)
+            else:
+                answer = self.answers[0]
+        if callable(answer):
+            answer = answer(**kwargs)
+        if isinstance(answer, Exception):
+            raise answer
+        if not isinstance(answer, MockResponse):
+            answer = MockResponse(answer)
+        self.response = answer
+        return answer
+
+
+class MockQueue:
+    """Outbound queue keeping (chat_id, message) of put messages."""
+
+    def __init__(self):
+        self.messages = []
+
+    def put(self, chat_id, message, created=None):
+        self.messages.append((chat_id, message))
+
+    def flush(self):
+        pass
+
+
+def close_context(context):
+    """Closes the stores of the poll context."""
+    for store in (context.events, context.cursors, context.states):
+        if store is not None:
+            store.close()
+
+
+@pytest.fixture
+def state_db(tmp_path):
+    return str(tmp_path / 'state.sqlite3')
+
+
+@pytest.fixture
+def closing():
+    """Returns a function registering stores closed after the test."""
+    stores = []
+
+    def register(store):
+        stores.append(store)
+        return store
+
+    yield register
+    for store in reversed(stores):
+        store.close()
+
+
+@pytest.fixture
+def state_store(state_db):
+    from storage import HomeworkStateStore
+
+    states = HomeworkStateStore(state_db)
+    yield states
+    states.close()
+
+
+@pytest.fixture
+def poll_context(state_db):
+    """Returns a factory of poll contexts with stores in state_db.
+
+    Stores of the contexts are closed after the test; make.close()
+    closes them earlier to imitate a restart.
+    """
+    import homework
+    from scheduler import PollScheduler
+    from storage import CursorStore, HomeworkStateStore
+
+    contexts = []
+
+    defaults = {
+        'queue': MockQueue,
+        'cursors': lambda: CursorStore(state_db),
+        'states': lambda: HomeworkStateStore(state_db),
+        'scheduler': lambda: PollScheduler(600),
+    }
+
+    def make(session=None, **fields):
+        for name, create in defaults.items():
+            if name not in fields:
+                fields[name] = create()
+        context = homework.PollContext(session=session, **fields)
+        contexts.append(context)
+        return context
+
+    def close(context):
+        contexts.remove(context)
+        close_context(context)
+
+    make.close = close
+    yield make
+    for context in contexts:
+        close_context(context)
@@ -0,0 +1,55 @@
+import json
+
+import analytics
+from history import EventLog, feed_key
+
+HOUR = 3600
+
+
+class TestAnalytics:
+
+    def test_percentile_and_histogram(self):
+        values = [1, 2, 3, 4, 5]
+        assert analytics.percentile(values, 50) == 3
+        assert analytics.percentile(values, 90) == 4.6
+        assert analytics.percentile([], 50) is None
+        assert analytics.histogram([0, 1, 3, 10], (1, 4)) == {
+            '<1': 1, '1-4': 2, '>=4': 1}
+
+    def test_review_report(self, tmp_path):
+        events = EventLog(str(tmp_path / 'state.sqlite3'))
+        events.append('a', 1, 'reviewing', 0, project='bot')
+        events.append('a', 1, 'rejected', 2 * HOUR)
+        events.append('a', 1, 'reviewing', 3 * HOUR)
+        events.append('a', 1, 'approved', 13 * HOUR)
+        events.append('b', 1, 'reviewing', 0, project='api')
+        events.append('b', 1, 'approved', 30 * HOUR)
+        verdicts = events.verdicts(since=HOUR)
+        events.close()
+
+        report = analytics.review_report(verdicts, by='project')
+        assert set(report) == {'api', 'bot'}
+        assert report['bot']['turnaround_hours']['count'] == 2
+        assert report['bot']['turnaround_hours']['p50'] == 6
+        assert report['bot']['rounds']['mean'] == 2
+        assert report['api']['turnaround_hours']['histogram']['24-72'] == 1
+        assert analytics.review_report(verdicts)['all']['rounds'][
+            'count'] == 2
+
+    def test_review_started_before_period(self, tmp_path):
+        events = EventLog(str(tmp_path / 'state.sqlite3'))
+        events.append('a', 1, 'reviewing', 0)
+        events.append('a', 1, 'approved', 5 * HOUR)
+        verdicts = events.verdicts(since=4 * HOUR, until=6 * HOUR)
+        events.close()
+        assert [verdict.at - verdict.reviewing for verdict in verdicts] == [
+            5 * HOUR]
+
+    def test_cohorts_from_tenants_file(self, tmp_path):
+        path = tmp_path / 'tenants.json'
+        path.write_text(json.dumps([
+            {'practicum_token': 'one', 'chat_id': 1, 'cohort': 'python-42'},
+            {'practicum_token': 'two', 'chat_id': 2},
+        ]))
+        cohorts = analytics.load_cohorts(str(path))
+        assert cohorts == {feed_key('one'): 'python-42'}
@@ -0,0 +1,128 @@
+import json
+import time
+
+import pytest
+
+from backfill import BackfillCheckpoints, run_backfill
+from engine import Tenant
+from history import EventLog, feed_key
+from registry import TenantRegistry
+from sharding import LeaseStore
+from tests.fixtures.fixture_pipeline import MockResponse, MockSession
+
+DAY = 24 * 60 * 60
+# 2022-01-01T00:00:00Z
+START = 1640995200
+HOMEWORKS = [
+    {'id': 1, 'homework_name': 'hw1', 'status': 'approved',
+     'date_updated': '2022-01-01T12:00:00Z'},
+    {'id': 2, 'homework_name': 'hw2', 'status': 'rejected',
+     'date_updated': '2022-01-03T12:00:00Z'},
+    {'id': 3, 'homework_name': 'hw3', 'status': 'reviewing'},
+]
+
+
+def answer(from_date, broken=False):
+    """Returns homeworks updated since the day of from_date."""
+    data = {'homeworks': [
+        homework for homework in HOMEWORKS
+        if homework.get('date_updated') is None
+        or homework['date_updated'] >= '2022-01-0{}'.format(
+            1 + (from_date - START) // DAY)
+    ], 'current_date': START + 4 * DAY}
+    # The first chunk ends after the first homework
+    return MockResponse(
+        data,
+        chunk_size=json.dumps(data).encode().index(b'}') + 2,
+        error=ConnectionError('Соединение разорвано') if broken else None
+    )
+
+
+def backfill_session(broken=False):
+    return MockSession(
+        lambda params, **kwargs: answer(params['from_date'], broken))
+
+
+def requested(session):
+    return [
+        (request['headers']['Authorization'], request['params']['from_date'])
+        for request in session.requests
+    ]
+
+
+def make_context(poll_context, state_db, session):
+    return poll_context(
+        session, queue=None, scheduler=None, events=EventLog(state_db))
+
+
+class TestBackfill:
+
+    def test_one_request_per_token(self, poll_context, state_db):
+        context = make_context(poll_context, state_db, backfill_session())
+        tenants = TenantRegistry(
+            [Tenant('token', 1), Tenant('token', 2), Tenant('other', 3)],
+            now=0)
+        checkpoints = BackfillCheckpoints(state_db)
+        failed = run_backfill(
+            context, tenants, START, START + 4 * DAY, concurrency=2,
+            checkpoints=checkpoints)
+        checkpoints.close()
+        assert failed == []
+        assert sorted(requested(context.session)) == [
+            ('OAuth other', START), ('OAuth token', START)]
+        for tenant in tenants:
+            assert set(context.states.get(tenant.key)) == {'1', '2', '3'}
+            assert context.cursors.get(tenant.key) == START + 4 * DAY
+        assert [event.homework for event in context.events.events(
+            feed_key('token'), until=START + 4 * DAY)] == ['1', '2']
+
+    def test_homeworks_after_until_are_skipped(self, poll_context, state_db):
+        context = make_context(poll_context, state_db, backfill_session())
+        tenants = TenantRegistry([Tenant('token', 1)], now=0)
+        tenant = next(iter(tenants))
+        assert run_backfill(context, tenants, START, START + DAY) == []
+        assert set(context.states.get(tenant.key)) == {'1', '3'}
+
+    def test_interrupted_backfill_resumes(self, poll_context, state_db):
+        tenants = TenantRegistry([Tenant('token', 1)], now=0)
+        tenant = next(iter(tenants))
+        checkpoints = BackfillCheckpoints(state_db)
+        context = make_context(
+            poll_context, state_db, backfill_session(broken=True))
+        failed = run_backfill(
+            context, tenants, START, START + 4 * DAY,
+            checkpoints=checkpoints)
+        assert failed == [tenant]
+        assert context.cursors.get(tenant.key) is None
+        assert set(context.states.get(tenant.key)) == {'1'}
+        poll_context.close(context)
+
+        context = make_context(poll_context, state_db, backfill_session())
+        failed = run_backfill(
+            context, tenants, START, START + 5 * DAY,
+            checkpoints=checkpoints)
+        assert failed == []
+        assert requested(context.session) == [
+            ('OAuth token', START + DAY // 2)]
+        assert set(context.states.get(tenant.key)) == {'1', '2', '3'}
+        assert context.cursors.get(tenant.key) == START + 5 * DAY
+
+        context.session.requests.clear()
+        assert run_backfill(
+            context, tenants, START, START + 5 * DAY,
+            checkpoints=checkpoints) == []
+        assert context.session.requests == []
+        checkpoints.close()
+
+    def test_refuses_to_run_with_live_workers(self, state_db, monkeypatch):
+        import backfill
+
+        monkeypatch.setattr(backfill, 'STATE_DB', state_db)
+        monkeypatch.setattr(backfill, 'SHARD_DB', None)
+        store = LeaseStore(state_db)
+        store.heartbeat('worker-1', time.time() + 60)
+        monkeypatch.setattr(
+            backfill, 'select_tenants',
+            lambda chats: pytest.fail('Бот запущен, загрузка недопустима'))
+        assert backfill.main(['--since', '2022-01-01']) == 1
+        store.close()
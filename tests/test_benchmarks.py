@@ -0,0 +1,43 @@
+from benchmarks.load_test import percentile, run_load_test
+from benchmarks.startup import (
+    compare, parse_importtime, run_startup_benchmark)
+
+
+class TestLoadTest:
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        assert percentile(values, 0.5) == 50
+        assert percentile(values, 0.99) == 99
+        assert percentile([3], 0.99) == 3
+
+    def test_smoke(self):
+        report = run_load_test(
+            tenants=3, duration=1.5, interval=0.2, concurrency=3,
+            api_latency=0, telegram_latency=0, change_rate=1, seed=1)
+        assert report['polls'] >= 3
+        assert report['changes'] > 0
+        assert report['notified'] > 0
+        assert report['latency_p50_s'] < 5
+
+
+class TestStartup:
+
+    def test_parse_importtime(self):
+        stderr = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       100 |        100 | site\n'
+            'import time:        50 |         50 |     json.decoder\n'
+            'import time:        10 |         60 |   json\n'
+            'import time:        20 |         20 |   engine\n'
+            'import time:         5 |         85 | homework\n'
+        )
+        times, children = parse_importtime(stderr)
+        assert times['homework'] == (5, 85)
+        assert children == {'json': 60, 'engine': 20}
+
+    def test_heavy_modules_are_lazy(self):
+        report = run_startup_benchmark(runs=1)
+        assert report['import_ms'] > 0
+        assert report['lazy_modules_imported'] == []
+        assert compare(report, report) == []
@@ -0,0 +1,108 @@
+import threading
+import time
+
+from commands import BotCommands, SingleFlight, start_commands
+from engine import Tenant
+from tests.fixtures.fixture_pipeline import MockQueue
+
+VERDICTS = {'approved': 'OK', 'reviewing': 'На проверке'}
+
+
+class TestSingleFlight:
+
+    def test_concurrent_calls_share_result(self):
+        single_flight = SingleFlight()
+        calls = []
+        results = []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.1)
+            return 'result'
+
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(
+                    single_flight.do('token', fetch)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(calls) == 1
+        assert results == ['result'] * 5
+        assert single_flight.do('token', lambda: 'again') == 'again'
+
+
+class TestBotCommands:
+
+    def make_commands(self, states, fetch):
+        tenant = Tenant('token', 1)
+        return BotCommands(
+            [tenant], states, MockQueue(), fetch, lambda locale: VERDICTS
+        ), tenant
+
+    def test_status_from_cache(self, state_store):
+        def fetch(tenant):
+            assert False, 'Статус должен браться из кэша'
+
+        commands, tenant = self.make_commands(state_store, fetch)
+        state_store.save(tenant.key, {
+            'id': 1, 'homework_name': 'hw1', 'status': 'approved',
+            'date_updated': '2022-01-01T00:00:00Z'})
+        state_store.save(tenant.key, {
+            'id': 2, 'homework_name': 'hw2', 'status': 'reviewing',
+            'date_updated': '2022-01-02T00:00:00Z'})
+        assert commands.status_text(1) == '"hw2": На проверке'
+        assert commands.history_text(1).splitlines() == [
+            '2022-01-02T00:00:00Z "hw2": На проверке',
+            '2022-01-01T00:00:00Z "hw1": OK',
+        ]
+        assert commands.status_text(2) == "Чат не подписан на уведомления."
+
+    def test_status_fetches_when_cache_empty(self, state_store):
+        calls = []
+
+        def fetch(tenant):
+            calls.append(tenant)
+            return [{'homework_name': 'hw1', 'status': 'approved'}]
+
+        commands, tenant = self.make_commands(state_store, fetch)
+        assert commands.status_text('1') == '"hw1": OK'
+        assert commands.history_text('1') == '- "hw1": OK'
+        assert len(calls) == 1
+        assert state_store.get(tenant.key) == {}
+
+    def test_verdicts_of_tenant_locale(self, state_store):
+        from rendering import MessageRenderer
+
+        tenant = Tenant('token', 1, locale='en')
+        state_store.save(tenant.key, {
+            'id': 1, 'homework_name': 'hw1', 'status': 'reviewing'})
+        commands = BotCommands(
+            [tenant], state_store, MockQueue(), None,
+            MessageRenderer().verdicts)
+        assert commands.status_text(1) == (
+            '"hw1": The work has been taken for review.')
+
+
+class TestStartCommands:
+
+    def test_handlers_run_in_updater_workers(self, monkeypatch):
+        import telegram
+        from telegram.ext import Updater
+
+        monkeypatch.setattr(Updater, 'start_polling', lambda self: None)
+        bot = telegram.Bot(token='123:secret')
+        commands = BotCommands(
+            [], None, MockQueue(), lambda tenant: [], lambda locale: {})
+        updater = start_commands(bot, commands, workers=3)
+        try:
+            handlers = updater.dispatcher.handlers[0]
+            assert [handler.command for handler in handlers] == [
+                ['status'], ['history']]
+            assert all(handler.run_async for handler in handlers)
+            assert updater.dispatcher.workers == 3
+        finally:
+            updater.stop()
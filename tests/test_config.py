@@ -0,0 +1,186 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from config import ConfigWatcher, apply_tunables, load_config
+from engine import PollingEngine, Tenant
+from registry import TenantRegistry
+from scheduler import PollScheduler
+
+
+def write_json(path, data):
+    path.write_text(json.dumps(data))
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+class TestConfig:
+
+    def test_load_list(self, tmp_path):
+        path = tmp_path / 'tenants.json'
+        write_json(path, [{'practicum_token': 'token', 'chat_id': 1}])
+        config = load_config(str(path))
+        assert [tenant.chat_id for tenant in config.tenants] == [1]
+        assert config.tunables == {}
+
+    def test_load_directory(self, tmp_path):
+        write_json(tmp_path / 'a.json', {
+            'tenants': [{'practicum_token': 'token1', 'chat_id': 1}],
+            'scheduler': {'interval': 300},
+        })
+        write_json(tmp_path / 'b.json', [
+            {'practicum_token': 'token2', 'chat_id': 2, 'locale': 'en'}])
+        (tmp_path / 'notes.txt').write_text('ignored')
+        config = load_config(str(tmp_path))
+        assert [tenant.chat_id for tenant in config.tenants] == [1, 2]
+        assert config.tenants[1].locale == 'en'
+        scheduler = PollScheduler(600)
+        apply_tunables(scheduler, config.tunables)
+        assert scheduler.interval == 300
+
+    def test_unknown_tunable(self, tmp_path):
+        path = tmp_path / 'tenants.json'
+        write_json(path, {'tenants': [], 'scheduler': {'typo': 1}})
+        with pytest.raises(KeyError):
+            load_config(str(path))
+
+    @pytest.mark.parametrize('tunables, error', [
+        ({'interval': '600'}, TypeError),
+        ({'interval': True}, TypeError),
+        ({'interval': 0}, ValueError),
+        ({'backoff_max': -1}, ValueError),
+        ({'jitter': 1.5}, ValueError),
+    ])
+    def test_invalid_tunable(self, tmp_path, tunables, error):
+        path = tmp_path / 'tenants.json'
+        write_json(path, {'tenants': [], 'scheduler': tunables})
+        with pytest.raises(error):
+            load_config(str(path))
+
+    def test_duplicate_tenants(self, tmp_path):
+        path = tmp_path / 'tenants.json'
+        write_json(path, [
+            {'practicum_token': 'one', 'chat_id': 1},
+            {'practicum_token': 'two', 'chat_id': 1},
+        ])
+        with pytest.raises(ValueError):
+            load_config(str(path))
+        write_json(path, [
+            {'practicum_token': 'one', 'chat_id': 1, 'id': 'one'},
+            {'practicum_token': 'two', 'chat_id': 1, 'id': 'two'},
+        ])
+        assert len(load_config(str(path)).tenants) == 2
+
+    def test_tenant_of_env_is_reserved(self, tmp_path):
+        path = tmp_path / 'tenants.json'
+        write_json(path, [{'practicum_token': 'other', 'chat_id': 1}])
+        with pytest.raises(ValueError):
+            load_config(str(path), [Tenant('token', 1)])
+        write_json(path, [
+            {'practicum_token': 'other', 'chat_id': 1, 'id': 'other'}])
+        assert len(load_config(str(path), [Tenant('token', 1)]).tenants) == 1
+
+    def test_watcher_reloads_changed_file(self, tmp_path):
+        path = tmp_path / 'tenants.json'
+        write_json(path, [])
+        configs = []
+        watcher = ConfigWatcher(str(path), configs.append)
+        assert not watcher.check()
+        write_json(path, [{'practicum_token': 'token', 'chat_id': 1}])
+        assert watcher.check()
+        assert len(configs[0].tenants) == 1
+
+    def test_watcher_keeps_config_on_error(self, tmp_path):
+        path = tmp_path / 'tenants.json'
+        write_json(path, [])
+        configs = []
+        watcher = ConfigWatcher(str(path), configs.append)
+        path.write_text('{broken')
+        os.utime(path, ns=(0, 0))
+        assert not watcher.check()
+        assert configs == []
+
+    def test_watcher_survives_failed_change(self, tmp_path):
+        path = tmp_path / 'tenants.json'
+        write_json(path, [])
+
+        def on_change(config):
+            raise RuntimeError('boom')
+
+        watcher = ConfigWatcher(str(path), on_change)
+        write_json(path, [{'practicum_token': 'token', 'chat_id': 1}])
+        os.utime(path, ns=(0, 0))
+        assert not watcher.check()
+
+
+class TestTenantRegistryUpdate:
+
+    def test_add_remove_rotate(self):
+        kept, removed, rotated = (
+            Tenant('kept', 1), Tenant('removed', 2), Tenant('old', 3))
+        registry = TenantRegistry([kept, removed, rotated], now=0)
+        added = Tenant('added', 4)
+        result = registry.update(
+            [Tenant('kept', 1), added, Tenant('new', 3)])
+        assert result == ([added], [removed], [rotated])
+        assert registry.get(kept.key) is kept
+        assert registry.get(rotated.key) is rotated
+        assert rotated.practicum_token == 'new'
+        assert rotated.headers == {'Authorization': 'OAuth new'}
+        assert len(registry) == 3
+
+    def test_rotated_tenant_is_stable_on_next_reload(self):
+        tenant = Tenant('old', 1)
+        registry = TenantRegistry([tenant], now=0)
+        registry.update([Tenant('new', 1)])
+        assert registry.update([Tenant('new', 1)]) == ([], [], [])
+        assert registry.get(tenant.key) is tenant
+
+    def test_rotation_keeps_key_after_restart(self):
+        assert Tenant('old', 1).key == Tenant('new', 1).key
+        assert Tenant('token', 1).key != Tenant('token', 2).key
+        assert Tenant('token', 1, tenant_id='a').key != Tenant(
+            'token', 1, tenant_id='b').key
+
+    def test_engine_schedules_added_tenants(self):
+        scheduler = PollScheduler(60, spread_window=0)
+        polled = []
+        engine = PollingEngine(
+            [Tenant('first', 1)], lambda tenant: polled.append(
+                tenant.chat_id), scheduler, tick=0.01)
+
+        async def run():
+            task = asyncio.ensure_future(engine.run())
+            while not polled:
+                await asyncio.sleep(0.01)
+            engine.call_soon(
+                engine.update_tenants, [Tenant('second', 2)])
+            while 2 not in polled:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run())
+        assert polled == [1, 2]
+        assert [tenant.chat_id for tenant in engine.tenants] == [2]
+
+
+class TestCheckConfig:
+
+    def test_check_config(self, monkeypatch, tmp_path):
+        import homework
+
+        monkeypatch.setattr(homework, 'PRACTICUM_TOKEN', 'token')
+        monkeypatch.setattr(homework, 'TELEGRAM_TOKEN', '1234:abc')
+        monkeypatch.setattr(homework, 'TELEGRAM_CHAT_ID', 1)
+        path = tmp_path / 'tenants.json'
+        write_json(path, [{'practicum_token': 'token', 'chat_id': 2}])
+        monkeypatch.setattr(homework, 'TENANTS_FILE', str(path))
+        assert homework.check_config()
+        path.write_text('{broken')
+        assert not homework.check_config()
+        monkeypatch.setattr(homework, 'TELEGRAM_TOKEN', None)
+        assert not homework.check_config()
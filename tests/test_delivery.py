@@ -0,0 +1,211 @@
+import threading
+import time
+
+from delivery import OutboundQueue, TokenBucket, coalesce, split_message
+from exceptions import TelegramConnectionError, TelegramRetryAfter
+from metrics import ERRORS
+from outbox import Outbox
+from resilience import CircuitBreaker
+
+
+class FakeClock:
+
+    def __init__(self, now=0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket:
+
+    def test_rate(self):
+        clock = FakeClock()
+        bucket = TokenBucket(2, clock=clock)
+        assert bucket.delay() == 0
+        bucket.acquire()
+        bucket.acquire()
+        assert bucket.delay() == 0.5
+        clock.now = 0.5
+        assert bucket.delay() == 0
+
+
+class TestOutboundQueue:
+
+    def test_coalesce(self):
+        assert coalesce(['a', 'b', 'c']) == ('a\n\nb\n\nc', 3)
+        assert coalesce(['a' * 3, 'b' * 3], limit=5) == ('aaa', 1)
+        assert coalesce(['a\\.' * 5], limit=5) == ('a\\.' * 5, 1)
+
+    def test_split_message(self):
+        assert split_message('short', limit=5) == ['short']
+        assert split_message('ab\ncd\nef\\.', limit=5) == ['ab\ncd', 'ef\\.']
+        assert split_message('abcdef\ng', limit=5) == ['abcdef', 'g']
+
+    def test_pending_messages_of_chat_are_coalesced(self):
+        sent = []
+        queue = OutboundQueue(lambda chat_id, text: sent.append(
+            (chat_id, text)))
+        queue.put(1, 'first')
+        queue.put(1, 'second')
+        queue.put(2, 'other')
+        assert queue.depth == 3
+        queue.start()
+        queue.close(timeout=5)
+        assert sorted(sent) == [('1', 'first\n\nsecond'), ('2', 'other')]
+        assert queue.depth == 0
+
+    def test_retry_after(self):
+        errors = ERRORS.value('TelegramRetryAfter')
+        sent = []
+        attempts = []
+        done = threading.Event()
+
+        def send(chat_id, text):
+            attempts.append(text)
+            if len(attempts) == 1:
+                raise TelegramRetryAfter(retry_after=0.05)
+            sent.append(text)
+            done.set()
+
+        queue = OutboundQueue(send, chat_rate=100)
+        queue.start()
+        queue.put(1, 'message')
+        assert done.wait(5)
+        queue.close(timeout=5)
+        assert sent == ['message']
+        assert len(attempts) == 2
+        assert ERRORS.value('TelegramRetryAfter') == errors + 1
+
+    def test_close_does_not_wait_for_send_past_timeout(self):
+        release = threading.Event()
+        started = threading.Event()
+
+        def send(chat_id, text):
+            started.set()
+            release.wait(5)
+
+        queue = OutboundQueue(send)
+        queue.start()
+        queue.put(1, 'stuck')
+        assert started.wait(5)
+        start = time.monotonic()
+        queue.close(timeout=0.2)
+        assert time.monotonic() - start < 1
+        release.set()
+
+
+class TestOutbox:
+
+    def test_delivered_message_is_marked(self, tmp_path, closing):
+        outbox = closing(Outbox(str(tmp_path / 'outbox.sqlite3')))
+        sent = []
+        queue = OutboundQueue(
+            lambda chat_id, text: sent.append(text), outbox=outbox)
+        queue.put(1, 'message')
+        queue.start()
+        queue.close(timeout=5)
+        assert sent == ['message']
+        assert outbox.pending_count() == 0
+
+    def test_pending_message_survives_restart(self, tmp_path):
+        path = str(tmp_path / 'outbox.sqlite3')
+        clock = FakeClock(1000)
+        outbox = Outbox(path, stale_after=60, clock=clock)
+
+        def fail(chat_id, text):
+            raise TelegramConnectionError('Telegram недоступен')
+
+        queue = OutboundQueue(fail, outbox=outbox)
+        queue.put(1, 'message', created=1)
+        queue.start()
+        queue.close(timeout=5)
+        assert outbox.pending_count() == 1
+        outbox.close()
+
+        clock.now += 30
+        outbox = Outbox(path, stale_after=60, clock=clock)
+        assert outbox.claim_stale() == []
+        clock.now += 61
+        claimed = outbox.claim_stale()
+        assert [row[1:] for row in claimed] == [('1', 'message', 1)]
+        assert outbox.claim_stale() == []
+        outbox.close()
+
+    def test_unexpected_error_counts_as_failed_attempt(self, tmp_path):
+        outbox = Outbox(str(tmp_path / 'outbox.sqlite3'), max_attempts=1)
+        breaker = CircuitBreaker('Telegram', failure_threshold=1)
+        attempts = []
+
+        def send(chat_id, text):
+            attempts.append(text)
+            raise ValueError('неожиданная ошибка')
+
+        queue = OutboundQueue(send, outbox=outbox, breaker=breaker)
+        queue.put(1, 'message')
+        queue.start()
+        queue.close(timeout=5)
+        assert attempts == ['message']
+        assert outbox.pending_count() == 0
+        assert outbox.claim_stale() == []
+        assert breaker.state == 'closed'
+        outbox.close()
+
+    def test_drainer_resends_stale_message(self, tmp_path, closing):
+        path = str(tmp_path / 'outbox.sqlite3')
+        outbox = closing(Outbox(path, stale_after=0))
+        outbox.add(1, 'lost before restart')
+        outbox.flush()
+        sent = []
+        done = threading.Event()
+
+        def send(chat_id, text):
+            sent.append((chat_id, text))
+            done.set()
+
+        queue = OutboundQueue(send, outbox=outbox, drain_interval=0.01)
+        queue.start()
+        assert done.wait(5)
+        queue.close(timeout=5)
+        assert sent == [('1', 'lost before restart')]
+        assert outbox.pending_count() == 0
+
+    def test_close_gives_up_after_timeout(self, tmp_path):
+        outbox = Outbox(str(tmp_path / 'outbox.sqlite3'))
+        sent = threading.Event()
+        queue = OutboundQueue(
+            lambda chat_id, text: sent.set(), chat_rate=1, outbox=outbox)
+        queue.put(1, 'first')
+        queue.start()
+        assert sent.wait(5)
+        queue.put(1, 'waits a second for the chat rate')
+        queue.close(timeout=0.2)
+        assert queue.depth == 0
+        assert outbox.pending_count() == 1
+        outbox.close()
+
+    def test_held_message_is_not_claimed_by_other_worker(
+            self, tmp_path, closing):
+        path = str(tmp_path / 'outbox.sqlite3')
+        release = threading.Event()
+        sent = []
+
+        def send_slowly(chat_id, text):
+            release.wait(5)
+            sent.append(('first', text))
+
+        first = OutboundQueue(
+            send_slowly, outbox=closing(Outbox(path, stale_after=0.2)),
+            drain_interval=0.01)
+        second = OutboundQueue(
+            lambda chat_id, text: sent.append(('second', text)),
+            outbox=closing(Outbox(path, stale_after=0.2)),
+            drain_interval=0.01)
+        first.start()
+        second.start()
+        first.put(1, 'message')
+        time.sleep(0.6)
+        release.set()
+        first.close(timeout=5)
+        second.close(timeout=5)
+        assert sent == [('first', 'message')]
@@ -0,0 +1,230 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from engine import PollingEngine, Tenant, load_tenants
+from scheduler import PollScheduler
+
+
+class TestPollingEngine:
+
+    def test_load_tenants(self, tmp_path):
+        path = tmp_path / 'tenants.json'
+        path.write_text(json.dumps([
+            {'practicum_token': 'token1', 'chat_id': 1},
+            {'practicum_token': 'token2', 'chat_id': 2},
+        ]))
+        tenants = load_tenants(path)
+        assert [tenant.chat_id for tenant in tenants] == [1, 2]
+        assert tenants[0].headers == {'Authorization': 'OAuth token1'}
+
+    def test_load_tenants_not_list(self, tmp_path):
+        path = tmp_path / 'tenants.json'
+        path.write_text(json.dumps({'practicum_token': 'token'}))
+        with pytest.raises(TypeError):
+            load_tenants(path)
+
+    def test_concurrency_cap(self):
+        tenants = [Tenant(f'token{i}', i) for i in range(20)]
+        lock = threading.Lock()
+        state = {'active': 0, 'peak': 0, 'calls': 0}
+        release = threading.Event()
+
+        def handler(tenant):
+            with lock:
+                state['active'] += 1
+                state['calls'] += 1
+                state['peak'] = max(state['peak'], state['active'])
+            release.wait(0.01)
+            with lock:
+                state['active'] -= 1
+
+        engine = PollingEngine(
+            tenants, handler, PollScheduler(60, spread_window=0),
+            concurrency=4)
+
+        async def run_once():
+            task = asyncio.ensure_future(engine.run())
+            while state['calls'] < len(tenants):
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run_once())
+        assert state['calls'] == len(tenants)
+        assert state['peak'] <= 4
+
+    def test_handler_error_does_not_stop_polling(self):
+        tenants = [Tenant('bad', 1), Tenant('good', 2)]
+        polled = []
+
+        def handler(tenant):
+            if tenant.practicum_token == 'bad':
+                raise RuntimeError('boom')
+            polled.append(tenant.chat_id)
+
+        engine = PollingEngine(
+            tenants, handler, PollScheduler(60, spread_window=0),
+            concurrency=2)
+
+        async def run_once():
+            task = asyncio.ensure_future(engine.run())
+            while not polled:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run_once())
+        assert polled == [2]
+
+    def test_scheduler_error_keeps_tenant_scheduled(self):
+        scheduler = PollScheduler(60, spread_window=0)
+        scheduler.interval = '600'
+        polled = []
+        engine = PollingEngine(
+            [Tenant('token', 1)], polled.append, scheduler, tick=0.01)
+
+        async def run_once():
+            task = asyncio.ensure_future(engine.run())
+            while not polled or engine._polling:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run_once())
+        assert engine.scheduled == 1
+
+    def test_polls_only_owned_keys(self):
+        tenants = [Tenant(f'token{i}', i) for i in range(4)]
+        polled = []
+        engine = PollingEngine(
+            tenants, lambda tenant: polled.append(tenant.chat_id),
+            PollScheduler(60, spread_window=0), tick=0.01, keys=())
+        engine.call_soon(engine.own, [tenants[0].key])
+
+        async def run_once():
+            task = asyncio.ensure_future(engine.run())
+            while not polled or engine._polling:
+                await asyncio.sleep(0.01)
+            engine.own([tenants[1].key])
+            engine.disown([tenants[0].key])
+            while len(polled) < 2 or engine._polling:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run_once())
+        assert polled == [0, 1]
+        assert engine.keys == {tenants[1].key}
+        assert not engine._polled(tenants[0])
+
+    def test_start_rate_limits_warm_up(self):
+        tenants = [Tenant(f'token{i}', i) for i in range(10)]
+        now = [0.0]
+        engine = PollingEngine(
+            tenants, lambda tenant: None,
+            PollScheduler(60, spread_window=0),
+            start_rate=2, clock=lambda: now[0])
+        engine._warm_up(engine.tenants.leaders())
+        assert len(engine._take_due()) == 2
+        assert engine.scheduled == 8
+        now[0] = 1
+        assert len(engine._take_due()) == 2
+        now[0] = 10
+        assert len(engine._take_due()) == 2
+
+    def test_start_rate_does_not_limit_later_polls(self):
+        tenants = [Tenant(f'token{i}', i) for i in range(3)]
+        now = [0.0]
+        engine = PollingEngine(
+            tenants, lambda tenant: None,
+            PollScheduler(60, spread_window=0),
+            start_rate=1, clock=lambda: now[0])
+        engine._warm_up(engine.tenants.leaders())
+        started = []
+        for second in range(3):
+            now[0] = second
+            started.extend(engine._take_due())
+        assert len(started) == 3
+        engine._polling.clear()
+        for tenant in started:
+            engine.tenants.schedule(tenant, 60)
+        now[0] = 60
+        assert len(engine._take_due()) == 3
+
+    def test_stop_waits_for_polls_in_flight(self):
+        tenants = [Tenant('token', 1)]
+        started = threading.Event()
+        finished = []
+
+        def handler(tenant):
+            started.set()
+            threading.Event().wait(0.2)
+            finished.append(tenant)
+
+        engine = PollingEngine(
+            tenants, handler, PollScheduler(60, spread_window=0),
+            tick=0.01)
+
+        async def run_and_stop():
+            task = asyncio.ensure_future(engine.run())
+            while not started.is_set():
+                await asyncio.sleep(0.01)
+            engine.stop()
+            await task
+
+        asyncio.run(run_and_stop())
+        assert finished == tenants
+
+    def test_shutdown_keeps_stores_for_running_polls(self):
+        import time
+
+        import homework
+
+        release = threading.Event()
+        started = threading.Event()
+
+        def handler(tenant):
+            started.set()
+            release.wait(5)
+
+        engine = PollingEngine(
+            [Tenant('token', 1)], handler,
+            PollScheduler(60, spread_window=0), tick=0.01,
+            shutdown_timeout=0.1)
+
+        async def run_and_stop():
+            task = asyncio.ensure_future(engine.run())
+            while not started.is_set():
+                await asyncio.sleep(0.01)
+            engine.stop()
+            await task
+
+        class Store:
+            closed = False
+
+            def close(self, timeout=None):
+                self.closed = True
+
+        class SlowService:
+            def stop(self):
+                release.wait(5)
+
+        context = homework.PollContext(
+            queue=Store(), cursors=Store(), states=Store(), session=None,
+            scheduler=None)
+        asyncio.run(run_and_stop())
+        start = time.monotonic()
+        homework.shutdown(
+            context, [SlowService()], engine.deadline, engine)
+        assert time.monotonic() - start < 1
+        assert context.queue.closed
+        assert not context.states.closed
+        release.set()
+        assert engine.join(5)
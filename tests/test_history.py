@@ -0,0 +1,73 @@
+from engine import Tenant
+from history import EventLog, HomeworkEvent, feed_key
+from tests.fixtures.fixture_pipeline import MockSession
+
+
+class TestEventLog:
+
+    def test_range_queries(self, tmp_path):
+        events = EventLog(str(tmp_path / 'state.sqlite3'))
+        events.append('feed', 1, 'reviewing', 100)
+        events.append('feed', 1, 'approved', 300)
+        events.append('feed', 2, 'reviewing', 200)
+        events.append('other', 1, 'rejected', 150)
+        assert events.events('feed', homework=1) == [
+            HomeworkEvent('1', 'reviewing', 100),
+            HomeworkEvent('1', 'approved', 300),
+        ]
+        assert events.events('feed', since=150, until=300) == [
+            HomeworkEvent('2', 'reviewing', 200),
+            HomeworkEvent('1', 'approved', 300),
+        ]
+        events.close()
+
+    def test_appends_are_batched(self, tmp_path):
+        path = str(tmp_path / 'state.sqlite3')
+        events = EventLog(path, batch_size=3)
+        reader = EventLog(path)
+        events.append('feed', 1, 'reviewing', 100)
+        events.append('feed', 1, 'reviewing', 100)
+        assert reader.events('feed') == []
+        events.append('feed', 2, 'reviewing', 100)
+        assert len(reader.events('feed')) == 2
+        events.close()
+        reader.close()
+
+    def test_replay_with_snapshots(self, tmp_path):
+        path = str(tmp_path / 'state.sqlite3')
+        events = EventLog(path, snapshot_every=2)
+        events.append('feed', 1, 'reviewing', 100)
+        events.append('feed', 2, 'reviewing', 200)
+        events.flush()
+        events.append('feed', 1, 'approved', 300)
+        assert events.replay('feed') == {
+            '1': ('approved', 300), '2': ('reviewing', 200)}
+        assert events.replay('feed', until=250) == {
+            '1': ('reviewing', 100), '2': ('reviewing', 200)}
+        # A late event older than the snapshot is not lost
+        events.append('feed', 3, 'rejected', 150)
+        events.close()
+
+        events = EventLog(path, snapshot_every=2)
+        assert events.replay('feed', until=250) == {
+            '1': ('reviewing', 100),
+            '2': ('reviewing', 200),
+            '3': ('rejected', 150),
+        }
+        events.close()
+
+    def test_polled_statuses_are_recorded_once(self, poll_context, state_db):
+        import homework
+
+        context = poll_context(
+            MockSession({'homeworks': [
+                {'id': 7, 'homework_name': 'hw', 'status': 'approved',
+                 'date_updated': '2022-01-01T00:00:00Z'},
+            ], 'current_date': 10}),
+            events=EventLog(state_db)
+        )
+        tenant = Tenant('token', 1, timestamp=1)
+        homework.process_tenant(context, tenant)
+        homework.process_tenant(context, tenant)
+        assert context.events.events(feed_key('token')) == [
+            HomeworkEvent('7', 'approved', 1640995200)]
@@ -0,0 +1,74 @@
+import requests
+
+from http_client import (
+    CONNECT_TIMEOUT, READ_TIMEOUT, ConditionalCache, create_session)
+
+
+class TestPooledSession:
+
+    def test_session_configuration(self):
+        session = create_session({'Authorization': 'OAuth token'},
+                                 pool_size=50)
+        assert session.headers['Authorization'] == 'OAuth token'
+        assert 'gzip' in session.headers['Accept-Encoding']
+        adapter = session.get_adapter('https://practicum.yandex.ru/')
+        assert adapter._pool_maxsize == 50
+
+    def test_default_timeout(self, monkeypatch):
+        calls = []
+
+        def mock_request(self, method, url, **kwargs):
+            calls.append(kwargs)
+
+        monkeypatch.setattr(requests.Session, 'request', mock_request)
+        session = create_session()
+        session.get('https://practicum.yandex.ru/')
+        session.get('https://practicum.yandex.ru/', timeout=1)
+        assert calls[0]['timeout'] == (CONNECT_TIMEOUT, READ_TIMEOUT)
+        assert calls[1]['timeout'] == 1
+
+
+class MockResponse:
+
+    def __init__(self, content, status_code=200, headers=None):
+        self.content = content
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class TestConditionalCache:
+
+    def test_body_hash_ignores_current_date(self):
+        cache = ConditionalCache()
+        first = MockResponse(b'{"homeworks": [], "current_date": 100}')
+        assert cache.unchanged(first) == (False, 100)
+        cache.commit()
+        second = MockResponse(b'{"homeworks": [], "current_date": 200}')
+        assert cache.unchanged(second) == (True, 200)
+        changed = MockResponse(
+            b'{"homeworks": [{"id": 1}], "current_date": 300}')
+        assert cache.unchanged(changed) == (False, 300)
+
+    def test_not_committed_answer_is_not_skipped(self):
+        cache = ConditionalCache()
+        response = MockResponse(b'{"homeworks": [{"id": 1}]}')
+        assert cache.unchanged(response) == (False, None)
+        assert cache.unchanged(response) == (False, None)
+        cache.commit()
+        assert cache.unchanged(response) == (True, None)
+
+    def test_conditional_headers(self):
+        cache = ConditionalCache()
+        headers = {'Authorization': 'OAuth token'}
+        assert cache.apply(headers) is headers
+        cache.unchanged(MockResponse(b'{}', headers={
+            'ETag': '"abc"',
+            'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT'}))
+        cache.commit()
+        assert cache.apply(headers) == {
+            'Authorization': 'OAuth token',
+            'If-None-Match': '"abc"',
+            'If-Modified-Since': 'Wed, 21 Oct 2015 07:28:00 GMT',
+        }
+        assert cache.unchanged(MockResponse(b'', status_code=304)) == (
+            True, None)
@@ -0,0 +1,49 @@
+import json
+import logging
+
+from log_config import redact, setup_logging, stop_listener
+
+
+class TestLogConfig:
+
+    def test_redact(self):
+        assert redact('Authorization: OAuth AQAAAAA4rre-HAAYc') == (
+            'Authorization: OAuth ***')
+        assert redact(
+            'https://api.telegram.org/bot5556946562:'
+            'AAHqhLjqB-4aqssxo_R-dqi5qbYXxefVI2o/sendMessage'
+        ) == 'https://api.telegram.org/bot***/sendMessage'
+
+    def test_json_lines_in_file(self, tmp_path):
+        root = logging.getLogger()
+        handlers, level = root.handlers[:], root.level
+        path = tmp_path / 'homework.log'
+        listener = setup_logging(filename=str(path), max_bytes=1024)
+        try:
+            logging.info('Заголовки %s', {'Authorization': 'OAuth secret'})
+            try:
+                raise ValueError('ошибка')
+            except ValueError:
+                logging.exception('Сбой')
+        finally:
+            stop_listener(listener)
+            for handler in root.handlers[:]:
+                root.removeHandler(handler)
+            for handler in handlers:
+                root.addHandler(handler)
+            root.setLevel(level)
+        records = [
+            json.loads(line)
+            for line in path.read_text(encoding='utf-8').splitlines()
+        ]
+        assert records[0]['message'] == (
+            "Заголовки {'Authorization': 'OAuth ***'}")
+        assert records[1]['level'] == 'ERROR'
+        assert 'ValueError: ошибка' in records[1]['exc_info']
+
+    def test_file_per_worker(self):
+        import homework
+
+        files = {homework.worker_log_file(index) for index in range(3)}
+        assert len(files) == 3
+        assert homework.LOG_FILE not in files
@@ -0,0 +1,50 @@
+from urllib.request import urlopen
+
+import pytest
+
+from metrics import (
+    Counter, Gauge, Histogram, Metric, Registry, start_metrics_server)
+
+
+class TestMetrics:
+
+    def test_render(self):
+        registry = Registry()
+        errors = Counter('errors', 'Errors.', label='exception',
+                         registry=registry)
+        latency = Histogram('latency_seconds', 'Latency.', buckets=(1, 5),
+                            registry=registry)
+        tenants = Gauge('tenants', 'Tenants.', registry=registry)
+        errors.inc('APIConnectionError')
+        errors.inc('APIConnectionError')
+        latency.observe(0.5)
+        latency.observe(3)
+        tenants.set_function(lambda: 7)
+        text = registry.render()
+        assert (
+            '# TYPE errors_total counter\n'
+            'errors_total{exception="APIConnectionError"} 2'
+        ) in text
+        assert 'latency_seconds_bucket{le="1"} 1' in text
+        assert 'latency_seconds_bucket{le="5"} 2' in text
+        assert 'latency_seconds_bucket{le="+Inf"} 2' in text
+        assert 'latency_seconds_sum 3.5' in text
+        assert 'latency_seconds_count 2' in text
+        assert '# TYPE tenants gauge\ntenants 7' in text
+
+    def test_metric_is_abstract(self):
+        with pytest.raises(TypeError):
+            Metric('untyped', 'Untyped.', registry=Registry())
+
+    def test_endpoint(self):
+        registry = Registry()
+        Gauge('tenants', 'Tenants.', registry=registry).set(3)
+        server = start_metrics_server(0, host='127.0.0.1', registry=registry)
+        try:
+            url = f'http://127.0.0.1:{server.server_port}/metrics'
+            with urlopen(url) as response:
+                body = response.read().decode()
+        finally:
+            server.shutdown()
+            server.server_close()
+        assert 'tenants 3' in body
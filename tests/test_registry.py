@@ -0,0 +1,151 @@
+import tracemalloc
+
+from engine import Tenant
+from registry import TenantRegistry, TimerWheel
+from storage import HomeworkStateStore
+from tests.fixtures.fixture_pipeline import MockSession
+
+
+class TestTimerWheel:
+
+    def test_due_tenants(self):
+        wheel = TimerWheel(tick=1, slots=8, now=0)
+        first, second = Tenant('token1', 1), Tenant('token2', 2)
+        wheel.schedule(first, 0)
+        wheel.schedule(second, 3.5)
+        assert wheel.advance(0) == [first]
+        assert wheel.advance(2) == []
+        assert len(wheel) == 1
+        assert wheel.advance(3) == [second]
+        assert len(wheel) == 0
+
+    def test_delay_longer_than_turn(self):
+        wheel = TimerWheel(tick=1, slots=8, now=0)
+        tenant = Tenant('token', 1)
+        wheel.schedule(tenant, 20)
+        assert wheel.advance(8) == []
+        assert wheel.advance(19) == []
+        assert wheel.advance(20) == [tenant]
+
+    def test_past_time_fires_on_next_tick(self):
+        wheel = TimerWheel(tick=1, slots=8, now=0)
+        wheel.advance(5)
+        tenant = Tenant('token', 1)
+        wheel.schedule(tenant, 1)
+        assert wheel.advance(5) == []
+        assert wheel.advance(6) == [tenant]
+
+    def test_long_pause_fires_everything_once(self):
+        wheel = TimerWheel(tick=1, slots=8, now=0)
+        tenants = [Tenant(f'token{i}', i) for i in range(30)]
+        for index, tenant in enumerate(tenants):
+            wheel.schedule(tenant, index)
+        assert len(wheel.advance(100)) == len(tenants)
+        assert len(wheel) == 0
+
+
+class TestTenantRegistry:
+
+    def test_replace_and_remove(self):
+        registry = TenantRegistry(now=0)
+        tenant = Tenant('token', 1)
+        registry.add(tenant)
+        registry.add(Tenant('token', 1))
+        assert len(registry) == 1
+        assert tenant not in registry
+        assert registry.remove(tenant.key) is not None
+        assert registry.get(tenant.key) is None
+
+    def test_removed_tenant_is_not_due(self):
+        tenants = [Tenant('token1', 1), Tenant('token2', 2)]
+        registry = TenantRegistry(tenants, now=0)
+        for tenant in tenants:
+            registry.schedule(tenant, 1)
+        registry.remove(tenants[0].key)
+        assert registry.due(1) == [tenants[1]]
+
+    def test_token_is_polled_once(self):
+        first, second = Tenant('token', 1), Tenant('token', 2)
+        other = Tenant('other', 3)
+        registry = TenantRegistry([first, second, other], now=0)
+        assert registry.leaders() == [first, other]
+        assert registry.subscribers(second) == [first, second]
+        for tenant in registry:
+            registry.schedule(tenant, 1)
+        assert registry.due(1) == [first, other]
+
+        registry.remove(first.key)
+        assert registry.is_leader(second)
+        assert registry.subscribers(second) == [second]
+
+    def test_update_keeps_groups(self):
+        registry = TenantRegistry([Tenant('token', 1)], now=0)
+        registry.update([
+            Tenant('token', 1, statuses=['approved']),
+            Tenant('token', 2),
+        ])
+        leader = registry.leaders()[0]
+        assert leader.chat_id == 1
+        assert leader.statuses == {'approved'}
+        assert len(registry.subscribers(leader)) == 2
+
+    def test_memory_per_tenant(self, tmp_path):
+        # Tenants with their tokens, the indexes, the timers and cached
+        # states of ten homeworks are measured
+        count = 5000
+        states = HomeworkStateStore(str(tmp_path / 'state.sqlite3'))
+        keys = [Tenant('', 10 ** 9 + i).key for i in range(count)]
+        with states._connection:
+            states._connection.executemany(
+                'INSERT INTO homework_states '
+                '(tenant, homework, status, date_updated, homework_name) '
+                'VALUES (?, ?, ?, ?, ?)',
+                ((key, str(10 ** 6 + homework), 'approved',
+                  '2022-01-01T00:00:00Z', f'homework {homework}')
+                 for key in keys for homework in range(10))
+            )
+        del keys
+        tracemalloc.start()
+        try:
+            start = tracemalloc.get_traced_memory()[0]
+            registry = TenantRegistry(
+                (Tenant(f'token{i:040d}', 10 ** 9 + i, timestamp=10 ** 9)
+                 for i in range(count)),
+                now=0
+            )
+            for index, tenant in enumerate(registry):
+                registry.schedule(tenant, index)
+            scheduled = tracemalloc.get_traced_memory()[0]
+            for tenant in registry:
+                states.diff(tenant.key, [])
+            cached = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+            states.close()
+        assert (cached - scheduled) / count < 256
+        assert (cached - start) / count < 768
+
+
+class TestFanOut:
+
+    def test_one_request_for_all_chats(self, poll_context):
+        import homework
+
+        session = MockSession({'homeworks': [
+            {'homework_name': 'hw1', 'status': 'reviewing'},
+            {'homework_name': 'hw2', 'status': 'approved'},
+        ], 'current_date': 10})
+        context = poll_context(session)
+        everything = Tenant('token', 1, timestamp=5)
+        approved = Tenant('token', 2, timestamp=3, statuses=['approved'])
+        registry = TenantRegistry([everything, approved], now=0)
+
+        homework.process_feed(context, registry, everything)
+
+        assert len(session.requests) == 1
+        assert session.requests[0]['params'] == {'from_date': 3}
+        chats = [chat_id for chat_id, _ in context.queue.messages]
+        assert sorted(chats) == [1, 1, 2]
+        assert approved.timestamp == 10
+        assert context.cursors.get(approved.key) == 10
+        assert len(context.states.get(approved.key)) == 2
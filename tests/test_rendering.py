@@ -0,0 +1,65 @@
+import pytest
+
+from rendering import MessageRenderer, compile_template, escape_markdown_v2
+
+
+class TestRendering:
+
+    def test_escape_markdown_v2(self):
+        assert escape_markdown_v2('hw_1.zip (v2)!') == (
+            r'hw\_1\.zip \(v2\)\!')
+
+    def test_compile_template_escapes_literals_only(self):
+        template = compile_template('"{name}".', escape_markdown_v2)
+        assert template(name='a_b') == '"a_b"\\.'
+
+    def test_render_plain(self):
+        renderer = MessageRenderer()
+        assert renderer.render('ru', 'hw.zip', 'approved') == (
+            'Изменился статус проверки работы "hw.zip". '
+            'Работа проверена: ревьюеру всё понравилось. Ура!'
+        )
+
+    def test_render_english(self):
+        renderer = MessageRenderer()
+        message = renderer.render('en', 'hw.zip', 'reviewing')
+        assert message.startswith('The review status of "hw.zip"')
+        assert message.endswith('The work has been taken for review.')
+
+    def test_unknown_locale_falls_back_to_default(self):
+        renderer = MessageRenderer()
+        assert renderer.render('de', 'hw', 'rejected') == renderer.render(
+            'ru', 'hw', 'rejected')
+
+    def test_render_markdown_v2(self):
+        renderer = MessageRenderer(parse_mode='MarkdownV2')
+        message = renderer.render('ru', 'hw_1.zip', 'approved')
+        assert 'hw\\_1\\.zip' in message
+        assert message.endswith('Ура\\!')
+
+    def test_render_html(self):
+        renderer = MessageRenderer(parse_mode='HTML')
+        message = renderer.render('en', '<b>&', 'rejected')
+        assert '"&lt;b&gt;&amp;"' in message
+
+    def test_repeated_render_is_cached(self):
+        renderer = MessageRenderer()
+        for _ in range(3):
+            renderer.render('ru', 'hw', 'approved')
+        info = renderer.render.cache_info()
+        assert info.misses == 1
+        assert info.hits == 2
+
+    def test_unknown_parse_mode(self):
+        with pytest.raises(ValueError):
+            MessageRenderer(parse_mode='Markdown')
+
+    def test_parse_status_matches_renderer(self):
+        import homework
+
+        homework_status = homework.render_status(
+            {'homework_name': 'hw', 'status': 'approved'}, 'en')
+        assert homework_status.startswith('The review status of "hw"')
+        assert homework.parse_status(
+            {'homework_name': 'hw', 'status': 'approved'}
+        ).startswith('Изменился статус проверки работы "hw"')
@@ -0,0 +1,171 @@
+import time
+
+import pytest
+import requests
+
+from delivery import OutboundQueue
+from engine import Tenant
+from exceptions import (
+    APIConnectionError, CircuitOpenError, TelegramChatError,
+    TelegramConnectionError)
+from resilience import (
+    CLOSED, HALF_OPEN, OPEN, CircuitBreaker, ErrorDigest)
+from tests.fixtures.fixture_pipeline import MockSession
+
+
+class FakeClock:
+
+    def __init__(self, now=0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker:
+
+    def test_opens_and_recovers(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(
+            'api', failure_threshold=2, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+        assert breaker.state == CLOSED
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        with pytest.raises(CircuitOpenError) as error:
+            breaker.check()
+        assert error.value.retry_after == 10
+        clock.now = 10
+        assert breaker.state == HALF_OPEN
+        assert breaker.allow()
+        assert not breaker.allow()
+        breaker.record_success()
+        assert breaker.state == CLOSED
+
+    def test_failed_trial_opens_again(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(
+            'api', failure_threshold=1, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+        clock.now = 10
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        assert breaker.retry_in() == 10
+
+    def test_protect(self):
+        breaker = CircuitBreaker('api', failure_threshold=1)
+        with pytest.raises(KeyError):
+            with breaker.protect(APIConnectionError):
+                raise KeyError('answered')
+        assert breaker.state == CLOSED
+        with pytest.raises(APIConnectionError):
+            with breaker.protect(APIConnectionError):
+                raise APIConnectionError('down')
+        with pytest.raises(CircuitOpenError):
+            with breaker.protect(APIConnectionError):
+                pass
+
+
+class TestErrorDigest:
+
+    def test_repeats_are_summarized(self):
+        clock = FakeClock()
+        digest = ErrorDigest(window=60, clock=clock)
+        error = APIConnectionError('API недоступен\nparams= 1')
+        assert digest.report(1, error) == str(error)
+        assert digest.report(1, error) is None
+        assert digest.report(2, error) == str(error)
+        clock.now = 120
+        notice = digest.report(1, error)
+        assert notice.startswith(str(error))
+        assert 'повторилась 2 раз' in notice
+        digest.resolve(1)
+        assert digest.report(1, error) == str(error)
+
+
+class TestBreakerInPipeline:
+
+    def test_api_outage_fails_fast_and_notifies_once(self, poll_context):
+        import homework
+
+        context = poll_context(
+            MockSession(requests.ConnectionError('down')),
+            cursors=None,
+            states=None,
+            api_breaker=CircuitBreaker('api', failure_threshold=2),
+            notices=ErrorDigest()
+        )
+        tenant = Tenant('token', 1, timestamp=1)
+        for _ in range(5):
+            homework.process_tenant(context, tenant)
+        assert len(context.session.requests) == 2
+        assert len(context.queue.messages) == 1
+        assert tenant.retry_after > 0
+
+    def test_telegram_outage_stops_sending(self):
+        attempts = []
+
+        def send(chat_id, text):
+            attempts.append(text)
+            raise TelegramConnectionError('down')
+
+        breaker = CircuitBreaker(
+            'Telegram', failure_threshold=1, reset_timeout=60)
+        queue = OutboundQueue(send, chat_rate=100, breaker=breaker)
+        queue.start()
+        queue.put(1, 'first')
+        deadline = time.monotonic() + 5
+        while breaker.state != OPEN and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert breaker.state == OPEN
+        queue.put(2, 'second')
+        queue.put(3, 'third')
+        time.sleep(0.1)
+        assert queue.depth == 2
+        assert attempts == ['first']
+
+    def test_blocked_chats_do_not_open_breaker(self, tmp_path):
+        from outbox import Outbox
+
+        sent = []
+
+        def send(chat_id, text):
+            if chat_id != '0':
+                raise TelegramChatError('Forbidden: bot was blocked')
+            sent.append(text)
+
+        breaker = CircuitBreaker(
+            'Telegram', failure_threshold=2, reset_timeout=60)
+        outbox = Outbox(str(tmp_path / 'outbox.sqlite3'))
+        queue = OutboundQueue(
+            send, chat_rate=100, breaker=breaker, outbox=outbox)
+        queue.start()
+        for chat_id in range(1, 6):
+            queue.put(chat_id, 'blocked')
+        queue.put(0, 'healthy')
+        queue.close(timeout=5)
+        assert breaker.state == CLOSED
+        assert sent == ['healthy']
+        assert outbox.pending_count() == 0
+        outbox.stale_after = -1
+        assert outbox.claim_stale() == []
+        outbox.close()
+
+    def test_send_chat_message_errors(self):
+        import homework
+        from telegram.error import NetworkError, Unauthorized
+
+        class MockBot:
+            def __init__(self, error):
+                self.error = error
+
+            def sendMessage(self, **kwargs):
+                raise self.error
+
+        with pytest.raises(TelegramChatError):
+            homework.send_chat_message(
+                MockBot(Unauthorized('Forbidden: bot was blocked')), 1, 'x')
+        with pytest.raises(TelegramConnectionError):
+            homework.send_chat_message(
+                MockBot(NetworkError('Bad Gateway')), 1, 'x')
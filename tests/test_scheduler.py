@@ -0,0 +1,79 @@
+from engine import Tenant
+from exceptions import APIConnectionError, APIRateLimitError
+from http_client import parse_retry_after
+from scheduler import PollScheduler
+
+
+class FakeClock:
+
+    def __init__(self, now=0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestPollScheduler:
+
+    def make_scheduler(self, clock):
+        return PollScheduler(
+            600, reviewing_interval=60, idle_interval=3600, idle_after=1000,
+            backoff_base=10, backoff_max=100, jitter=0, clock=clock)
+
+    def test_base_interval(self):
+        clock = FakeClock()
+        scheduler = self.make_scheduler(clock)
+        tenant = Tenant('token', 1)
+        tenant.last_change = clock.now
+        scheduler.record_success(tenant, [])
+        assert scheduler.next_delay(tenant) == 600
+
+    def test_reviewing_shortens_interval(self):
+        clock = FakeClock()
+        scheduler = self.make_scheduler(clock)
+        tenant = Tenant('token', 1)
+        scheduler.record_success(tenant, [{'status': 'reviewing'}])
+        assert scheduler.next_delay(tenant) == 60
+        scheduler.record_success(tenant, [])
+        assert scheduler.next_delay(tenant) == 60
+        scheduler.record_success(tenant, [{'status': 'approved'}])
+        assert scheduler.next_delay(tenant) == 600
+
+    def test_idle_lengthens_interval(self):
+        clock = FakeClock()
+        scheduler = self.make_scheduler(clock)
+        tenant = Tenant('token', 1)
+        tenant.last_change = clock.now
+        clock.now = 2000
+        assert scheduler.next_delay(tenant) == 3600
+
+    def test_backoff_grows_and_is_capped(self):
+        scheduler = self.make_scheduler(FakeClock())
+        tenant = Tenant('token', 1)
+        for failures, ceiling in ((1, 10), (2, 20), (3, 40), (10, 100)):
+            tenant.failures = failures - 1
+            scheduler.record_failure(tenant, APIConnectionError())
+            assert 10 <= scheduler.next_delay(tenant) <= ceiling
+        scheduler.record_success(tenant, [])
+        assert tenant.failures == 0
+
+    def test_retry_after_is_honoured(self):
+        scheduler = self.make_scheduler(FakeClock())
+        tenant = Tenant('token', 1)
+        scheduler.record_failure(tenant, APIRateLimitError(retry_after=500))
+        assert scheduler.next_delay(tenant) >= 500
+
+    def test_initial_delay_spread(self):
+        scheduler = self.make_scheduler(FakeClock())
+        delays = {
+            scheduler.initial_delay(Tenant(f'token{i}', i))
+            for i in range(100)
+        }
+        assert len(delays) > 50
+        assert all(0 <= delay < 600 for delay in delays)
+
+    def test_parse_retry_after(self):
+        assert parse_retry_after('120') == 120
+        assert parse_retry_after(None) is None
+        assert parse_retry_after('Thu, 01 Jan 1970 00:01:40 GMT', now=40) == 60
+        assert parse_retry_after('garbage') is None
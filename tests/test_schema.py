@@ -0,0 +1,60 @@
+import pytest
+
+from schema import HomeworkRecord, validate_homework, validate_response
+
+
+class TestSchema:
+
+    def test_valid_response(self):
+        records = validate_response({
+            'homeworks': [
+                {'id': 1, 'homework_name': 'hw', 'status': 'approved',
+                 'date_updated': '2022-01-01T00:00:00Z'},
+            ],
+            'current_date': 10
+        })
+        assert len(records) == 1
+        record = records[0]
+        assert isinstance(record, HomeworkRecord)
+        assert record.homework_name == 'hw'
+        assert record.get('status') == 'approved'
+        assert record.get('missing', 'default') == 'default'
+        assert not record.errors
+        assert not hasattr(record, '__dict__')
+
+    def test_empty_list_is_normal_result(self):
+        assert validate_response(
+            {'homeworks': [], 'current_date': 10}, strict=True) == []
+
+    @pytest.mark.parametrize('response, error', [
+        (None, TypeError),
+        ([], TypeError),
+        ({}, KeyError),
+        ({'homeworks': {}}, TypeError),
+        ({'homeworks': [], 'current_date': 'x'}, TypeError),
+    ])
+    def test_invalid_response(self, response, error):
+        with pytest.raises(error):
+            validate_response(response)
+
+    def test_reports_all_problems_at_once(self):
+        response = {'homeworks': [
+            {'homework_name': 'hw1', 'status': 'unknown'},
+            {'status': 'approved'},
+            'hw3',
+        ]}
+        records = validate_response(response)
+        assert [len(record.errors) for record in records] == [1, 1, 1]
+        with pytest.raises(ValueError) as error:
+            validate_response(response, strict=True)
+        assert len(str(error.value).splitlines()) == 3
+        assert 'homeworks[1]' in str(error.value)
+
+    @pytest.mark.parametrize('homework, error', [
+        ({'status': 'approved'}, KeyError),
+        ({'homework_name': 1, 'status': 'approved'}, TypeError),
+        ({'homework_name': 'hw', 'status': 'unknown'}, ValueError),
+    ])
+    def test_problems_are_builtin_exceptions(self, homework, error):
+        record = validate_homework(homework)
+        assert [type(problem) for problem in record.errors] == [error]
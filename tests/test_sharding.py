@@ -0,0 +1,152 @@
+from collections import Counter
+
+from sharding import HashRing, LeaseStore, ShardCoordinator, WorkerHeartbeat
+
+
+class FakeClock:
+
+    def __init__(self, now=1000):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestHashRing:
+
+    def test_balance_and_stability(self):
+        keys = [f'tenant-{index}' for index in range(3000)]
+        ring = HashRing(['a', 'b', 'c'])
+        owners = {key: ring.owner(key) for key in keys}
+        counts = Counter(owners.values())
+        assert all(800 < count < 1200 for count in counts.values())
+
+        bigger = HashRing(['a', 'b', 'c', 'd'])
+        moved = [key for key in keys if bigger.owner(key) != owners[key]]
+        assert all(bigger.owner(key) == 'd' for key in moved)
+        assert len(moved) < len(keys) / 2
+
+    def test_empty_ring(self):
+        assert HashRing([]).owner('tenant') is None
+
+
+class TestShardCoordinator:
+
+    def make_workers(self, tmp_path, closing, clock, keys, names):
+        path = str(tmp_path / 'shard.sqlite3')
+        return {
+            name: ShardCoordinator(
+                name, closing(LeaseStore(path)), keys, ttl=30, clock=clock)
+            for name in names
+        }
+
+    def test_each_tenant_owned_once(self, tmp_path, closing):
+        clock = FakeClock()
+        keys = [f'tenant-{index}' for index in range(200)]
+        workers = self.make_workers(
+            tmp_path, closing, clock, keys, ['a', 'b'])
+        for _ in range(2):
+            for worker in workers.values():
+                worker.refresh()
+        owned_a, owned_b = workers['a'].owned, workers['b'].owned
+        assert not owned_a & owned_b
+        assert owned_a | owned_b == set(keys)
+
+    def test_rebalance_on_leave(self, tmp_path, closing):
+        clock = FakeClock()
+        keys = [f'tenant-{index}' for index in range(100)]
+        workers = self.make_workers(
+            tmp_path, closing, clock, keys, ['a', 'b'])
+        for _ in range(2):
+            for worker in workers.values():
+                worker.refresh()
+        workers['b'].stop()
+        workers['a'].refresh()
+        assert workers['a'].owned == set(keys)
+
+    def test_lost_keys_are_reported(self, tmp_path, closing):
+        clock = FakeClock()
+        keys = [f'tenant-{index}' for index in range(100)]
+        path = str(tmp_path / 'shard.sqlite3')
+        acquired, released = set(), set()
+        first = ShardCoordinator(
+            'a', closing(LeaseStore(path)), keys, ttl=30,
+            on_acquire=acquired.update, on_release=released.update,
+            clock=clock)
+        first.refresh()
+        assert acquired == set(keys)
+        second = ShardCoordinator(
+            'b', closing(LeaseStore(path)), keys, clock=clock)
+        second.refresh()
+        first.refresh()
+        assert released
+        assert released == set(keys) - first.owned
+
+    def test_crashed_worker_lease_expires(self, tmp_path, closing):
+        clock = FakeClock()
+        keys = [f'tenant-{index}' for index in range(100)]
+        workers = self.make_workers(
+            tmp_path, closing, clock, keys, ['a', 'b'])
+        for _ in range(2):
+            for worker in workers.values():
+                worker.refresh()
+        owned_b = set(workers['b'].owned)
+        clock.now += 10
+        workers['a'].refresh()
+        assert not workers['a'].owned & owned_b
+        clock.now += 31
+        workers['a'].refresh()
+        assert workers['a'].owned == set(keys)
+
+    def test_busy_tenant_is_not_released(self, tmp_path, closing):
+        clock = FakeClock()
+        keys = [f'tenant-{index}' for index in range(100)]
+        workers = self.make_workers(
+            tmp_path, closing, clock, keys, ['a'])
+        workers['a'].refresh()
+        path = str(tmp_path / 'shard.sqlite3')
+        workers['b'] = ShardCoordinator(
+            'b', closing(LeaseStore(path)), keys, ttl=30, clock=clock)
+        workers['b'].refresh()
+        moving = next(
+            key for key in keys
+            if HashRing(['a', 'b']).owner(key) == 'b')
+        with workers['a'].claim(moving) as owned:
+            assert owned
+            workers['a'].refresh()
+            workers['b'].refresh()
+            assert moving in workers['a'].owned
+            assert moving not in workers['b'].owned
+        workers['a'].refresh()
+        workers['b'].refresh()
+        assert moving not in workers['a'].owned
+        assert moving in workers['b'].owned
+
+    def test_guard(self, tmp_path, closing):
+        clock = FakeClock()
+        workers = self.make_workers(
+            tmp_path, closing, clock, ['tenant'], ['a'])
+        polled = []
+
+        class Tenant:
+            key = 'tenant'
+
+        handler = workers['a'].guard(polled.append)
+        handler(Tenant)
+        assert polled == []
+        workers['a'].refresh()
+        handler(Tenant)
+        assert polled == [Tenant]
+
+
+class TestWorkerHeartbeat:
+
+    def test_worker_is_alive_until_stopped(self, tmp_path):
+        clock = FakeClock()
+        store = LeaseStore(str(tmp_path / 'shard.sqlite3'))
+        heartbeat = WorkerHeartbeat('a', store, ttl=30, clock=clock)
+        heartbeat.start()
+        assert store.live_workers(clock.now + 29) == ['a']
+        heartbeat.stop()
+        assert store.live_workers(clock.now) == []
+        store.close()
@@ -0,0 +1,65 @@
+from engine import Tenant
+from storage import CursorStore, HomeworkStateStore
+from tests.fixtures.fixture_pipeline import MockSession
+
+
+class TestCursorStore:
+
+    def test_cursor_survives_restart(self, tmp_path):
+        path = str(tmp_path / 'state.sqlite3')
+        cursors = CursorStore(path)
+        assert cursors.get('tenant') is None
+        cursors.set('tenant', 100)
+        cursors.set('tenant', 200)
+        cursors.close()
+
+        cursors = CursorStore(path)
+        assert cursors.get('tenant') == 200
+        cursors.close()
+
+    def test_next_cursor_from_current_date(self):
+        import homework
+
+        assert homework.get_next_cursor({'current_date': 20}, 10) == 20
+        assert homework.get_next_cursor({'current_date': 5}, 10) == 10
+        assert homework.get_next_cursor({'current_date': None}, 10) == 10
+        assert homework.get_next_cursor([], 10) == 10
+
+
+class TestHomeworkStateStore:
+
+    def test_diff_and_save(self, tmp_path):
+        path = str(tmp_path / 'state.sqlite3')
+        states = HomeworkStateStore(path)
+        homeworks = [
+            {'id': 2, 'homework_name': 'hw2', 'status': 'reviewing',
+             'date_updated': '2022-01-02T00:00:00Z'},
+            {'id': 1, 'homework_name': 'hw1', 'status': 'approved',
+             'date_updated': '2022-01-01T00:00:00Z'},
+        ]
+        changed = states.diff('tenant', homeworks)
+        assert [homework['id'] for homework in changed] == [1, 2]
+        states.save('tenant', changed[0])
+        assert states.diff('tenant', homeworks) == [homeworks[0]]
+        states.close()
+
+        states = HomeworkStateStore(path)
+        assert states.get('tenant') == {
+            '1': ('approved', '2022-01-01T00:00:00Z')}
+        assert states.diff('other', homeworks) != []
+        states.close()
+
+    def test_every_transition_notified_once(self, poll_context):
+        import homework
+
+        both = {'homeworks': [
+            {'homework_name': 'hw1', 'status': 'approved'},
+            {'homework_name': 'hw2', 'status': 'rejected'},
+        ], 'current_date': 10}
+        context = poll_context(MockSession(both))
+        tenant = Tenant('token', 1, timestamp=1)
+        homework.process_tenant(context, tenant)
+        homework.process_tenant(context, tenant)
+        assert len(context.queue.messages) == 2
+        assert tenant.timestamp == 10
+        assert context.cursors.get(tenant.key) == 10
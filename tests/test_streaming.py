@@ -0,0 +1,105 @@
+import json
+import tracemalloc
+
+import pytest
+
+from schema import iter_homeworks
+from streaming import StreamingAnswer
+from tests.fixtures.fixture_pipeline import MockResponse, MockSession
+
+ANSWER = {
+    'homeworks': [
+        {'id': 1, 'homework_name': 'hw1', 'status': 'approved'},
+        {'id': 2, 'homework_name': 'домашка', 'status': 'rejected',
+         'reviewer_comment': 'Поправьте "кавычки", [скобки] и {фигурные}'},
+    ],
+    'current_date': 1654300000,
+}
+
+
+def chunked(data, size):
+    return (data[start:start + size] for start in range(0, len(data), size))
+
+
+def homework_chunks(count):
+    yield b'{"current_date": 1, "homeworks": ['
+    for index in range(count):
+        separator = b',' if index else b''
+        yield separator + json.dumps({
+            'id': index, 'homework_name': f'hw{index}.zip',
+            'status': 'approved', 'reviewer_comment': 'x' * 200,
+        }).encode()
+    yield b']}'
+
+
+def peak_memory(count):
+    tracemalloc.start()
+    try:
+        for _ in iter_homeworks(StreamingAnswer(homework_chunks(count))):
+            pass
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class TestStreamingAnswer:
+
+    @pytest.mark.parametrize('size', [1, 2, 3, 7, 64, 4096])
+    def test_any_chunk_boundaries(self, size):
+        body = json.dumps(ANSWER, ensure_ascii=False, indent=1).encode()
+        answer = StreamingAnswer(chunked(body, size))
+        assert list(answer) == ANSWER['homeworks']
+        assert answer.fields == {'current_date': 1654300000}
+        assert answer.found
+
+    def test_empty_and_missing_list(self):
+        answer = StreamingAnswer([b'{"homeworks": [], "current_date": 5}'])
+        assert list(iter_homeworks(answer)) == []
+        answer = StreamingAnswer([b'{"current_date": 5}'])
+        with pytest.raises(KeyError, match='homeworks'):
+            list(iter_homeworks(answer))
+
+    @pytest.mark.parametrize('body', [
+        b'{"homeworks": [{"id": 1}',
+        b'{"homeworks": [1 2]}',
+        b'[]',
+    ])
+    def test_malformed_body(self, body):
+        with pytest.raises(ValueError):
+            list(iter_homeworks(StreamingAnswer([body])))
+
+    def test_strict_raises_on_bad_item(self):
+        answer = StreamingAnswer(
+            [b'{"homeworks": [{"homework_name": "hw", "status": "?"}]}'])
+        with pytest.raises(ValueError, match='status'):
+            list(iter_homeworks(answer, strict=True))
+
+    def test_memory_does_not_depend_on_size(self):
+        small, large = peak_memory(100), peak_memory(10000)
+        assert large < small * 2
+
+
+class TestStreamApiAnswer:
+
+    def test_fetch_homeworks_streams_answer(self, poll_context):
+        import homework
+        from engine import Tenant
+
+        session = MockSession(MockResponse(ANSWER, chunk_size=10))
+        context = poll_context(session, queue=None)
+        homeworks = homework.fetch_homeworks(context, Tenant('token', 1))
+        assert {item['homework_name'] for item in homeworks} == {
+            'hw1', 'домашка'}
+        assert session.requests[0]['stream'] is True
+        assert session.requests[0]['params'] == {'from_date': 0}
+        assert session.response.closed
+        assert context.states.homeworks(Tenant('token', 1).key) == []
+
+    def test_response_closed_on_error_status(self):
+        import homework
+        from exceptions import APIServerError
+
+        session = MockSession(MockResponse(status_code=500))
+        with pytest.raises(APIServerError):
+            homework.stream_api_answer({}, 0, session)
+        assert session.response.closed